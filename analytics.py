@@ -0,0 +1,240 @@
+from datetime import date, timedelta
+
+from sqlalchemy import func, distinct
+
+from database import db
+from models import FoodEntry, WaterIntake
+
+BUCKETS = ('day', 'week', 'month')
+
+
+def bucket_expression(column, bucket):
+    """SQL expression that maps a date column onto the start date of its bucket"""
+    if bucket == 'week':
+        # Weeks start on Monday: jump to the coming Sunday, then back six days
+        return func.date(column, 'weekday 0', '-6 days')
+    if bucket == 'month':
+        return func.strftime('%Y-%m-01', column)
+    return func.date(column)
+
+
+def bucket_start(day, bucket):
+    """Python counterpart of bucket_expression for a single date"""
+    if bucket == 'week':
+        return day - timedelta(days=day.weekday())
+    if bucket == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def bucket_labels(start, end, bucket):
+    """Every bucket start date between start and end, oldest first"""
+    labels = []
+    current = bucket_start(start, bucket)
+    while current <= end:
+        labels.append(current.isoformat())
+        if bucket == 'day':
+            current += timedelta(days=1)
+        elif bucket == 'week':
+            current += timedelta(weeks=1)
+        else:
+            current = (current + timedelta(days=32)).replace(day=1)
+    return labels
+
+
+def bucket_end(start, bucket):
+    """Last date of the bucket that starts on the given date"""
+    if bucket == 'week':
+        return start + timedelta(days=6)
+    if bucket == 'month':
+        return (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return start
+
+
+# Order of the per-bucket totals returned by aggregate_buckets
+TOTAL_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'food_days', 'water', 'water_days')
+
+
+def aggregate_buckets(user_id, start, end, bucket):
+    """
+    Per-bucket sums straight from the entry tables.
+
+    Each table is aggregated in SQL with one GROUP BY over the
+    (user_id, date) index.
+
+    Returns:
+        Dictionary mapping ISO bucket start dates to lists in TOTAL_FIELDS order
+    """
+    food_bucket = bucket_expression(FoodEntry.date, bucket).label('bucket')
+    food_rows = db.session.query(
+        food_bucket,
+        func.sum(FoodEntry.calories),
+        func.sum(FoodEntry.protein),
+        func.sum(FoodEntry.carbs),
+        func.sum(FoodEntry.fat),
+        func.count(distinct(FoodEntry.date))
+    ).filter(
+        FoodEntry.user_id == user_id,
+        FoodEntry.date >= start,
+        FoodEntry.date <= end
+    ).group_by(food_bucket).all()
+
+    water_bucket = bucket_expression(WaterIntake.date, bucket).label('bucket')
+    water_rows = db.session.query(
+        water_bucket,
+        func.sum(WaterIntake.amount),
+        func.count(distinct(WaterIntake.date))
+    ).filter(
+        WaterIntake.user_id == user_id,
+        WaterIntake.date >= start,
+        WaterIntake.date <= end,
+        WaterIntake.amount > 0
+    ).group_by(water_bucket).all()
+
+    totals = {}
+    for label, calories, protein, carbs, fat, food_days in food_rows:
+        totals[label] = [calories or 0, protein or 0, carbs or 0, fat or 0, food_days, 0, 0]
+    for label, water, water_days in water_rows:
+        totals.setdefault(label, [0, 0, 0, 0, 0, 0, 0])[5:] = [water or 0, water_days]
+    return totals
+
+
+def build_series(totals, start, end, bucket):
+    """
+    Shape per-bucket totals into chart-ready arrays.
+
+    Week and month values are averages per logged day, so they share a
+    scale with the daily chart. Empty buckets are filled with zeros.
+    """
+    labels = bucket_labels(start, end, bucket)
+    series = {'calories': [], 'protein': [], 'carbs': [], 'fat': [], 'water': []}
+
+    for label in labels:
+        calories, protein, carbs, fat, food_days, water, water_days = totals.get(label, (0, 0, 0, 0, 0, 0, 0))
+        food_days = food_days or 1
+        water_days = water_days or 1
+        series['calories'].append(round(calories / food_days))
+        series['protein'].append(round(protein / food_days, 1))
+        series['carbs'].append(round(carbs / food_days, 1))
+        series['fat'].append(round(fat / food_days, 1))
+        series['water'].append(round(water / water_days))
+
+    # Average daily macro split over the whole range, for the doughnut chart
+    logged_days = sum(values[4] for values in totals.values()) or 1
+    macronutrients = {
+        'protein': round(sum(values[1] for values in totals.values()) / logged_days, 1),
+        'carbs': round(sum(values[2] for values in totals.values()) / logged_days, 1),
+        'fat': round(sum(values[3] for values in totals.values()) / logged_days, 1)
+    }
+
+    return {
+        'bucket': bucket,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'labels': labels,
+        'macronutrients': macronutrients,
+        **series
+    }
+
+
+def get_nutrition_series(user_id, start, end, bucket='day'):
+    """
+    Build chart-ready calorie, macro and water series for a date range.
+
+    Daily series are aggregated from the entry tables; weekly and monthly
+    series read the precomputed rollups for whole periods in the range.
+
+    Returns:
+        Dictionary with a labels list and one value list per series
+    """
+    if bucket == 'day':
+        totals = aggregate_buckets(user_id, start, end, bucket)
+    else:
+        # Imported here because rollups builds on the helpers in this module
+        from rollups import aggregate_with_rollups
+        totals = aggregate_with_rollups(user_id, start, end, bucket)
+
+    return build_series(totals, start, end, bucket)
+
+
+def most_tracked_food(user_id, start, end):
+    """Name and entry count of the food logged most often in the range, or None"""
+    row = db.session.query(
+        FoodEntry.name,
+        func.count(FoodEntry.id).label('entries')
+    ).filter(
+        FoodEntry.user_id == user_id,
+        FoodEntry.date >= start,
+        FoodEntry.date <= end
+    ).group_by(FoodEntry.name).order_by(func.count(FoodEntry.id).desc()).first()
+
+    return {'name': row[0], 'entries': row[1]} if row else None
+
+
+def get_insights(user_id, user_profile, start, end):
+    """
+    Summary metrics for the analytics page, computed by the NumPy engine.
+
+    The series is loaded for twice the requested span so the period can be
+    compared with the one before it; that earlier period is cut short at
+    date.min instead of overflowing.
+    """
+    from analytics_engine import load_daily_series, compute_insights
+
+    period_days = (end - start).days + 1
+    look_back = min(period_days, (start - date.min).days)
+    series = load_daily_series(user_id, start - timedelta(days=look_back), end)
+    goals = {
+        'calories': user_profile.daily_calorie_goal if user_profile else None,
+        'protein': user_profile.daily_protein_goal if user_profile else None,
+        'water': user_profile.daily_water_goal if user_profile else None
+    }
+
+    insights = compute_insights(series, goals, period_days)
+    insights['most_tracked_food'] = most_tracked_food(user_id, start, end)
+    return insights
+
+
+# Series downsampled together when the API is asked for fewer points
+SERIES_FIELDS = ('calories', 'protein', 'carbs', 'fat', 'water')
+
+
+def downsample_series(data, points):
+    """
+    Reduce chart series to at most `points` shared x positions with LTTB.
+
+    The calorie and water charts each get half the budget, and the union of
+    the kept indices is applied to every series so they keep sharing one
+    labels array. Peaks and dips in either chart survive the reduction.
+    Below 4 points there is too little to share and only the calorie
+    chart picks them.
+    """
+    from analytics_engine import lttb_indices
+    import numpy as np
+
+    if len(data['labels']) <= points:
+        return data
+
+    # Both index sets contain the first and last point, so the union of two
+    # sets of (points + 2) // 2 indices has at most `points`
+    per_series = (points + 2) // 2
+    if per_series < 3:
+        keep = lttb_indices(data['calories'], points)
+    else:
+        keep = np.union1d(lttb_indices(data['calories'], per_series), lttb_indices(data['water'], per_series))
+
+    data['labels'] = [data['labels'][i] for i in keep]
+    for field in SERIES_FIELDS:
+        data[field] = [data[field][i] for i in keep]
+    data['downsampled'] = True
+    return data
+
+
+def default_bucket(start, end):
+    """Pick a bucket size that keeps the chart readable for the range"""
+    days = (end - start).days + 1
+    if days > 366:
+        return 'month'
+    if days > 62:
+        return 'week'
+    return 'day'
@@ -0,0 +1,303 @@
+from collections import namedtuple
+
+import numpy as np
+from sqlalchemy import func
+
+from database import db
+from models import FoodEntry, WaterIntake
+
+# One contiguous float64 array per metric, one slot per calendar day from
+# start to end. Days without entries are zero-filled and flagged in the
+# food_logged / water_logged masks so averages can skip them.
+DailySeries = namedtuple('DailySeries', [
+    'start', 'dates', 'calories', 'protein', 'carbs', 'fat', 'water', 'food_logged', 'water_logged'
+])
+
+
+def empty_series(start, end):
+    """A gap-filled series covering start..end with nothing logged"""
+    days = (end - start).days + 1
+    dates = np.arange(np.datetime64(start, 'D'), np.datetime64(start, 'D') + days)
+    zeros = np.zeros(days)
+    return DailySeries(
+        start, dates, zeros, zeros.copy(), zeros.copy(), zeros.copy(), zeros.copy(),
+        np.zeros(days, dtype=bool), np.zeros(days, dtype=bool)
+    )
+
+
+def _day_offsets(start, dates):
+    return (np.array(dates, dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.int64)
+
+
+def load_daily_series(user_id, start, end):
+    """
+    Load a user's daily totals into gap-filled NumPy arrays.
+
+    Two GROUP BY queries fetch one row per logged day; the rows are then
+    scattered into preallocated arrays by day offset, so there is no
+    per-day Python work beyond reading the query results.
+    """
+    series = empty_series(start, end)
+
+    food_rows = db.session.query(
+        FoodEntry.date,
+        func.sum(FoodEntry.calories),
+        func.sum(FoodEntry.protein),
+        func.sum(FoodEntry.carbs),
+        func.sum(FoodEntry.fat)
+    ).filter(
+        FoodEntry.user_id == user_id,
+        FoodEntry.date >= start,
+        FoodEntry.date <= end
+    ).group_by(FoodEntry.date).all()
+
+    if food_rows:
+        dates, calories, protein, carbs, fat = zip(*food_rows)
+        offsets = _day_offsets(start, dates)
+        series.calories[offsets] = np.array(calories, dtype=np.float64)
+        series.protein[offsets] = np.array(protein, dtype=np.float64)
+        series.carbs[offsets] = np.array(carbs, dtype=np.float64)
+        series.fat[offsets] = np.array(fat, dtype=np.float64)
+        series.food_logged[offsets] = True
+
+    water_rows = db.session.query(
+        WaterIntake.date,
+        func.sum(WaterIntake.amount)
+    ).filter(
+        WaterIntake.user_id == user_id,
+        WaterIntake.date >= start,
+        WaterIntake.date <= end,
+        WaterIntake.amount > 0
+    ).group_by(WaterIntake.date).all()
+
+    if water_rows:
+        dates, amounts = zip(*water_rows)
+        offsets = _day_offsets(start, dates)
+        series.water[offsets] = np.array(amounts, dtype=np.float64)
+        series.water_logged[offsets] = True
+
+    return series
+
+
+def rolling_mean(values, logged, window):
+    """
+    Trailing mean over the last `window` days, counting only logged days.
+
+    Uses cumulative sums so the cost is O(n) regardless of window size.
+    Days whose window contains no logged day are NaN.
+    """
+    masked = np.where(logged, values, 0.0)
+    sums = np.cumsum(masked)
+    counts = np.cumsum(logged, dtype=np.int64)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def adherence(values, goal, logged, tolerance=0.1):
+    """Percentage of logged days within +/- tolerance of the goal"""
+    if not goal or not logged.any():
+        return 0.0
+    within = np.abs(values[logged] - goal) <= goal * tolerance
+    return float(within.mean() * 100)
+
+
+def streaks(hits):
+    """
+    Current and longest run of consecutive True days.
+
+    Run boundaries are found with np.diff on the padded boolean array, so
+    no Python loop walks the days.
+
+    Returns:
+        A tuple of (current streak, longest streak)
+    """
+    if not len(hits):
+        return 0, 0
+    padded = np.concatenate(([0], hits.astype(np.int8), [0]))
+    edges = np.diff(padded)
+    run_starts = np.flatnonzero(edges == 1)
+    run_ends = np.flatnonzero(edges == -1)
+    if not len(run_starts):
+        return 0, 0
+    lengths = run_ends - run_starts
+    current = int(lengths[-1]) if run_ends[-1] == len(hits) else 0
+    return current, int(lengths.max())
+
+
+def macro_ratios(protein, carbs, fat):
+    """Share of calories from protein, carbs and fat (4/4/9 kcal per gram)"""
+    energy = np.array([protein.sum() * 4, carbs.sum() * 4, fat.sum() * 9])
+    total = energy.sum()
+    if not total:
+        return {'protein': 0.0, 'carbs': 0.0, 'fat': 0.0}
+    shares = np.round(energy / total * 100, 1)
+    return {'protein': float(shares[0]), 'carbs': float(shares[1]), 'fat': float(shares[2])}
+
+
+def _mean_logged(values, logged):
+    return float(values[logged].mean()) if logged.any() else 0.0
+
+
+def compute_insights(series, goals, period_days):
+    """
+    Summarize the last `period_days` of a series against the user's goals.
+
+    The series should cover two periods so the last one can be compared
+    with the one before it.
+
+    Args:
+        series: DailySeries from load_daily_series
+        goals: Dictionary with calorie, protein and water goals (values may be None)
+        period_days: Length of the reported period in days
+
+    Returns:
+        Dictionary of summary metrics for the analytics page
+    """
+    current = slice(-period_days, None)
+    previous = slice(-2 * period_days, -period_days)
+
+    calories = series.calories[current]
+    food_logged = series.food_logged[current]
+    water = series.water[current]
+    water_logged = series.water_logged[current]
+
+    avg_calories = _mean_logged(calories, food_logged)
+    previous_avg = _mean_logged(series.calories[previous], series.food_logged[previous])
+    calorie_change = round((avg_calories - previous_avg) / previous_avg * 100, 1) if previous_avg else None
+
+    avg_protein = _mean_logged(series.protein[current], food_logged)
+    protein_goal = goals.get('protein')
+    water_goal = goals.get('water')
+
+    water_hits = water_logged & (water >= water_goal) if water_goal else np.zeros(len(water), dtype=bool)
+    current_streak, longest_streak = streaks(series.food_logged)
+
+    return {
+        'avg_calories': round(avg_calories),
+        'calorie_change': calorie_change,
+        'calorie_adherence': round(adherence(calories, goals.get('calories'), food_logged), 1),
+        'rolling_calories_7': round(float(np.nan_to_num(rolling_mean(series.calories, series.food_logged, 7)[-1]))),
+        'rolling_calories_30': round(float(np.nan_to_num(rolling_mean(series.calories, series.food_logged, 30)[-1]))),
+        'avg_protein': round(avg_protein),
+        'protein_goal_pct': round(avg_protein / protein_goal * 100) if protein_goal else None,
+        'water_days_on_goal': int(water_hits.sum()),
+        'water_consistency': round(float(water_hits.mean() * 100)) if len(water_hits) else 0,
+        'logging_streak': current_streak,
+        'longest_logging_streak': longest_streak,
+        'macro_ratios': macro_ratios(series.protein[current], series.carbs[current], series.fat[current])
+    }
+
+
+def lttb_indices(values, n_out):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling.
+
+    The first and last points are always kept. The points in between are
+    split into n_out - 2 buckets, and each bucket keeps the point that forms
+    the largest triangle with the previously kept point and the average of
+    the next bucket. Bucket averages and triangle areas are computed with
+    array operations; only the walk from bucket to bucket is a Python loop,
+    since each choice depends on the previous one.
+    """
+    y = np.asarray(values, dtype=np.float64)
+    n = len(y)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.arange(n, dtype=np.float64)
+
+    # Bucket i covers [edges[i], edges[i + 1]); the last edge is the final point
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(np.int64) + 1
+    counts = np.diff(edges)
+    avg_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+
+    # Each bucket looks ahead to the next bucket's average, the last one to the final point
+    next_x = np.append(avg_x[1:], x[-1])
+    next_y = np.append(avg_y[1:], y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        area = np.abs((x[a] - next_x[i]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (next_y[i] - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+
+    return selected
+
+
+# Share of each new weigh-in folded into the trend per day (the classic 10% weight trend)
+TREND_SMOOTHING = 0.1
+
+# Largest exponent allowed within one block of the closed-form EMA; e**60 is
+# far from float64 overflow and keeps the block sums exact enough
+_EMA_BLOCK_EXPONENT = 60.0
+
+
+def ema_trend(days, values, smoothing=TREND_SMOOTHING):
+    """
+    Exponentially smoothed trend of an irregularly sampled series.
+
+    Each observation moves the trend by 1 - (1 - smoothing) ** gap, where gap
+    is the number of days since the previous observation, so skipped
+    weigh-ins do not distort it. The recurrence
+        s[i] = d[i] * s[i - 1] + (1 - d[i]) * x[i],  d[i] = exp(-rate * gap[i])
+    has the closed form
+        s[i] = exp(-rate * t[i]) * (s[start] + cumsum((1 - d) * x * exp(rate * t))[i])
+    which is evaluated with cumulative sums. To keep exp() in range the
+    series is cut into blocks spanning a bounded number of days, and the
+    last trend value of each block seeds the next; the loop is over blocks
+    (a handful for ten years of data), not over days.
+
+    Args:
+        days: Day numbers of the observations, ascending
+        values: Observed values
+        smoothing: Weight of a new observation after a one-day gap
+
+    Returns:
+        Array of trend values, one per observation
+    """
+    t = np.asarray(days, dtype=np.float64)
+    x = np.asarray(values, dtype=np.float64)
+    if not len(x):
+        return x.copy()
+
+    rate = -np.log1p(-smoothing)
+    gaps = np.diff(t, prepend=t[0])
+    decay = np.exp(-rate * gaps)
+
+    trend = np.empty_like(x)
+    block_ids = ((t - t[0]) * rate // _EMA_BLOCK_EXPONENT).astype(np.int64)
+    bounds = np.flatnonzero(np.diff(block_ids, prepend=-1, append=block_ids[-1] + 1))
+    previous = x[0]
+
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        offset = t[lo:hi] - t[lo]
+        growth = np.exp(rate * offset)
+        seed = previous * decay[lo]
+        sums = np.cumsum((1 - decay[lo:hi]) * x[lo:hi] * growth)
+        trend[lo:hi] = (seed + sums) / growth
+        previous = trend[hi - 1]
+
+    return trend
+
+
+def weekly_rate(days, trend):
+    """
+    Change in the trend over the previous 7 days, per observation.
+
+    The trend value a week earlier is linearly interpolated between the
+    surrounding observations. Observations less than a week after the first
+    one have no full week behind them and are NaN.
+    """
+    t = np.asarray(days, dtype=np.float64)
+    if not len(t):
+        return np.asarray(trend, dtype=np.float64).copy()
+    week_ago = np.interp(t - 7, t, trend)
+    return np.where(t - t[0] >= 7, trend - week_ago, np.nan)
@@ -1,35 +1,103 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify, Response, stream_with_context, send_from_directory
 from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 import os
 from dotenv import load_dotenv
 from database import db, init_db
-from models import User, UserProfile, FoodEntry, WaterIntake
-from datetime import datetime, date
-from together_ai import get_nutrition_recommendation, analyze_food, analyze_user_needs
+from models import User, UserProfile, FoodEntry, WaterIntake, Job
+from datetime import datetime, date, timedelta
+from exports import EXPORT_FORMATS, iter_export_rows, gzip_chunks
+from analytics import BUCKETS, default_bucket, get_nutrition_series, get_insights, downsample_series
+from rollups import mark_dirty
+from weight_log import record_weight, get_weight_trend
+from http_cache import bump_data_version, conditional_on_data_version, cache_anonymous_page
+from commands import register_commands
+from assets import init_assets
+from metrics import init_metrics
+from query_stats import init_query_stats
+from llm_tracing import init_llm_tracing
+from llm_limits import admit_llm_call, llm_cache_key, get_cached_llm_result, cache_llm_result, too_many_requests
+from jobs import init_jobs, enqueue, latest_job, job_status, PRIORITY_INTERACTIVE, ACTIVE_STATUSES
+from background_tasks import user_needs_cache_key, recommendation_cache_key, recommendation_retry_due, export_dir
 
-# Load environment variables
+# Load environment variables (once per process, before any module reads them)
 load_dotenv()
 
-app = Flask(__name__)
-app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key')
-
-# Initialize database
-init_db(app)
-
 # Flask-Login setup
 login_manager = LoginManager()
-login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Views are collected here and attached to every app create_app() builds;
+# endpoint names stay the view function names, so url_for() is unchanged
+_routes = []
+
+def route(rule, **options):
+    def decorator(view):
+        _routes.append((rule, view, options))
+        return view
+    return decorator
+
+def create_app(config=None):
+    """
+    Build and configure a NutriFit app.
+    
+    Nothing here touches the database schema; run `flask --app app init-db`
+    to create tables and indexes. The Together AI client (and requests) and
+    NumPy are imported on first use, not at startup.
+    
+    Args:
+        config: Optional mapping of Flask config values, applied after
+            NUTRIFIT_-prefixed environment variables
+    
+    Returns:
+        The Flask app
+    """
+    app = Flask(__name__)
+    app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-secret-key')
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URL', 'sqlite:///nutrifit.db')
+    # Any config key can also come from a NUTRIFIT_<KEY> environment variable
+    app.config.from_prefixed_env('NUTRIFIT')
+    if config:
+        app.config.from_mapping(config)
+    
+    # Initialize database
+    init_db(app)
+    
+    login_manager.init_app(app)
+    
+    # Admin CLI commands (flask --app app <command>)
+    register_commands(app)
+    
+    # Fingerprinted static bundles (flask build-assets) and the asset_urls() template helper
+    init_assets(app)
+    
+    # Per-endpoint request counts, latency histograms and in-flight gauges on /metrics
+    init_metrics(app)
+    
+    # SQL statement counts, per-request DB time and the slow-query log
+    init_query_stats(app)
+    
+    # Together AI time per request, next to the HTTP and SQL timings (calls are traced in together_ai)
+    init_llm_tracing(app)
+    
+    # Slow work (LLM calls, exports, rollup rebuilds) runs as queued jobs (flask jobs-worker, or embedded)
+    init_jobs(app)
+    
+    for rule, view, options in _routes:
+        app.add_url_rule(rule, view_func=view, **options)
+    
+    return app
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
 
-@app.route('/')
+@route('/')
+@cache_anonymous_page
 def index():
     return render_template('index.html', current_year=datetime.now().year)
 
-@app.route('/login', methods=['GET', 'POST'])
+@route('/login', methods=['GET', 'POST'])
+@cache_anonymous_page
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -50,7 +118,8 @@ def login():
     
     return render_template('login.html', current_year=datetime.now().year)
 
-@app.route('/signup', methods=['GET', 'POST'])
+@route('/signup', methods=['GET', 'POST'])
+@cache_anonymous_page
 def signup():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -95,7 +164,7 @@ def signup():
     
     return render_template('signup.html', current_year=datetime.now().year)
 
-@app.route('/dashboard')
+@route('/dashboard')
 @login_required
 def dashboard():
     # Check if profile is complete
@@ -105,7 +174,7 @@ def dashboard():
     
     # Get today's food entries
     today = date.today()
-    food_entries = FoodEntry.query.filter_by(user_id=current_user.id, date=today).all()
+    food_entries = FoodEntry.query.filter_by(user_id=current_user.id, date=today).order_by(FoodEntry.id).all()
     
     # Get user profile
     user_profile = current_user.profile
@@ -127,10 +196,28 @@ def dashboard():
     total_carbs = sum(entry.carbs for entry in food_entries)
     total_fat = sum(entry.fat for entry in food_entries)
     
-    # Get AI recommendation if we have entries
+    # The AI recommendation for the profile and today's last three entries comes from the
+    # shared cache, or else from a background job the page polls (not queued without an
+    # API key or while the user is over the AI rate limit; one that gave nothing is queued
+    # again after a backoff)
     recommendation = None
+    recommendation_job = None
     if food_entries and user_profile:
-        recommendation = get_nutrition_recommendation(user_profile, food_entries[-3:])
+        import together_ai
+        recent = food_entries[-3:]
+        cache_key = recommendation_cache_key(user_profile, recent)
+        recommendation = get_cached_llm_result(cache_key)
+        if not recommendation and together_ai.TOGETHER_API_KEY:
+            dedupe_key = f'recommendation:{current_user.id}:{cache_key}'
+            job = latest_job(dedupe_key)
+            if (job is None or recommendation_retry_due(job)) and admit_llm_call(current_user.id)[0]:
+                job = enqueue('recommendation', {'user_id': current_user.id,
+                                                 'food_ids': [entry.id for entry in recent]},
+                              user_id=current_user.id, dedupe_key=dedupe_key)
+            if job is not None and job.status == 'succeeded':
+                recommendation = job_status(job)['result']['text']
+            elif job is not None and job.status in ACTIVE_STATUSES:
+                recommendation_job = job
     
     # Check if any nutrition goals are None and calculate them if needed
     calorie_goal = user_profile.daily_calorie_goal
@@ -169,6 +256,7 @@ def dashboard():
             update_needed = True
             
         if update_needed:
+            bump_data_version(current_user.id)
             db.session.commit()
             flash('Your nutrition goals have been automatically set based on your profile information.', 'info')
     
@@ -185,19 +273,31 @@ def dashboard():
         water_amount=water_intake.amount,
         water_goal=water_goal,
         recommendation=recommendation,
+        recommendation_job=recommendation_job,
         food_entries=food_entries,
         show_needs_dialog=session.pop('show_needs_dialog', False),
         current_year=datetime.now().year
     )
 
-@app.route('/add_food', methods=['POST'])
+@route('/add_food', methods=['POST'])
 @login_required
 def add_food():
-    name = request.form.get('food-name')
-    calories = int(request.form.get('calories', 0))
-    protein = float(request.form.get('protein', 0))
-    carbs = float(request.form.get('carbs', 0))
-    fat = float(request.form.get('fat', 0))
+    # Form posts (no JavaScript) redirect back to the dashboard; the dashboard's
+    # own requests ask for JSON and update the page in place
+    try:
+        name = request.form.get('food-name', '').strip()
+        calories = int(request.form.get('calories', 0))
+        protein = float(request.form.get('protein') or 0)
+        carbs = float(request.form.get('carbs') or 0)
+        fat = float(request.form.get('fat') or 0)
+    except ValueError:
+        name = None
+    
+    if not name:
+        if wants_json():
+            return jsonify({'error': 'A food name and numeric nutrition values are required'}), 400
+        flash('Please enter a food name and numeric nutrition values', 'error')
+        return redirect(url_for('dashboard'))
     
     new_entry = FoodEntry(
         user_id=current_user.id,
@@ -210,15 +310,40 @@ def add_food():
     )
     
     db.session.add(new_entry)
+    mark_dirty(current_user.id, new_entry.date)
+    bump_data_version(current_user.id)
     db.session.commit()
     
+    if wants_json():
+        return jsonify({
+            'entry': {
+                'id': new_entry.id,
+                'name': new_entry.name,
+                'calories': new_entry.calories,
+                'protein': new_entry.protein,
+                'carbs': new_entry.carbs,
+                'fat': new_entry.fat,
+                'date': new_entry.date.isoformat()
+            },
+            'totals': daily_totals(current_user.id, new_entry.date)
+        }), 201
+    
     flash('Food added successfully!', 'success')
     return redirect(url_for('dashboard'))
 
-@app.route('/add_water', methods=['POST'])
+@route('/add_water', methods=['POST'])
 @login_required
 def add_water():
-    amount = int(request.form.get('water_amount', 0))
+    try:
+        amount = int(request.form.get('water_amount', 0))
+    except ValueError:
+        amount = 0
+    
+    if amount <= 0:
+        if wants_json():
+            return jsonify({'error': 'Water amount must be a positive number of ml'}), 400
+        flash('Please enter a positive water amount', 'error')
+        return redirect(url_for('dashboard'))
     
     today = date.today()
     water_intake = WaterIntake.query.filter_by(user_id=current_user.id, date=today).first()
@@ -233,24 +358,54 @@ def add_water():
         )
         db.session.add(water_intake)
     
+    mark_dirty(current_user.id, today)
+    bump_data_version(current_user.id)
     db.session.commit()
     
+    if wants_json():
+        return jsonify({
+            'entry': {'amount': amount, 'date': today.isoformat()},
+            'totals': daily_totals(current_user.id, today)
+        })
+    
     flash('Water intake updated!', 'success')
     return redirect(url_for('dashboard'))
 
-@app.route('/analyze_food', methods=['POST'])
+@route('/analyze_food', methods=['POST'])
 @login_required
 def analyze_food_route():
     food_description = request.form.get('food_description')
     if not food_description:
         return jsonify({'error': 'No food description provided'}), 400
     
+    # The local catalog and cached answers are free; only API calls are rate limited
+    import together_ai
+    nutrition = together_ai.analyze_food_locally(food_description)
+    if together_ai.has_nutrition(nutrition):
+        return jsonify(nutrition)
+    
+    cache_key = llm_cache_key('food', food_description.strip().lower())
+    cached = get_cached_llm_result(cache_key)
+    if cached:
+        return jsonify(cached)
+    
+    # Without an API key no call is made, so none is admitted either
+    if not together_ai.TOGETHER_API_KEY:
+        return jsonify(nutrition)
+    
+    allowed, retry_after = admit_llm_call(current_user.id)
+    if not allowed:
+        return too_many_requests(retry_after)
+    
     # Use Together AI to analyze the food
-    nutrition = analyze_food(food_description)
+    api_nutrition = together_ai.analyze_food_with_api(food_description)
+    if api_nutrition:
+        cache_llm_result(cache_key, api_nutrition)
+        return jsonify(api_nutrition)
     
     return jsonify(nutrition)
 
-@app.route('/analyze_user_needs', methods=['GET'])
+@route('/analyze_user_needs', methods=['GET'])
 @login_required
 def analyze_user_needs_route():
     # Get user profile
@@ -259,12 +414,22 @@ def analyze_user_needs_route():
     if not user_profile:
         return jsonify({'error': 'Profile not found'}), 404
     
-    # Use Together AI to analyze user needs
-    needs = analyze_user_needs(user_profile)
+    needs = get_cached_llm_result(user_needs_cache_key(user_profile))
+    if needs:
+        return jsonify(needs)
+    
+    # Without an API key, or over the limit, answer with the formula-based estimate
+    # instead of waiting (only calls that will reach the API take a token)
+    import together_ai
+    if not together_ai.TOGETHER_API_KEY or not admit_llm_call(current_user.id)[0]:
+        return jsonify(together_ai.get_default_needs(user_profile))
     
-    return jsonify(needs)
+    # The Together AI analysis runs as a job; the client polls status_url for the result
+    job = enqueue('user_needs', {'user_id': current_user.id}, user_id=current_user.id,
+                  priority=PRIORITY_INTERACTIVE, dedupe_key=f'needs:{current_user.id}')
+    return job_accepted(job)
 
-@app.route('/profile', methods=['GET', 'POST'])
+@route('/profile', methods=['GET', 'POST'])
 @login_required
 def profile():
     user_profile = current_user.profile
@@ -311,6 +476,12 @@ def profile():
         was_incomplete = not user_profile.is_profile_complete
         user_profile.is_profile_complete = is_complete
         
+        # Keep the history; the profile only holds the latest weight
+        if user_profile.weight:
+            record_weight(current_user.id, user_profile.weight)
+        
+        # Goals feed the analytics insights, so cached data responses are stale now
+        bump_data_version(current_user.id)
         db.session.commit()
         
         if is_complete and was_incomplete:
@@ -346,19 +517,190 @@ def profile():
     
     return render_template('profile.html', user_profile=user_profile, bmi=bmi, bmi_category=bmi_category, bmi_message=bmi_message, current_year=datetime.now().year)
 
-@app.route('/logout')
+@route('/logout')
 @login_required
 def logout():
     logout_user()
     return redirect(url_for('index'))
 
-@app.route('/analytics')
+@route('/analytics')
 @login_required
 def analytics():
-    # In the future, this will fetch real data from the database
-    # For now, we'll use dummy data for the charts
+    # Chart data is loaded by analytics.js from /api/analytics
     return render_template('analytics.html', current_year=datetime.now().year)
 
+@route('/api/analytics')
+@login_required
+@conditional_on_data_version
+def analytics_data():
+    try:
+        # Default to the last `days` days (7 unless given) ending today
+        start, end = parse_date_range(request.args, default_days=7)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    bucket = request.args.get('bucket') or default_bucket(start, end)
+    if bucket not in BUCKETS:
+        return jsonify({'error': f'Bucket must be one of: {", ".join(BUCKETS)}'}), 400
+    
+    data = get_nutrition_series(current_user.id, start, end, bucket)
+    data['insights'] = get_insights(current_user.id, current_user.profile, start, end)
+    
+    # Optional target point count for long ranges (shape-preserving downsampling)
+    points = request.args.get('points', type=int)
+    if points:
+        data = downsample_series(data, max(points, 3))
+    
+    return jsonify(data)
+
+@route('/api/weight_trend')
+@login_required
+@conditional_on_data_version
+def weight_trend_data():
+    try:
+        start, end = parse_date_range(request.args, default_days=90)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    points = request.args.get('points', type=int)
+    return jsonify(get_weight_trend(current_user.id, start, end, points))
+
+@route('/export')
+@login_required
+def export_data():
+    export_format = request.args.get('format', 'csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported export format: {export_format}'}), 400
+    
+    try:
+        start, end = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # ?background=1 writes the file in a job, for exports too large to stream in one request
+    if request.args.get('background') == '1':
+        job = enqueue('export', {
+            'user_id': current_user.id,
+            'format': export_format,
+            'start': start.isoformat() if start else None,
+            'end': end.isoformat() if end else None,
+            'gzip': request.args.get('gzip') == '1'
+        }, user_id=current_user.id)
+        return job_accepted(job)
+    
+    encoder, mimetype, extension = EXPORT_FORMATS[export_format]
+    
+    # Rows are streamed straight from the database cursor, nothing is buffered here
+    chunks = encoder(iter_export_rows(current_user.id, start, end))
+    filename = f'nutrifit-export.{extension}'
+    
+    if request.args.get('gzip') == '1':
+        chunks = gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+    
+    return Response(
+        stream_with_context(chunks),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
+@route('/jobs/<int:job_id>')
+@login_required
+def job_status_route(job_id):
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id).first_or_404()
+    response = jsonify(job_status(job))
+    if job.status in ACTIVE_STATUSES:
+        response.headers['Retry-After'] = '1'
+    return response
+
+@route('/jobs/<int:job_id>/download')
+@login_required
+def job_download(job_id):
+    job = Job.query.filter_by(id=job_id, user_id=current_user.id, kind='export').first_or_404()
+    if job.status != 'succeeded':
+        return jsonify(job_status(job)), 409
+    
+    result = job_status(job)['result']
+    return send_from_directory(export_dir(), result['file'], mimetype=result['mimetype'],
+                               as_attachment=True, download_name=result['filename'])
+
+# Helper function to answer 202 Accepted with where to poll a queued job
+def job_accepted(job):
+    status_url = url_for('job_status_route', job_id=job.id)
+    response = jsonify({'job_id': job.id, 'status': job.status, 'status_url': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    return response
+
+# Longest range the chart APIs compute in one request (about ten years), and the
+# earliest date a range may touch, which leaves room for look-back windows before it
+MAX_RANGE_DAYS = 3660
+EARLIEST_DATE = date(1900, 1, 1)
+
+# Helper function to read an optional ?start=&end= date range
+def parse_date_range(args, default_days=None):
+    """
+    Parse ISO formatted start/end query arguments, either of which may be omitted.
+    
+    With default_days (for the chart APIs), a missing end is today and a missing
+    start is `days` days (default_days unless given) before it, and ranges longer
+    than MAX_RANGE_DAYS are refused.
+    
+    Raises:
+        ValueError with a message for the client when the range is invalid
+    """
+    try:
+        start = date.fromisoformat(args['start']) if args.get('start') else None
+        end = date.fromisoformat(args['end']) if args.get('end') else None
+    except ValueError:
+        raise ValueError('Dates must be in YYYY-MM-DD format')
+    
+    # Look-back windows (previous period, trend warm-up) are subtracted from the start
+    if (start and start < EARLIEST_DATE) or (end and end < EARLIEST_DATE):
+        raise ValueError(f'Dates must be on or after {EARLIEST_DATE.isoformat()}')
+    
+    if start and end and start > end:
+        raise ValueError('Start date must be before end date')
+    
+    if default_days is None:
+        return start, end
+    
+    days = args.get('days', default_days, type=int)
+    if days > MAX_RANGE_DAYS:
+        raise ValueError(f'days must be at most {MAX_RANGE_DAYS}')
+    end = end or date.today()
+    start = start or end - timedelta(days=max(days, 1) - 1)
+    if (end - start).days + 1 > MAX_RANGE_DAYS:
+        raise ValueError(f'Date ranges can cover at most {MAX_RANGE_DAYS} days')
+    
+    return start, end
+
+# Helper function to tell the dashboard's fetch() calls from plain form posts
+def wants_json():
+    return request.accept_mimetypes.best == 'application/json'
+
+# Helper function to sum a user's food and water for one day
+def daily_totals(user_id, day):
+    calories, protein, carbs, fat = db.session.query(
+        db.func.coalesce(db.func.sum(FoodEntry.calories), 0),
+        db.func.coalesce(db.func.sum(FoodEntry.protein), 0),
+        db.func.coalesce(db.func.sum(FoodEntry.carbs), 0),
+        db.func.coalesce(db.func.sum(FoodEntry.fat), 0)
+    ).filter_by(user_id=user_id, date=day).one()
+    
+    water = db.session.query(
+        db.func.coalesce(db.func.sum(WaterIntake.amount), 0)
+    ).filter_by(user_id=user_id, date=day).scalar()
+    
+    return {
+        'calories': calories,
+        'protein': round(protein, 1),
+        'carbs': round(carbs, 1),
+        'fat': round(fat, 1),
+        'water': water
+    }
+
 # Helper function to calculate default nutrition goals
 def calculate_default_goals(user_profile):
     """Calculate default nutrition goals based on user profile if not already set"""
@@ -404,4 +746,4 @@ def calculate_default_goals(user_profile):
     }
 
 if __name__ == '__main__':
-    app.run(debug=True) 
\ No newline at end of file
+    create_app().run(debug=True) 
\ No newline at end of file
@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import current_app, request, send_from_directory, url_for
+
+# Bundles served by the templates, each built from source files under static/.
+# Sources are concatenated in order, so CSS keeps its cascade.
+BUNDLES = {
+    'css/app.css': [
+        'css/redesign/design-system.css',
+        'css/redesign/components.css',
+        'css/redesign/layouts.css',
+        'css/redesign/animations.css',
+        'css/redesign/dark-theme.css'
+    ],
+    'js/app.js': ['js/theme-switcher.js'],
+    'js/analytics.js': ['js/analytics.js']
+}
+
+DIST_DIR = 'dist'
+MANIFEST_NAME = 'manifest.json'
+
+# Hashed file names change whenever their content does, so they never need revalidating
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+_STRING = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+_CSS_COMMENT = re.compile(r'/\*.*?\*/', re.S)
+
+
+def minify_css(source):
+    """
+    Strip comments and redundant whitespace from a stylesheet.
+
+    Quoted strings (data URIs, content values) are left untouched.
+    """
+    source = _CSS_COMMENT.sub('', source)
+    parts = _STRING.split(source)
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'\s+', ' ', parts[i])
+        part = re.sub(r'\s*([{};,>])\s*', r'\1', part)
+        # Only after a colon: a space before one is a descendant combinator (a :hover)
+        part = re.sub(r':\s+', ':', part)
+        parts[i] = part.replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(source):
+    """Minify with rjsmin when it is installed, otherwise only trim trailing whitespace"""
+    try:
+        from rjsmin import jsmin
+    except ImportError:
+        return '\n'.join(line.rstrip() for line in source.splitlines() if line.strip()) + '\n'
+    return jsmin(source)
+
+
+def _hashed_name(name, content):
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    return f'{stem}.{digest}{ext}'
+
+
+def build_assets(static_folder, bundles=BUNDLES):
+    """
+    Bundle, minify, fingerprint and precompress the static assets.
+
+    Each bundle is written to static/dist under a content-hashed name, next
+    to .gz and (when the brotli package is installed) .br copies. The
+    manifest maps bundle names to the hashed files. Files from earlier
+    builds are kept, so pages rendered before a deploy can still load them.
+
+    Returns:
+        The manifest dictionary
+    """
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+
+    for name, sources in bundles.items():
+        text = '\n'.join(_read(static_folder, source) for source in sources)
+        minify = minify_css if name.endswith('.css') else minify_js
+        content = minify(text).encode('utf-8')
+
+        hashed = _hashed_name(name, content)
+        path = os.path.join(dist, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        _write(path, content)
+        # mtime=0 keeps the gzip output identical between builds
+        _write(path + '.gz', gzip.compress(content, compresslevel=9, mtime=0))
+        if brotli:
+            _write(path + '.br', brotli.compress(content, quality=11))
+
+        manifest[name] = {'file': hashed, 'bytes': len(content), 'sources': sources}
+
+    _write(os.path.join(dist, MANIFEST_NAME), json.dumps(manifest, indent=2).encode('utf-8'))
+    return manifest
+
+
+def _read(static_folder, source):
+    with open(os.path.join(static_folder, source), encoding='utf-8') as f:
+        return f.read()
+
+
+def _write(path, content):
+    """Write through a temporary file so a running server never serves a partial file"""
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def load_manifest(static_folder):
+    path = os.path.join(static_folder, DIST_DIR, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def asset_urls(name):
+    """
+    URLs to load a bundle from templates.
+
+    After `flask build-assets` this is the single fingerprinted file;
+    without a build (local development) it falls back to the unbundled
+    source files.
+    """
+    manifest = current_app.extensions.get('asset_manifest')
+    if manifest and name in manifest:
+        return [url_for('dist_asset', filename=manifest[name]['file'])]
+    return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+
+def dist_asset(filename):
+    """Serve a built asset, precompressed when the client accepts it, cached forever"""
+    dist = os.path.join(current_app.static_folder, DIST_DIR)
+    mimetype = mimetypes.guess_type(filename)[0]
+    accepted = request.accept_encodings
+
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if accepted[encoding] and os.path.exists(os.path.join(dist, filename + suffix)):
+            response = send_from_directory(dist, filename + suffix, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(dist, filename, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    """Load the asset manifest and register the dist route and template helper"""
+    app.extensions['asset_manifest'] = load_manifest(app.static_folder)
+    app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>', 'dist_asset', dist_asset)
+    app.add_template_global(asset_urls)
@@ -0,0 +1,140 @@
+import json
+import os
+import time
+from datetime import date, datetime, timedelta
+
+from flask import current_app
+
+from jobs import job_handler
+from llm_limits import llm_cache_key, get_cached_llm_result, cache_llm_result
+from models import UserProfile, FoodEntry
+
+# Finished export files are kept this long for download, then deleted
+EXPORT_TTL = 24 * 60 * 60
+
+# Seconds after a recommendation job gave nothing before a dashboard load queues another
+RECOMMENDATION_RETRY_AFTER = 5 * 60
+
+
+def user_needs_cache_key(profile):
+    """Shared-store key of the needs analysis for a profile's current inputs"""
+    return llm_cache_key('needs', profile.age, profile.weight, profile.height,
+                         profile.gender, profile.activity_level, profile.goal)
+
+
+def recommendation_cache_key(profile, foods):
+    """
+    Shared-store key of the recommendation for a profile and its recent foods.
+
+    It hashes exactly the prompt's inputs, so users in the same state share
+    one recommendation, and a new food or profile change gives a new key.
+    """
+    from together_ai import recommendation_signature
+    return llm_cache_key('recommendation', *recommendation_signature(profile, foods))
+
+
+def recommendation_retry_due(job):
+    """
+    True when a finished recommendation job gave no text and the retry
+    backoff since it finished has passed, so a new one may be queued
+    """
+    if job.status == 'succeeded':
+        if json.loads(job.result or '{}').get('text'):
+            return False
+    elif job.status != 'failed':
+        return False
+    return job.finished_at is None or \
+        datetime.utcnow() - job.finished_at >= timedelta(seconds=RECOMMENDATION_RETRY_AFTER)
+
+
+@job_handler('recommendation', max_attempts=2)
+def recommendation_task(run):
+    """AI recommendation for what to eat next, from the profile and the foods the dashboard showed"""
+    import together_ai
+
+    if not together_ai.TOGETHER_API_KEY:
+        raise RuntimeError('TOGETHER_API_KEY is not set')
+
+    profile = UserProfile.query.filter_by(user_id=run.payload['user_id']).first()
+    # Exactly the entries the dashboard hashed into the job's dedupe key, not whatever is latest now
+    foods = FoodEntry.query.filter(FoodEntry.id.in_(run.payload['food_ids'])).order_by(FoodEntry.id).all()
+
+    cache_key = recommendation_cache_key(profile, foods)
+    text = get_cached_llm_result(cache_key)
+    if text:
+        return {'text': text}
+
+    text = together_ai.get_nutrition_recommendation_with_api(profile, foods)
+    if text is None:
+        raise RuntimeError('No usable recommendation from the API')
+    cache_llm_result(cache_key, text)
+    return {'text': text}
+
+
+@job_handler('user_needs', max_attempts=2)
+def user_needs_task(run):
+    """Needs analysis from the API, cached; the formula estimate once the API keeps failing"""
+    import together_ai
+
+    profile = UserProfile.query.filter_by(user_id=run.payload['user_id']).first()
+    needs = together_ai.analyze_user_needs_with_api(profile)
+    if needs:
+        cache_llm_result(user_needs_cache_key(profile), needs)
+        return needs
+
+    if together_ai.TOGETHER_API_KEY and run.attempt < run.max_attempts:
+        raise RuntimeError('No usable needs analysis from the API')
+    return together_ai.get_default_needs(profile)
+
+
+@job_handler('rebuild_rollups', heavy=True, max_attempts=1)
+def rebuild_rollups_task(run):
+    from rollups import rebuild_rollups, refresh_rollups
+
+    if run.payload.get('dirty_only'):
+        return {'days': refresh_rollups()}
+    return {'rows': rebuild_rollups()}
+
+
+def export_dir():
+    return current_app.config.get('EXPORT_DIR') or os.path.join(current_app.instance_path, 'exports')
+
+
+def _purge_old_exports(directory):
+    cutoff = time.time() - EXPORT_TTL
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        if os.path.getmtime(path) < cutoff:
+            os.remove(path)
+
+
+@job_handler('export')
+def export_task(run):
+    """Write a data export to the export folder for download through the job's download URL"""
+    from exports import EXPORT_FORMATS, iter_export_rows, gzip_chunks
+
+    payload = run.payload
+    encoder, mimetype, extension = EXPORT_FORMATS[payload['format']]
+    start = date.fromisoformat(payload['start']) if payload.get('start') else None
+    end = date.fromisoformat(payload['end']) if payload.get('end') else None
+
+    chunks = encoder(iter_export_rows(payload['user_id'], start, end))
+    filename = f'nutrifit-export.{extension}'
+    if payload.get('gzip'):
+        chunks = gzip_chunks(chunks)
+        mimetype = 'application/gzip'
+        filename += '.gz'
+
+    directory = export_dir()
+    os.makedirs(directory, exist_ok=True)
+    _purge_old_exports(directory)
+
+    stored = f'job-{run.id}-{filename}'
+    tmp_path = os.path.join(directory, stored + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        for chunk in chunks:
+            f.write(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+    os.replace(tmp_path, os.path.join(directory, stored))
+
+    return {'file': stored, 'filename': filename, 'mimetype': mimetype,
+            'bytes': os.path.getsize(os.path.join(directory, stored))}
@@ -0,0 +1,80 @@
+"""
+Benchmark the NumPy analytics engine on 1, 5 and 10 years of daily data.
+
+Runs the full set of metrics the analytics API needs (rolling 7/30-day
+averages, adherence, streaks, macro ratios, insights, LTTB downsampling)
+on synthetic gap-filled series and fails if any size exceeds the time
+budget.
+
+Usage:
+    python benchmarks/bench_analytics_engine.py [--budget-ms 5] [--repeat 200]
+"""
+import argparse
+import os
+import sys
+import timeit
+from datetime import date, timedelta
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics_engine import (DailySeries, rolling_mean, adherence, streaks,  # noqa: E402
+                              macro_ratios, compute_insights, lttb_indices)
+
+YEARS = (1, 5, 10)
+GOALS = {'calories': 2200, 'protein': 150, 'water': 2500}
+
+
+def synthetic_series(days, seed=0):
+    """Realistic-looking daily totals with roughly 15% of days not logged"""
+    rng = np.random.default_rng(seed)
+    start = date.today() - timedelta(days=days - 1)
+    dates = np.arange(np.datetime64(start, 'D'), np.datetime64(start, 'D') + days)
+    food_logged = rng.random(days) > 0.15
+    water_logged = rng.random(days) > 0.2
+    calories = np.where(food_logged, rng.normal(2200, 300, days), 0.0)
+    protein = np.where(food_logged, rng.normal(140, 25, days), 0.0)
+    carbs = np.where(food_logged, rng.normal(250, 40, days), 0.0)
+    fat = np.where(food_logged, rng.normal(75, 15, days), 0.0)
+    water = np.where(water_logged, rng.normal(2400, 500, days), 0.0)
+    return DailySeries(start, dates, calories, protein, carbs, fat, water, food_logged, water_logged)
+
+
+def run_metrics(series):
+    rolling_mean(series.calories, series.food_logged, 7)
+    rolling_mean(series.calories, series.food_logged, 30)
+    rolling_mean(series.water, series.water_logged, 7)
+    adherence(series.calories, GOALS['calories'], series.food_logged)
+    streaks(series.food_logged)
+    macro_ratios(series.protein, series.carbs, series.fat)
+    compute_insights(series, GOALS, len(series.dates) // 2)
+    lttb_indices(series.calories, 150)
+    lttb_indices(series.water, 150)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=5.0, help='Maximum allowed time per run')
+    parser.add_argument('--repeat', type=int, default=200, help='Runs per history size')
+    args = parser.parse_args()
+
+    over_budget = False
+    print(f"{'history':>10} {'days':>6} {'best ms':>9} {'median ms':>10}")
+
+    for years in YEARS:
+        series = synthetic_series(years * 365)
+        run_metrics(series)  # warm up
+        timings = np.array(timeit.repeat(lambda: run_metrics(series), number=1, repeat=args.repeat)) * 1000
+        median = float(np.median(timings))
+        print(f"{years:>8}y {len(series.dates):>6} {timings.min():>9.3f} {median:>10.3f}")
+        over_budget = over_budget or median > args.budget_ms
+
+    if over_budget:
+        print(f"FAIL: median exceeded {args.budget_ms} ms budget")
+        sys.exit(1)
+    print(f"OK: all sizes within {args.budget_ms} ms budget")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+How the hot read paths slow down as the database grows.
+
+Builds a throwaway SQLite database and grows it with synthetic users (see
+synthetic_data.py) to each requested scale. At each scale it times the
+dashboard, the analytics API over 7, 90 and 365 days and the weight trend
+API through the real views, for randomly chosen users. It reports p50/p95
+latency, SQL statements and SQL time per request, then plots p50 latency
+against the number of food entries (needs matplotlib).
+
+Usage:
+    python benchmarks/bench_db_scaling.py [--scales 100,500,2000] [--days 365] [--samples 100]
+                                          [--plot db_scaling.png]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from database import db, create_schema  # noqa: E402
+from models import FoodEntry, User  # noqa: E402
+from rollups import rebuild_rollups  # noqa: E402
+from synthetic_data import generate_dataset  # noqa: E402
+
+QUERIES = (
+    ('dashboard', '/dashboard'),
+    ('analytics 7d', '/api/analytics?days=7'),
+    ('analytics 90d', '/api/analytics?days=90'),
+    ('analytics 365d', '/api/analytics?days=365'),
+    ('weight trend', '/api/weight_trend')
+)
+
+
+def grow(app, users, days, seed):
+    """Add users until the database holds `users`; returns (rows per second, food entries)"""
+    with app.app_context():
+        missing = users - db.session.query(User).count()
+        rows_per_second = None
+        if missing > 0:
+            started = time.perf_counter()
+            counts = generate_dataset(missing, days, seed=seed)
+            rows_per_second = sum(counts.values()) / (time.perf_counter() - started)
+            rebuild_rollups()
+        return rows_per_second, db.session.query(FoodEntry).count()
+
+
+def measure(app, users, samples, rng):
+    """Time each query for `samples` random users; returns {name: (latencies ms, queries, SQL ms)}"""
+    client = app.test_client()
+    results = {}
+    for name, url in QUERIES:
+        latencies, query_counts, sql_times = [], [], []
+        for i in range(samples + 5):
+            with client.session_transaction() as session:
+                session['_user_id'] = str(rng.randint(1, users))
+            started = time.perf_counter()
+            response = client.get(url)
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise RuntimeError(f'{url} returned {response.status_code}')
+            if i >= 5:  # warm-up
+                latencies.append(elapsed)
+                query_counts.append(int(response.headers['X-DB-Query-Count']))
+                sql_times.append(float(response.headers['X-DB-Query-Time-ms']))
+        results[name] = (np.array(latencies), np.mean(query_counts), np.mean(sql_times))
+    return results
+
+
+def plot(rows, path):
+    try:
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print(f'\nmatplotlib is not installed; skipped {path}')
+        return
+
+    fig, ax = plt.subplots(figsize=(8, 5))
+    food_rows = [row['food_entries'] for row in rows]
+    for name, _ in QUERIES:
+        ax.plot(food_rows, [row['results'][name][0] for row in rows], marker='o', label=f'{name} p50')
+        ax.plot(food_rows, [row['results'][name][1] for row in rows], linestyle=':', color=ax.lines[-1].get_color())
+    ax.set_xscale('log')
+    ax.set_yscale('log')
+    ax.set_xlabel('food_entry rows')
+    ax.set_ylabel('latency (ms); dotted: p95')
+    ax.set_title('NutriFit read latency by database size')
+    ax.grid(True, which='both', alpha=0.3)
+    ax.legend(fontsize='small')
+    fig.tight_layout()
+    fig.savefig(path, dpi=120)
+    print(f'\nPlot written to {path}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scales', default='100,500,2000', help='Comma-separated user counts, ascending')
+    parser.add_argument('--days', type=int, default=365, help='Days of history per user')
+    parser.add_argument('--samples', type=int, default=100, help='Timed requests per query and scale')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--plot', default='db_scaling.png', help='Where to write the plot')
+    args = parser.parse_args()
+    scales = sorted(int(scale) for scale in args.scales.split(','))
+
+    rows = []
+    with tempfile.TemporaryDirectory(prefix='nutrifit-scaling-') as tmp:
+        db_path = os.path.join(tmp, 'scaling.db')
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + db_path,
+            'SHARED_STORE_PATH': os.path.join(tmp, 'shared_store.db'),
+            'METRICS_DIR': os.path.join(tmp, 'metrics'),
+            'QUERY_STATS_HEADERS': True,
+            'LLM_GLOBAL_BURST': 0  # never call the LLM for dashboard recommendations
+        })
+        with app.app_context():
+            create_schema()
+
+        print(f"{'users':>7} {'food rows':>10} {'DB MB':>7}  {'query':<15} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'queries':>8} {'SQL ms':>7}")
+        for index, users in enumerate(scales):
+            rows_per_second, food_entries = grow(app, users, args.days, args.seed + index)
+            results = measure(app, users, args.samples, random.Random(args.seed))
+            size = os.path.getsize(db_path) / 2 ** 20
+
+            summary = {}
+            for name, (latencies, queries, sql_ms) in results.items():
+                p50, p95 = np.percentile(latencies, 50), np.percentile(latencies, 95)
+                summary[name] = (p50, p95)
+                print(f'{users:>7} {food_entries:>10} {size:>7.1f}  {name:<15} {p50:>8.2f} {p95:>8.2f} '
+                      f'{queries:>8.1f} {sql_ms:>7.2f}')
+            if rows_per_second:
+                print(f'{"":>27}(generated at {rows_per_second:,.0f} rows/s)')
+            rows.append({'users': users, 'food_entries': food_entries, 'results': summary})
+
+    plot(rows, args.plot)
+
+
+if __name__ == '__main__':
+    main()
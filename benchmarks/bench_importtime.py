@@ -0,0 +1,95 @@
+"""
+Profile the cold start of the app with python -X importtime.
+
+Builds the app in a fresh interpreter several times and reports the median
+time spent importing, the time create_app() itself takes and the slowest
+modules that app imports directly. Fails if the median import time exceeds the budget or if
+a module that should be imported lazily (the LLM client, NumPy, pyarrow)
+is loaded at startup.
+
+Usage:
+    python benchmarks/bench_importtime.py [--budget-ms 500] [--runs 5] [--top 10]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only some requests or commands need
+LAZY_MODULES = ('together_ai', 'requests', 'numpy', 'pyarrow', 'analytics_engine', 'population_stats')
+
+STARTUP = (
+    'import time; started = time.perf_counter(); '
+    'from app import create_app; imported = time.perf_counter(); '
+    'create_app(); done = time.perf_counter(); '
+    'print((imported - started) * 1000, (done - imported) * 1000)'
+)
+
+LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def profile_once():
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', STARTUP],
+                            cwd=ROOT, capture_output=True, text=True, check=True)
+    import_ms, create_ms = (float(value) for value in result.stdout.split())
+
+    # Indentation grows two spaces per nesting level and a module's line comes
+    # after its children's, so app's direct imports are the one-level-down
+    # lines just before the line for app
+    direct = {}
+    children = {}
+    loaded = set()
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        _, cumulative_us, indent, module = match.groups()
+        loaded.add(module)
+        if len(indent) == 3:
+            children[module] = int(cumulative_us) / 1000
+        elif len(indent) == 1:
+            if module == 'app':
+                direct = children
+            children = {}
+    return import_ms, create_ms, direct, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--budget-ms', type=float, default=500.0, help='Maximum median import time')
+    parser.add_argument('--runs', type=int, default=5, help='Fresh interpreters to profile')
+    parser.add_argument('--top', type=int, default=10, help='Slowest direct imports of app to list')
+    args = parser.parse_args()
+
+    runs = [profile_once() for _ in range(args.runs)]
+    import_ms = float(np.median([run[0] for run in runs]))
+    create_ms = float(np.median([run[1] for run in runs]))
+
+    # Slowest direct imports from the median run
+    _, _, direct, loaded = sorted(runs, key=lambda run: run[0])[len(runs) // 2]
+    print(f"{'module':<30} {'cumulative ms':>14}")
+    for module, ms in sorted(direct.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{module:<30} {ms:>14.1f}')
+    print()
+    print(f'import app: {import_ms:.1f} ms median, create_app(): {create_ms:.1f} ms median')
+
+    failed = False
+    eager = sorted(module for module in LAZY_MODULES if module in loaded)
+    if eager:
+        print(f"FAIL: imported at startup but should be lazy: {', '.join(eager)}")
+        failed = True
+    if import_ms > args.budget_ms:
+        print(f'FAIL: median import time exceeded {args.budget_ms} ms budget')
+        failed = True
+    if failed:
+        sys.exit(1)
+    print(f'OK: within {args.budget_ms} ms budget, no heavy modules loaded at startup')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+Tail latency of hedged Together AI calls against a slow-tailed upstream.
+
+Starts the fake LLM API (benchmarks/fake_llm.py) with a share of very slow
+responses, then makes analyze_food calls from --threads threads in this
+process for --duration seconds, first with hedging off and then with the
+configured percentile and budget. The report gives p50/p90/p99/max
+latency, the share of calls that sent a hedge and the hedge results.
+
+Usage:
+    python benchmarks/bench_llm_hedging.py [--threads 4] [--duration 30] [--llm-latency-ms 300]
+                                           [--slow-share 0.05] [--slow-ms 5000]
+                                           [--percentile 90] [--budget 0.1]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+
+from bench_wsgi import ROOT, free_port, wait_until_up
+
+sys.path.insert(0, ROOT)
+
+FIRED = ('primary_won', 'hedge_won', 'both_failed')
+
+
+def run(app, args):
+    import together_ai
+
+    stop = threading.Event()
+    latencies = []
+
+    def loop():
+        with app.app_context():
+            while not stop.is_set():
+                started = time.perf_counter()
+                together_ai._post_completion('analyze_food', 'Return nutrition as JSON for: bowl of ramen',
+                                             max_tokens=150, temperature=0.3, parse_json=True, hedge=True)
+                latencies.append(time.perf_counter() - started)
+
+    threads = [threading.Thread(target=loop) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return np.array(latencies) * 1000
+
+
+def hedge_results():
+    from metrics import _registry
+
+    series = _registry.snapshot().get('nutrifit_llm_hedges_total', [])
+    return Counter({dict(labels)['result']: value for labels, value in series})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=4, help='Threads making calls back to back')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds per run')
+    parser.add_argument('--llm-latency-ms', type=float, default=300.0)
+    parser.add_argument('--llm-jitter-ms', type=float, default=50.0)
+    parser.add_argument('--slow-share', type=float, default=0.05, help='Share of upstream responses that are slow')
+    parser.add_argument('--slow-ms', type=float, default=5000.0, help='Latency of the slow responses')
+    parser.add_argument('--percentile', type=float, default=90.0, help='Hedging deadline percentile')
+    parser.add_argument('--budget', type=float, default=0.1, help='Share of calls that may be hedged')
+    args = parser.parse_args()
+
+    llm_port = free_port()
+    os.environ['TOGETHER_API_URL'] = f'http://127.0.0.1:{llm_port}/v1/completions'
+    os.environ.setdefault('TOGETHER_API_KEY', 'fake')
+    fake_llm = subprocess.Popen([sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_llm.py'),
+                                 '--port', str(llm_port), '--latency-ms', str(args.llm_latency_ms),
+                                 '--jitter-ms', str(args.llm_jitter_ms), '--slow-share', str(args.slow_share),
+                                 '--slow-ms', str(args.slow_ms)],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(llm_port)
+        import together_ai
+        from app import create_app
+
+        print(f'{args.threads} threads, {args.llm_latency_ms:.0f} ms upstream with {args.slow_share:.0%} '
+              f'at {args.slow_ms:.0f} ms\n')
+        print(f"{'hedging':<24} {'calls':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+              f"{'hedged':>7}  results")
+        with tempfile.TemporaryDirectory(prefix='nutrifit-llm-hedging-') as tmp:
+            app = create_app({'METRICS_DIR': os.path.join(tmp, 'metrics')})
+            for name, budget in (('off', 0.0), (f'p{args.percentile:g}, budget {args.budget:.0%}', args.budget)):
+                together_ai.LLM_HEDGE_BUDGET = budget
+                together_ai.LLM_HEDGE_PERCENTILE = args.percentile
+                together_ai._hedgers.clear()
+                before = hedge_results()
+                latencies = run(app, args)
+                results = hedge_results() - before
+                hedged = sum(results[result] for result in FIRED) / len(latencies)
+                p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+                print(f'{name:<24} {len(latencies):>6} {p50:>8.1f} {p90:>8.1f} {p99:>8.1f} {latencies.max():>8.1f} '
+                      f'{hedged:>7.1%}  {dict(results) or "-"}')
+    finally:
+        fake_llm.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+"""
+Interactive LLM latency while background LLM work floods the client.
+
+Starts the fake LLM API (benchmarks/fake_llm.py) and calls the Together AI
+client from threads in this process: --background threads issue
+recommendation calls back to back at the background priority, and
+--interactive threads issue analyze_food calls (interactive) with a pause
+between them, like users. Each scheduler setup runs for --duration
+seconds:
+
+    shared    a plain semaphore of --slots, whoever asks first goes first
+    fair      LLMScheduler with equal weights and no reserved slots
+    priority  LLMScheduler as configured by default: --reserved
+              interactive-only slots and 4:1 weights
+
+The report gives interactive call latency and background throughput for
+each.
+
+Usage:
+    python benchmarks/bench_llm_priority.py [--slots 8] [--reserved 2] [--background 32]
+                                            [--interactive 4] [--duration 15] [--llm-latency-ms 300]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+from bench_wsgi import ROOT, free_port, wait_until_up
+
+sys.path.insert(0, ROOT)
+
+
+class SharedSlots:
+    """One pool of slots for every caller, as if the scheduler were a semaphore"""
+
+    def __init__(self, slots):
+        self._semaphore = threading.Semaphore(slots)
+
+    @contextmanager
+    def slot(self, priority=None, timeout=None):
+        started = time.perf_counter()
+        with self._semaphore:
+            yield time.perf_counter() - started
+
+
+def run_scenario(app, scheduler, args):
+    import together_ai
+    from llm_scheduler import BACKGROUND
+
+    together_ai._schedulers.clear()
+    together_ai._schedulers[os.getpid()] = scheduler
+    stop = threading.Event()
+    interactive, background = [], []
+
+    def timed_call(samples, call):
+        started = time.perf_counter()
+        completion = call()
+        samples.append((time.perf_counter() - started, completion))
+
+    def background_loop():
+        with app.app_context():
+            while not stop.is_set():
+                timed_call(background, lambda: together_ai._post_completion(
+                    'recommendation', 'Recommend a snack for a 30 year old', max_tokens=300, temperature=0.7,
+                    priority=BACKGROUND))
+
+    def interactive_loop():
+        with app.app_context():
+            while not stop.wait(args.think_ms / 1000):
+                timed_call(interactive, lambda: together_ai._post_completion(
+                    'analyze_food', 'Return nutrition as JSON for: bowl of ramen', max_tokens=150,
+                    temperature=0.3, parse_json=True))
+
+    threads = [threading.Thread(target=background_loop) for _ in range(args.background)]
+    threads += [threading.Thread(target=interactive_loop) for _ in range(args.interactive)]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    return interactive, background
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--slots', type=int, default=8, help='Concurrent upstream calls')
+    parser.add_argument('--reserved', type=int, default=2, help='Slots only interactive calls may use')
+    parser.add_argument('--background', type=int, default=32, help='Threads making background calls')
+    parser.add_argument('--interactive', type=int, default=4, help='Threads making interactive calls')
+    parser.add_argument('--think-ms', type=float, default=200.0, help='Pause between interactive calls')
+    parser.add_argument('--duration', type=float, default=15.0, help='Seconds per scenario')
+    parser.add_argument('--llm-latency-ms', type=float, default=300.0)
+    parser.add_argument('--llm-jitter-ms', type=float, default=50.0)
+    args = parser.parse_args()
+
+    llm_port = free_port()
+    os.environ['TOGETHER_API_URL'] = f'http://127.0.0.1:{llm_port}/v1/completions'
+    os.environ.setdefault('TOGETHER_API_KEY', 'fake')
+    fake_llm = subprocess.Popen([sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_llm.py'),
+                                 '--port', str(llm_port), '--latency-ms', str(args.llm_latency_ms),
+                                 '--jitter-ms', str(args.llm_jitter_ms)],
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_until_up(llm_port)
+        from app import create_app
+        from llm_scheduler import LLMScheduler, INTERACTIVE, BACKGROUND
+
+        scenarios = (
+            ('shared', SharedSlots(args.slots)),
+            ('fair', LLMScheduler(args.slots, 0, {INTERACTIVE: 1, BACKGROUND: 1})),
+            ('priority', LLMScheduler(args.slots, args.reserved))
+        )
+        print(f'{args.slots} slots, {args.background} background and {args.interactive} interactive threads, '
+              f'{args.llm_latency_ms:.0f} ms upstream\n')
+        print(f"{'scheduler':<10} {'calls':>6} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'errors':>7} "
+              f"{'bg calls/s':>11}")
+        with tempfile.TemporaryDirectory(prefix='nutrifit-llm-priority-') as tmp:
+            app = create_app({'METRICS_DIR': os.path.join(tmp, 'metrics')})
+            for name, scheduler in scenarios:
+                interactive, background = run_scenario(app, scheduler, args)
+                latencies = np.array([elapsed for elapsed, _ in interactive]) * 1000
+                p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+                errors = sum(1 for _, completion in interactive if completion.error)
+                print(f'{name:<10} {len(interactive):>6} {p50:>8.1f} {p90:>8.1f} {p99:>8.1f} {errors:>7} '
+                      f'{len(background) / args.duration:>11.1f}')
+    finally:
+        fake_llm.terminate()
+
+
+if __name__ == '__main__':
+    main()
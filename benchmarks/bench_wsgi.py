@@ -0,0 +1,137 @@
+"""
+Compare request throughput of the Werkzeug dev server and gunicorn.
+
+Starts each server on a free local port, drives it with concurrent
+keep-alive clients for a fixed time and reports requests per second and
+latency percentiles, plus the private (unshared) memory of the server's
+process tree after the run (Linux only). Only anonymous pages are requested, so the database
+is read but never written.
+
+Usage:
+    python benchmarks/bench_wsgi.py [--duration 10] [--clients 16] [--workers 4] [--threads 1]
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PATHS = ('/', '/login', '/static/js/analytics.js')
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def server_commands(port, args):
+    dev = [sys.executable, '-c', f"from app import create_app; create_app().run(host='127.0.0.1', port={port})"]
+    gunicorn = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    gunicorn_env = {
+        'NUTRIFIT_BIND': f'127.0.0.1:{port}',
+        'NUTRIFIT_WORKERS': str(args.workers),
+        'NUTRIFIT_THREADS': str(args.threads)
+    }
+    return [('dev server', dev, {}), (f'gunicorn {args.workers}w x {args.threads}t', gunicorn, gunicorn_env)]
+
+
+def wait_until_up(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            requests.get(f'http://127.0.0.1:{port}/login', timeout=1)
+            return
+        except requests.ConnectionError:
+            time.sleep(0.2)
+    raise RuntimeError(f'server on port {port} did not start')
+
+
+def client(base_url, stop_at, latencies, errors):
+    session = requests.Session()
+    i = 0
+    while time.monotonic() < stop_at:
+        started = time.perf_counter()
+        try:
+            response = session.get(base_url + PATHS[i % len(PATHS)], timeout=10)
+            response.content
+            if response.status_code != 200:
+                errors.append(response.status_code)
+        except requests.RequestException as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - started)
+        i += 1
+
+
+def _children(pid):
+    children = []
+    for task in os.listdir(f'/proc/{pid}/task'):
+        with open(f'/proc/{pid}/task/{task}/children') as f:
+            children.extend(int(child) for child in f.read().split())
+    return children
+
+
+def private_memory_mb(pid):
+    """Private_Clean + Private_Dirty of a process and its descendants, or None off Linux"""
+    if not os.path.exists(f'/proc/{pid}/smaps_rollup'):
+        return None
+    total_kb = 0
+    pending = [pid]
+    while pending:
+        current = pending.pop()
+        with open(f'/proc/{current}/smaps_rollup') as f:
+            for line in f:
+                if line.startswith(('Private_Clean:', 'Private_Dirty:')):
+                    total_kb += int(line.split()[1])
+        pending.extend(_children(current))
+    return total_kb / 1024
+
+
+def run_load(port, clients, duration):
+    latencies = []
+    errors = []
+    stop_at = time.monotonic() + duration
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        for _ in range(clients):
+            executor.submit(client, f'http://127.0.0.1:{port}', stop_at, latencies, errors)
+    return np.array(latencies) * 1000, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--duration', type=float, default=10.0, help='Seconds of load per server')
+    parser.add_argument('--clients', type=int, default=16, help='Concurrent keep-alive clients')
+    parser.add_argument('--workers', type=int, default=4, help='Gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='Gunicorn threads per worker')
+    args = parser.parse_args()
+
+    print(f'{os.cpu_count()} CPUs, {args.clients} clients, {args.duration:g}s per server')
+    print(f"{'server':<22} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'private MB':>11}")
+
+    port = free_port()
+    for name, command, env in server_commands(port, args):
+        server = subprocess.Popen(command, cwd=ROOT, env={**os.environ, **env},
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_up(port)
+            run_load(port, args.clients, 1.0)  # warm up
+            latencies, errors = run_load(port, args.clients, args.duration)
+            memory = private_memory_mb(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+        print(f'{name:<22} {len(latencies) / args.duration:>8.0f} {np.percentile(latencies, 50):>8.1f} '
+              f'{np.percentile(latencies, 99):>8.1f} {len(errors):>7} '
+              f"{'n/a' if memory is None else f'{memory:.0f}':>11}")
+
+
+if __name__ == '__main__':
+    main()
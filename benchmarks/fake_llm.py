@@ -0,0 +1,114 @@
+"""
+Local stand-in for the Together AI completions API.
+
+Answers every POST with a completion shaped like the real one after a
+configurable delay, so load tests and local development exercise the LLM
+code paths without an API key, network access or cost. Prompts that ask
+for a JSON object get one with the keys the app parses (food nutrition or
+daily needs); anything else gets a short recommendation text. With
+--slow-share, that share of requests takes --slow-ms instead, like the
+real API's long tail.
+
+Usage:
+    python benchmarks/fake_llm.py [--port 8765] [--latency-ms 800] [--jitter-ms 200]
+                                  [--slow-share 0.05] [--slow-ms 15000]
+
+Then start the app with
+    TOGETHER_API_KEY=fake TOGETHER_API_URL=http://127.0.0.1:8765/v1/completions
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FOOD = {'calories': 320, 'protein': 18.5, 'carbs': 35.0, 'fat': 11.2}
+
+NEEDS = {
+    'daily_calorie_goal': 2200,
+    'daily_protein_goal': 120,
+    'daily_carbs_goal': 260,
+    'daily_fat_goal': 75,
+    'daily_water_goal': 2600,
+    'calorie_explanation': 'Maintenance calories from BMR and activity level.',
+    'macros_explanation': 'Protein at 1.6 g/kg, 30% fat, the rest carbohydrates.',
+    'water_explanation': '35 ml per kg of body weight.'
+}
+
+RECOMMENDATION = ('Add a lean protein and a portion of vegetables to your next meal, '
+                  'for example grilled chicken with broccoli and brown rice.')
+
+
+def completion_text(prompt):
+    if 'daily_calorie_goal' in prompt:
+        return 'Here are the values:\n' + json.dumps(NEEDS, indent=2)
+    if 'JSON' in prompt:
+        return json.dumps(FOOD)
+    return RECOMMENDATION
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    latency = 0.8
+    jitter = 0.2
+    slow_share = 0.0
+    slow_latency = 15.0
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            prompt = json.loads(self.rfile.read(length)).get('prompt', '')
+        except ValueError:
+            self._send(400, {'error': 'request body must be JSON'})
+            return
+
+        if random.random() < self.slow_share:
+            time.sleep(self.slow_latency)
+        else:
+            time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        text = completion_text(prompt)
+        self._send(200, {
+            'id': 'fake-completion',
+            'object': 'text_completion',
+            'choices': [{'text': text, 'index': 0, 'finish_reason': 'stop'}],
+            'usage': {'prompt_tokens': len(prompt) // 4, 'completion_tokens': len(text) // 4}
+        })
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=800.0, help='Mean response delay')
+    parser.add_argument('--jitter-ms', type=float, default=200.0, help='Standard deviation of the delay')
+    parser.add_argument('--slow-share', type=float, default=0.0, help='Share of requests that take --slow-ms')
+    parser.add_argument('--slow-ms', type=float, default=15000.0, help='Delay of the slow requests')
+    args = parser.parse_args()
+
+    Handler.latency = args.latency_ms / 1000
+    Handler.jitter = args.jitter_ms / 1000
+    Handler.slow_share = args.slow_share
+    Handler.slow_latency = args.slow_ms / 1000
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    server.daemon_threads = True
+    print(f'Fake Together AI API on http://{args.host}:{args.port}/v1/completions', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
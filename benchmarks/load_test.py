@@ -0,0 +1,302 @@
+"""
+End-to-end load test: concurrent virtual users walking through the app.
+
+Starts the fake LLM API (benchmarks/fake_llm.py) and the app under
+gunicorn (or the dev server) against a fresh SQLite database, shared store
+and metrics directory in a temporary folder. Virtual users then repeat
+this journey, each time as a new user, until the time is up:
+
+    signup -> profile -> dashboard -> analyze_food -> add_food -> add_water -> analytics
+
+Every HTTP request is timed separately. The report gives throughput and
+latency percentiles per step, counts unexpected responses and 429s (LLM
+rate limiting), and breaks the server's time per endpoint into SQL, LLM
+and the rest, read from /metrics.
+
+Half of the analyze_food descriptions are not in the local food catalog by
+default, so they go to the (fake) API once and are cached afterwards.
+
+With --url the harness drives an already running server instead and
+starts nothing; point that server at the fake API with TOGETHER_API_URL.
+
+Usage:
+    python benchmarks/load_test.py [--users 20] [--duration 30] [--server gunicorn] [--workers 4]
+                                   [--llm-latency-ms 800] [--no-llm-limits] [--json results.json]
+"""
+import argparse
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+from bench_wsgi import ROOT, free_port, wait_until_up
+
+# Steps in journey order; each is one HTTP request
+STEPS = ('signup page', 'signup', 'profile', 'dashboard', 'analyze_food', 'add_food', 'add_water',
+         'analytics', 'analytics api', 'weight trend api')
+
+CATALOG_FOODS = ('chicken breast 150g', '2 eggs', '100 grams of oats', 'salmon 200g', '1 banana',
+                 'rice 180g and broccoli 100g')
+
+# Not in the local catalog, so answered by the API (then cached)
+API_FOODS = tuple(f'homemade lentil curry, recipe {i}' for i in range(40))
+
+PROFILE = {
+    'name': 'Load Test', 'age': 34, 'weight': 72.5, 'height': 176, 'gender': 'female',
+    'activity_level': 'moderate', 'goal': 'maintain', 'daily_calorie_goal': 2100,
+    'daily_protein_goal': 120, 'daily_carbs_goal': 250, 'daily_fat_goal': 70, 'daily_water_goal': 2500
+}
+
+JSON_HEADERS = {'Accept': 'application/json'}
+
+# Rate limits high enough that no call is refused (--no-llm-limits)
+UNLIMITED = {name: '1000000' for name in ('LLM_USER_PER_MINUTE', 'LLM_USER_BURST',
+                                          'LLM_GLOBAL_PER_MINUTE', 'LLM_GLOBAL_BURST')}
+
+
+class VirtualUser:
+    """One simulated browser: a cookie session that signs up and uses the app"""
+
+    def __init__(self, base_url, results, rng, api_share, think_time):
+        self.base_url = base_url
+        self.results = results
+        self.rng = rng
+        self.api_share = api_share
+        self.think_time = think_time
+
+    def request(self, step, method, path, expected, **kwargs):
+        """Time one request; returns the response, or None if it failed"""
+        if self.think_time:
+            time.sleep(self.rng.uniform(0.5, 1.5) * self.think_time)
+        started = time.perf_counter()
+        try:
+            response = self.session.request(method, self.base_url + path, allow_redirects=False,
+                                            timeout=120, **kwargs)
+            response.content
+            status = response.status_code
+        except requests.RequestException as e:
+            response, status = None, type(e).__name__
+        self.results[step].append((time.perf_counter() - started, status, status in expected))
+        return response if status in expected else None
+
+    def journey(self, run_id, number):
+        """Walk through the app once as a new user; returns whether every step succeeded"""
+        self.session = requests.Session()
+        email = f'load-{run_id}-{number}@example.com'
+        food = self.rng.choice(API_FOODS if self.rng.random() < self.api_share else CATALOG_FOODS)
+
+        steps = (
+            lambda: self.request('signup page', 'GET', '/signup', (200,)),
+            lambda: self.request('signup', 'POST', '/signup', (302,), data={
+                'email': email, 'password': 'load-test-password', 'confirm_password': 'load-test-password'}),
+            lambda: self.request('profile', 'POST', '/profile', (302,), data=PROFILE),
+            lambda: self.request('dashboard', 'GET', '/dashboard', (200,)),
+            lambda: self.request('analyze_food', 'POST', '/analyze_food', (200, 429),
+                                 data={'food_description': food}, headers=JSON_HEADERS)
+        )
+        response = None
+        for step in steps:
+            response = step()
+            if response is None:
+                return False
+
+        # Log the food with the analysed values, as the dashboard does
+        nutrition = response.json() if response.status_code == 200 else {}
+        food_form = {'food-name': food, 'calories': int(nutrition.get('calories') or 300)}
+        food_form.update({key: nutrition.get(key) or 10 for key in ('protein', 'carbs', 'fat')})
+
+        steps = (
+            lambda: self.request('add_food', 'POST', '/add_food', (201,), data=food_form, headers=JSON_HEADERS),
+            lambda: self.request('add_water', 'POST', '/add_water', (200,), data={'water_amount': 250},
+                                 headers=JSON_HEADERS),
+            lambda: self.request('analytics', 'GET', '/analytics', (200,)),
+            lambda: self.request('analytics api', 'GET', '/api/analytics', (200,)),
+            lambda: self.request('weight trend api', 'GET', '/api/weight_trend', (200,))
+        )
+        return all(step() is not None for step in steps)
+
+
+def run_users(base_url, args):
+    results = {step: [] for step in STEPS}
+    journeys = []
+    run_id = uuid.uuid4().hex[:8]
+    counter = iter(range(sys.maxsize))
+    counter_lock = threading.Lock()
+    stop_at = time.monotonic() + args.duration
+
+    def loop(index):
+        user = VirtualUser(base_url, results, random.Random(index), args.api_share, args.think_ms / 1000)
+        while time.monotonic() < stop_at:
+            with counter_lock:
+                number = next(counter)
+            journeys.append(user.journey(run_id, number))
+
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=args.users) as executor:
+        for future in [executor.submit(loop, i) for i in range(args.users)]:
+            future.result()
+    return results, journeys, time.monotonic() - started
+
+
+def summarize(results, elapsed):
+    rows = []
+    for step in STEPS:
+        samples = results[step]
+        if not samples:
+            continue
+        latencies = np.array([elapsed_s for elapsed_s, _, _ in samples]) * 1000
+        rows.append({
+            'step': step,
+            'requests': len(samples),
+            'rps': len(samples) / elapsed,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p90_ms': float(np.percentile(latencies, 90)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'max_ms': float(latencies.max()),
+            'errors': sum(1 for _, _, ok in samples if not ok),
+            'rate_limited': sum(1 for _, status, _ in samples if status == 429)
+        })
+    return rows
+
+
+_SUM_LINE = re.compile(r'^(nutrifit_(?:http|db|llm)_request_duration_seconds)_sum\{([^}]*)\} (\S+)$')
+
+
+def server_time_breakdown(base_url):
+    """Seconds of HTTP, SQL and LLM time per endpoint from /metrics, or None if unavailable"""
+    try:
+        response = requests.get(base_url + '/metrics', timeout=10)
+    except requests.RequestException:
+        return None
+    if response.status_code != 200:
+        return None
+
+    totals = {}
+    for line in response.text.splitlines():
+        match = _SUM_LINE.match(line)
+        if not match:
+            continue
+        labels = dict(re.findall(r'(\w+)="([^"]*)"', match.group(2)))
+        part = match.group(1).split('_')[1]
+        endpoint = totals.setdefault(labels['endpoint'], {'http': 0.0, 'db': 0.0, 'llm': 0.0})
+        endpoint[part] += float(match.group(3))
+    return totals
+
+
+def print_report(rows, journeys, elapsed, breakdown):
+    print(f"{'step':<18} {'requests':>8} {'req/s':>7} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} "
+          f"{'max ms':>8} {'errors':>7} {'429s':>5}")
+    for row in rows:
+        print(f"{row['step']:<18} {row['requests']:>8} {row['rps']:>7.1f} {row['p50_ms']:>8.1f} "
+              f"{row['p90_ms']:>8.1f} {row['p99_ms']:>8.1f} {row['max_ms']:>8.1f} {row['errors']:>7} "
+              f"{row['rate_limited']:>5}")
+
+    total = sum(row['requests'] for row in rows)
+    completed = sum(journeys)
+    print(f'\n{completed} of {len(journeys)} journeys completed ({completed / elapsed:.2f}/s), '
+          f'{total} requests ({total / elapsed:.1f} req/s) in {elapsed:.1f}s')
+
+    if breakdown:
+        print(f"\n{'server time':<18} {'total s':>8} {'SQL':>6} {'LLM':>6} {'app':>6}")
+        for endpoint, parts in sorted(breakdown.items(), key=lambda item: -item[1]['http']):
+            if not parts['http'] or endpoint == 'metrics':
+                continue
+            own = max(parts['http'] - parts['db'] - parts['llm'], 0.0)
+            shares = [100 * value / parts['http'] for value in (parts['db'], parts['llm'], own)]
+            print(f"{endpoint:<18} {parts['http']:>8.2f} " + ' '.join(f'{share:>5.0f}%' for share in shares))
+
+
+def start_servers(tmp, args):
+    """Start the fake LLM API and the app; returns (base URL, processes)"""
+    llm_port, app_port = free_port(), free_port()
+    env = {
+        **os.environ,
+        'DATABASE_URL': 'sqlite:///' + os.path.join(tmp, 'load_test.db'),
+        'TOGETHER_API_KEY': 'load-test',
+        'TOGETHER_API_URL': f'http://127.0.0.1:{llm_port}/v1/completions',
+        'NUTRIFIT_SHARED_STORE_PATH': os.path.join(tmp, 'shared_store.db'),
+        'NUTRIFIT_METRICS_DIR': os.path.join(tmp, 'metrics'),
+        'NUTRIFIT_BIND': f'127.0.0.1:{app_port}',
+        'NUTRIFIT_WORKERS': str(args.workers),
+        'NUTRIFIT_THREADS': str(args.threads)
+    }
+    if args.no_llm_limits:
+        env.update(UNLIMITED)
+
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app', 'init-db'], cwd=ROOT, env=env,
+                   check=True, stdout=subprocess.DEVNULL)
+
+    if args.server == 'gunicorn':
+        app_command = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'wsgi:app']
+    else:
+        app_command = [sys.executable, '-c',
+                       f"from app import create_app; create_app().run(host='127.0.0.1', port={app_port})"]
+    llm_command = [sys.executable, os.path.join(ROOT, 'benchmarks', 'fake_llm.py'), '--port', str(llm_port),
+                   '--latency-ms', str(args.llm_latency_ms), '--jitter-ms', str(args.llm_jitter_ms)]
+
+    processes = []
+    for command in (llm_command, app_command):
+        processes.append(subprocess.Popen(command, cwd=ROOT, env=env,
+                                          stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL))
+    wait_until_up(llm_port)
+    wait_until_up(app_port)
+    return f'http://127.0.0.1:{app_port}', processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=20, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='Seconds of load')
+    parser.add_argument('--think-ms', type=float, default=0.0, help='Mean pause before each request')
+    parser.add_argument('--api-share', type=float, default=0.5,
+                        help='Share of analyze_food descriptions missing from the local catalog')
+    parser.add_argument('--server', choices=('gunicorn', 'dev'), default='gunicorn')
+    parser.add_argument('--workers', type=int, default=4, help='Gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='Gunicorn threads per worker')
+    parser.add_argument('--llm-latency-ms', type=float, default=800.0, help='Mean fake LLM response time')
+    parser.add_argument('--llm-jitter-ms', type=float, default=200.0)
+    parser.add_argument('--no-llm-limits', action='store_true', help='Disable the LLM rate limits')
+    parser.add_argument('--url', help='Drive this running server instead of starting one')
+    parser.add_argument('--json', help='Also write the per-step results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='nutrifit-load-') as tmp:
+        processes = []
+        try:
+            if args.url:
+                base_url = args.url.rstrip('/')
+                target = base_url
+            else:
+                base_url, processes = start_servers(tmp, args)
+                target = 'dev server' if args.server == 'dev' else f'gunicorn {args.workers}w x {args.threads}t'
+                target += f', fake LLM {args.llm_latency_ms:g} ms'
+
+            print(f'{os.cpu_count()} CPUs, {args.users} virtual users, {args.duration:g}s against {target}\n')
+            results, journeys, elapsed = run_users(base_url, args)
+            breakdown = server_time_breakdown(base_url)
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+
+    rows = summarize(results, elapsed)
+    print_report(rows, journeys, elapsed, breakdown)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'users': args.users, 'duration': elapsed, 'journeys': len(journeys),
+                       'completed': sum(journeys), 'steps': rows, 'server_time': breakdown}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
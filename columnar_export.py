@@ -0,0 +1,207 @@
+import json
+import os
+import shutil
+import uuid
+from collections import OrderedDict
+from datetime import date, datetime
+
+from sqlalchemy import select, tuple_
+
+from database import db
+from models import FoodEntry, WaterIntake, UserProfile
+
+# Table name -> (model, column used for the month partition, watermark columns).
+# Food entries are append-only so their id is a safe watermark; water and
+# profile rows are updated in place, so changed rows are picked up again by
+# updated_at and the newest copy wins downstream. The id breaks ties between
+# rows with the same updated_at, so a chunk or run that ends inside a group
+# of equal timestamps does not skip the rest of the group next time.
+COLUMNAR_TABLES = {
+    'food_entry': (FoodEntry, 'date', ('id',)),
+    'water_intake': (WaterIntake, 'date', ('updated_at', 'id')),
+    'user_profile': (UserProfile, 'updated_at', ('updated_at', 'id'))
+}
+
+WATERMARK_FILE = '_watermarks.json'
+
+# Partition writers kept open at once; older ones are closed and reopened as new part files
+MAX_OPEN_WRITERS = 24
+
+
+def _arrow_schema(pa, table):
+    """Map the SQLAlchemy columns of a table onto an Arrow schema."""
+    type_map = {
+        'INTEGER': pa.int64(),
+        'FLOAT': pa.float64(),
+        'BOOLEAN': pa.bool_(),
+        'DATE': pa.date32(),
+        'DATETIME': pa.timestamp('us')
+    }
+    fields = []
+    for column in table.columns:
+        type_name = column.type.__visit_name__.upper()
+        fields.append(pa.field(column.name, type_map.get(type_name, pa.string())))
+    return pa.schema(fields)
+
+
+def _month_key(value):
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%Y-%m')
+    return 'unknown'
+
+
+def load_watermarks(out_dir):
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_watermarks(out_dir, watermarks):
+    """Write the watermark file atomically so an interrupted run never corrupts it"""
+    path = os.path.join(out_dir, WATERMARK_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(watermarks, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _decode_watermark(column_names, value):
+    """Watermark file value -> tuple of column values, or None"""
+    if value is None:
+        return None
+    if column_names == ('id',):
+        return (int(value),)
+    if isinstance(value, str):
+        # Written before ties were broken by id: take the whole timestamp again
+        return (datetime.fromisoformat(value), 0)
+    updated_at, row_id = value
+    return (datetime.fromisoformat(updated_at), int(row_id))
+
+
+def _encode_watermark(value):
+    if value is None:
+        return None
+    if len(value) == 1:
+        return value[0]
+    return [item.isoformat() if isinstance(item, datetime) else item for item in value]
+
+
+def export_table(table_name, out_dir, watermark=None, chunk_size=50000, compression='zstd'):
+    """
+    Export one table to month-partitioned Parquet files.
+
+    Rows are read through a server-side cursor in chunks of chunk_size and
+    written straight to per-month Parquet writers, so memory stays bounded
+    by a single chunk. Only rows past the given watermark are exported.
+
+    Returns:
+        A tuple of (rows written, new watermark value)
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    model, partition_column, watermark_columns = COLUMNAR_TABLES[table_name]
+    table = model.__table__
+    schema = _arrow_schema(pa, table)
+    column_names = [column.name for column in table.columns]
+    partition_index = column_names.index(partition_column)
+    watermark_indexes = [column_names.index(name) for name in watermark_columns]
+
+    watermark_key = [table.c[name] for name in watermark_columns]
+    stmt = select(table).order_by(*watermark_key)
+    watermark = _decode_watermark(watermark_columns, watermark)
+    if watermark is not None:
+        stmt = stmt.where(tuple_(*watermark_key) > tuple_(*watermark))
+
+    # Parts are staged and only moved into place once the whole run succeeds,
+    # so an interrupted export never leaves rows behind the old watermark
+    table_dir = os.path.join(out_dir, table_name)
+    run_id = uuid.uuid4().hex[:8]
+    staging_dir = os.path.join(table_dir, f'_staging-{run_id}')
+    writers = OrderedDict()
+    part_counter = 0
+    rows_written = 0
+    new_watermark = watermark
+
+    def writer_for(month):
+        nonlocal part_counter
+        if month in writers:
+            writers.move_to_end(month)
+            return writers[month]
+        if len(writers) >= MAX_OPEN_WRITERS:
+            _, oldest = writers.popitem(last=False)
+            oldest.close()
+        partition_dir = os.path.join(staging_dir, f'month={month}')
+        os.makedirs(partition_dir, exist_ok=True)
+        part_counter += 1
+        path = os.path.join(partition_dir, f'part-{run_id}-{part_counter:05d}.parquet')
+        writers[month] = pq.ParquetWriter(path, schema, compression=compression)
+        return writers[month]
+
+    result = db.session.execute(stmt, execution_options={'yield_per': chunk_size})
+    try:
+        for rows in result.partitions():
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(_month_key(row[partition_index]), []).append(row)
+
+            for month, month_rows in by_month.items():
+                columns = list(zip(*month_rows))
+                arrays = [pa.array(values, type=field.type) for values, field in zip(columns, schema)]
+                writer_for(month).write_table(pa.Table.from_arrays(arrays, schema=schema))
+
+            rows_written += len(rows)
+            new_watermark = tuple(rows[-1][index] for index in watermark_indexes)
+    except BaseException:
+        result.close()
+        for writer in writers.values():
+            writer.close()
+        shutil.rmtree(staging_dir, ignore_errors=True)
+        raise
+
+    result.close()
+    for writer in writers.values():
+        writer.close()
+
+    if os.path.isdir(staging_dir):
+        for partition in os.listdir(staging_dir):
+            partition_dir = os.path.join(table_dir, partition)
+            os.makedirs(partition_dir, exist_ok=True)
+            for part in os.listdir(os.path.join(staging_dir, partition)):
+                os.replace(os.path.join(staging_dir, partition, part), os.path.join(partition_dir, part))
+        shutil.rmtree(staging_dir)
+
+    return rows_written, _encode_watermark(new_watermark)
+
+
+def export_columnar(out_dir, tables=None, incremental=True, chunk_size=50000, compression='zstd', progress=None):
+    """
+    Export the analytics tables to out_dir as partitioned Parquet.
+
+    In incremental mode each table resumes from the watermark stored by the
+    previous run; otherwise the table directory is rebuilt from scratch.
+    The watermark file is only updated after a table finishes writing.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    watermarks = load_watermarks(out_dir)
+    summary = {}
+
+    for table_name in tables or COLUMNAR_TABLES:
+        if incremental:
+            watermark = watermarks.get(table_name)
+        else:
+            watermark = None
+            shutil.rmtree(os.path.join(out_dir, table_name), ignore_errors=True)
+
+        rows, new_watermark = export_table(table_name, out_dir, watermark, chunk_size, compression)
+        if new_watermark is not None:
+            watermarks[table_name] = new_watermark
+        save_watermarks(out_dir, watermarks)
+
+        summary[table_name] = rows
+        if progress:
+            progress(table_name, rows)
+
+    return summary
@@ -0,0 +1,204 @@
+import click
+from flask.cli import with_appcontext
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db_command():
+    """Create the database tables and any missing indexes."""
+    from database import create_schema
+
+    create_schema()
+    click.echo('Database schema is up to date')
+
+
+@click.command('export-columnar')
+@click.argument('out_dir', type=click.Path(file_okay=False))
+@click.option('--table', 'tables', multiple=True, type=click.Choice(['food_entry', 'water_intake', 'user_profile']),
+              help='Table to export (repeatable). Defaults to all.')
+@click.option('--full', is_flag=True, help='Ignore the stored watermark and rebuild the export from scratch.')
+@click.option('--chunk-size', default=50000, show_default=True, help='Rows read and written per chunk.')
+@click.option('--compression', default='zstd', show_default=True, help='Parquet compression codec.')
+@with_appcontext
+def export_columnar_command(out_dir, tables, full, chunk_size, compression):
+    """Export food, water and profile tables to month-partitioned Parquet files."""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise click.ClickException('pyarrow is required for columnar exports (pip install pyarrow)')
+
+    from columnar_export import export_columnar
+
+    def progress(table_name, rows):
+        click.echo(f'{table_name}: {rows} rows exported')
+
+    export_columnar(out_dir, tables=tables or None, incremental=not full,
+                    chunk_size=chunk_size, compression=compression, progress=progress)
+
+
+@click.command('import-diary')
+@click.argument('csv_path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--email', required=True, help='Email of the user the diary belongs to.')
+@click.option('--map', 'mappings', multiple=True, metavar='COLUMN=FIELD',
+              help='Map a CSV column to a FoodEntry field (name, date, meal_type, calories, protein, carbs, fat).')
+@click.option('--date-format', default='%Y-%m-%d', show_default=True, help='strptime format of the date column.')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows parsed and inserted per batch.')
+@click.option('--workers', type=int, default=None, help='Parser processes. Defaults to the CPU count.')
+@click.option('--restart', is_flag=True, help='Ignore any saved checkpoint and import from the first row.')
+@with_appcontext
+def import_diary_command(csv_path, email, mappings, date_format, batch_size, workers, restart):
+    """Import a third-party food diary CSV, resuming from the last checkpoint."""
+    from models import User
+    from diary_import import import_diary, IMPORT_FIELDS
+
+    user = User.query.filter_by(email=email).first()
+    if not user:
+        raise click.ClickException(f'No user with email {email}')
+
+    overrides = {}
+    for mapping in mappings:
+        column, sep, field = mapping.partition('=')
+        if not sep:
+            raise click.BadParameter(f'Expected COLUMN=FIELD, got {mapping}', param_hint='--map')
+        if field not in IMPORT_FIELDS:
+            raise click.BadParameter(f'Unknown field {field!r} in {mapping}; use one of '
+                                     f'{", ".join(sorted(IMPORT_FIELDS))}', param_hint='--map')
+        overrides[column] = field
+
+    def progress(state, rows_per_second):
+        click.echo(f"{state['rows_done']} rows read, {state['imported']} imported, "
+                   f"{state['skipped']} skipped ({rows_per_second:,.0f} rows/s)")
+
+    try:
+        state = import_diary(csv_path, user.id, overrides, date_format, batch_size, workers, restart, progress)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    click.echo(f"Done: {state['imported']} entries imported, {state['skipped']} rows skipped")
+
+
+@click.command('rebuild-rollups')
+@click.option('--dirty-only', is_flag=True, help='Only refresh periods with queued dirty days instead of rebuilding everything.')
+@click.option('--background', is_flag=True, help='Queue the rebuild as a batch job for the job workers and return.')
+@with_appcontext
+def rebuild_rollups_command(dirty_only, background):
+    """Rebuild the weekly and monthly nutrition rollups."""
+    from rollups import rebuild_rollups, refresh_rollups
+
+    if background:
+        from jobs import enqueue, PRIORITY_BATCH
+        job = enqueue('rebuild_rollups', {'dirty_only': dirty_only}, priority=PRIORITY_BATCH,
+                      dedupe_key='rebuild_rollups')
+        click.echo(f'Queued as job {job.id}')
+        return
+
+    if dirty_only:
+        processed = refresh_rollups()
+        click.echo(f'Refreshed rollups for {processed} dirty days')
+        return
+
+    def progress(users_done, users_total, rows):
+        click.echo(f'{users_done}/{users_total} users, {rows} rollup rows written')
+
+    rows = rebuild_rollups(progress)
+    click.echo(f'Done: {rows} rollup rows written')
+
+
+@click.command('population-stats')
+@click.option('--days', default=30, show_default=True, help='Length of the period the stats cover, ending today.')
+@click.option('--workers', type=int, default=None, help='Worker processes. Defaults to the CPU count.')
+@click.option('--shard-size', default=5000, show_default=True, help='Users aggregated per worker task.')
+@with_appcontext
+def population_stats_command(days, workers, shard_size):
+    """Compute the nightly population-wide stats per goal type."""
+    from population_stats import compute_population_stats
+
+    def progress(shards_done, shards_total):
+        click.echo(f'{shards_done}/{shards_total} shards aggregated')
+
+    results = compute_population_stats(days, workers=workers, shard_size=shard_size, progress=progress)
+    for goal, stat in sorted(results.items()):
+        click.echo(f'{goal}: {stat.users} users, adherence {stat.avg_adherence}%, '
+                   f'{stat.avg_calories} kcal/day, water compliance {stat.water_compliance}%')
+
+
+@click.command('generate-data')
+@click.option('--users', default=1000, show_default=True, help='Synthetic users to add.')
+@click.option('--days', default=365, show_default=True, help='Days of history per user, ending today.')
+@click.option('--seed', default=0, show_default=True, help='Random seed.')
+@click.option('--batch-users', default=500, show_default=True, help='Users generated per transaction.')
+@click.option('--skip-rollups', is_flag=True, help='Do not rebuild the weekly and monthly rollups afterwards.')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+@with_appcontext
+def generate_data_command(users, days, seed, batch_users, skip_rollups, yes):
+    """Fill the database with synthetic users, profiles, food, water and weigh-ins."""
+    import time
+    from database import db
+    from synthetic_data import generate_dataset
+
+    if not yes:
+        click.confirm(f'Add {users} synthetic users with {days} days of history to {db.engine.url}?', abort=True)
+
+    started = time.perf_counter()
+
+    def progress(users_done, users_total, rows):
+        click.echo(f'{users_done}/{users_total} users, {rows} rows '
+                   f'({rows / (time.perf_counter() - started):,.0f} rows/s)')
+
+    counts = generate_dataset(users, days, seed=seed, batch_users=batch_users, progress=progress)
+    click.echo('Done: ' + ', '.join(f'{rows} {table}' for table, rows in counts.items()))
+
+    if not skip_rollups:
+        from rollups import rebuild_rollups
+        rows = rebuild_rollups()
+        click.echo(f'Rebuilt rollups: {rows} rows')
+
+
+@click.command('jobs-worker')
+@click.option('--threads', default=4, show_default=True, help='Threads for I/O-bound jobs (LLM calls, exports).')
+@click.option('--processes', default=1, show_default=True, help='Processes for CPU-heavy jobs (0 runs them in threads).')
+@click.option('--drain-timeout', default=30, show_default=True,
+              help='Seconds running jobs get to finish on SIGTERM/SIGINT before they are queued again.')
+@with_appcontext
+def jobs_worker_command(threads, processes, drain_timeout):
+    """Run background jobs until stopped; SIGTERM or Ctrl-C drains gracefully."""
+    import signal
+    import threading
+    from flask import current_app
+    from jobs import JobWorker
+
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+
+    worker = JobWorker(current_app._get_current_object(), threads=threads, processes=processes).start()
+    click.echo(f'Job worker {worker.worker_id} running ({threads} threads, {processes} processes)')
+    stop.wait()
+    click.echo('Draining...')
+    worker.stop(drain_timeout)
+    click.echo('Stopped')
+
+
+@click.command('build-assets')
+@with_appcontext
+def build_assets_command():
+    """Bundle, minify, fingerprint and precompress the static CSS and JS."""
+    from flask import current_app
+    from assets import build_assets
+
+    manifest = build_assets(current_app.static_folder)
+    for name, entry in manifest.items():
+        click.echo(f"{name} -> dist/{entry['file']} ({entry['bytes']} bytes from {len(entry['sources'])} files)")
+    click.echo('Restart the app server to pick up the new manifest')
+
+
+def register_commands(app):
+    """Attach the admin CLI commands to the Flask app"""
+    app.cli.add_command(init_db_command)
+    app.cli.add_command(export_columnar_command)
+    app.cli.add_command(import_diary_command)
+    app.cli.add_command(rebuild_rollups_command)
+    app.cli.add_command(population_stats_command)
+    app.cli.add_command(build_assets_command)
+    app.cli.add_command(generate_data_command)
+    app.cli.add_command(jobs_worker_command)
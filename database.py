@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.engine import make_url
 from werkzeug.security import generate_password_hash
 import os
 
@@ -6,16 +7,29 @@ import os
 db = SQLAlchemy()
 
 def init_db(app):
-    # Configure SQLite database
-    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///nutrifit.db'
+    # Configure SQLite database (create_app can override the URI)
+    app.config.setdefault('SQLALCHEMY_DATABASE_URI', 'sqlite:///nutrifit.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Rollups, data versions, weigh-ins and the analytics buckets use SQLite's
+    # ON CONFLICT upserts and date functions, so other databases are refused
+    # here rather than failing on the first write
+    backend = make_url(app.config['SQLALCHEMY_DATABASE_URI']).get_backend_name()
+    if backend != 'sqlite':
+        raise ValueError(f'NutriFit needs a SQLite database, not {backend} (check DATABASE_URL)')
+    
     # Initialize database with app
     db.init_app(app)
     
-    # Import models
-    from models import User, FoodEntry, UserProfile
+    # Import models so their tables are registered on db.metadata
+    import models  # noqa: F401
+
+def create_schema():
+    """Create missing tables and indexes; needs an app context (flask init-db)"""
+    db.create_all()
     
-    # Create tables
-    with app.app_context():
-        db.create_all() 
\ No newline at end of file
+    # create_all() only builds indexes for new tables, so add any
+    # missing ones to databases created before they were declared
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
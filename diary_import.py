@@ -0,0 +1,247 @@
+import csv
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from itertools import islice
+
+from sqlalchemy import insert
+
+from database import db
+from models import FoodEntry, DiaryImport
+from rollups import mark_dirty
+from http_cache import bump_data_version
+
+# Header names used by common tracker exports, mapped onto FoodEntry fields.
+# Matching is case-insensitive; --map on the command line overrides these.
+DEFAULT_COLUMN_MAP = {
+    'date': 'date',
+    'day': 'date',
+    'food': 'name',
+    'food name': 'name',
+    'name': 'name',
+    'description': 'name',
+    'meal': 'meal_type',
+    'meal type': 'meal_type',
+    'calories': 'calories',
+    'energy (kcal)': 'calories',
+    'kcal': 'calories',
+    'protein': 'protein',
+    'protein (g)': 'protein',
+    'carbs': 'carbs',
+    'carbohydrates': 'carbs',
+    'carbohydrates (g)': 'carbs',
+    'carbs (g)': 'carbs',
+    'fat': 'fat',
+    'fat (g)': 'fat',
+    'total fat (g)': 'fat'
+}
+
+# FoodEntry fields a CSV column can be mapped onto
+IMPORT_FIELDS = frozenset(DEFAULT_COLUMN_MAP.values())
+
+NAME_MAX_LENGTH = FoodEntry.__table__.c.name.type.length
+
+
+def load_checkpoint(csv_path, user_id):
+    """The user's DiaryImport row for this CSV, created (unsaved) if there is none yet"""
+    source = os.path.abspath(csv_path)
+    checkpoint = DiaryImport.query.filter_by(user_id=user_id, source=source).first()
+    if checkpoint is None:
+        checkpoint = DiaryImport(user_id=user_id, source=source, rows_done=0, imported=0, skipped=0,
+                                 complete=False)
+        db.session.add(checkpoint)
+    return checkpoint
+
+
+def checkpoint_state(checkpoint):
+    return {'user_id': checkpoint.user_id, 'rows_done': checkpoint.rows_done, 'imported': checkpoint.imported,
+            'skipped': checkpoint.skipped, 'complete': checkpoint.complete}
+
+
+def build_column_map(header, overrides=None):
+    """
+    Resolve CSV header names to FoodEntry fields.
+
+    Raises:
+        ValueError: if an override maps a column onto an unknown field
+    """
+    unknown = sorted(set((overrides or {}).values()) - IMPORT_FIELDS)
+    if unknown:
+        raise ValueError(f'Unknown field {unknown[0]!r}; use one of {", ".join(sorted(IMPORT_FIELDS))}')
+
+    column_map = {}
+    for column in header:
+        field = DEFAULT_COLUMN_MAP.get(column.strip().lower())
+        if field:
+            column_map[column] = field
+    for column, field in (overrides or {}).items():
+        column_map[column] = field
+    return column_map
+
+
+def read_rows(csv_path, skip=0):
+    """Yield (row number, row dict) pairs from the CSV, skipping rows already imported"""
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        for row_number, row in enumerate(islice(reader, skip, None), start=skip + 1):
+            yield row_number, row
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _parse_number(value):
+    if value is None:
+        return None
+    value = value.strip().replace(',', '')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def resolve_chunk(rows, column_map, date_format):
+    """
+    Parse and resolve one chunk of raw CSV rows into FoodEntry values.
+
+    Runs inside the worker processes. Rows without calories are resolved
+    through the local food catalog; rows that still cannot be resolved, or
+    that have no name or date, are skipped.
+
+    Returns:
+        A tuple of (records, skipped row count, last row number in the chunk)
+    """
+    from together_ai import analyze_food_locally
+
+    records = []
+    skipped = 0
+
+    for _, row in rows:
+        values = {}
+        for column, field in column_map.items():
+            values[field] = row.get(column)
+
+        name = (values.get('name') or '').strip()
+        try:
+            entry_date = datetime.strptime((values.get('date') or '').strip(), date_format).date()
+        except ValueError:
+            entry_date = None
+
+        if not name or not entry_date:
+            skipped += 1
+            continue
+
+        calories = _parse_number(values.get('calories'))
+        protein = _parse_number(values.get('protein'))
+        carbs = _parse_number(values.get('carbs'))
+        fat = _parse_number(values.get('fat'))
+
+        # Fill in missing macros from the local catalog, never the API
+        if calories is None or (protein is None and carbs is None and fat is None):
+            estimate = analyze_food_locally(name)
+            if not estimate['calories'] and calories is None:
+                skipped += 1
+                continue
+            calories = calories if calories is not None else estimate['calories']
+            protein = protein if protein is not None else estimate['protein']
+            carbs = carbs if carbs is not None else estimate['carbs']
+            fat = fat if fat is not None else estimate['fat']
+
+        meal_type = (values.get('meal_type') or '').strip().lower() or None
+
+        records.append({
+            'name': name[:NAME_MAX_LENGTH],
+            'calories': int(round(calories)),
+            'protein': protein or 0,
+            'carbs': carbs or 0,
+            'fat': fat or 0,
+            'date': entry_date,
+            'meal_type': meal_type
+        })
+
+    return records, skipped, rows[-1][0]
+
+
+def _ordered_results(executor, chunks, column_map, date_format, max_in_flight):
+    """
+    Submit chunks to the pool and yield their results in input order.
+
+    At most max_in_flight chunks are queued at any time, which keeps memory
+    bounded no matter how large the input file is.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(executor.submit(resolve_chunk, chunk, column_map, date_format))
+        if len(pending) >= max_in_flight:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def import_diary(csv_path, user_id, column_overrides=None, date_format='%Y-%m-%d',
+                 batch_size=1000, workers=None, restart=False, progress=None):
+    """
+    Stream a third-party diary CSV into FoodEntry rows for one user.
+
+    Rows flow through a generator pipeline: read -> chunk -> parse/resolve
+    in a process pool -> batch insert. Progress is kept in a DiaryImport
+    row updated in the same transaction as each batch of entries, so an
+    interrupted import resumes after the last committed row and never
+    inserts a row twice.
+
+    Returns:
+        Dictionary with imported and skipped row counts
+    """
+    checkpoint = load_checkpoint(csv_path, user_id)
+    if restart:
+        checkpoint.rows_done = checkpoint.imported = checkpoint.skipped = 0
+        checkpoint.complete = False
+    db.session.commit()
+
+    if checkpoint.complete:
+        return checkpoint_state(checkpoint)
+
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f), [])
+    column_map = build_column_map(header, column_overrides)
+    if 'name' not in column_map.values() or 'date' not in column_map.values():
+        raise ValueError('Could not find name and date columns; use --map to map them')
+
+    workers = workers or os.cpu_count() or 1
+    started = time.perf_counter()
+    rows_this_run = 0
+
+    chunks = chunked(read_rows(csv_path, skip=checkpoint.rows_done), batch_size)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for records, skipped, last_row in _ordered_results(executor, chunks, column_map, date_format, workers * 2):
+            if records:
+                for record in records:
+                    record['user_id'] = user_id
+                db.session.execute(insert(FoodEntry), records)
+                mark_dirty(user_id, *{record['date'] for record in records})
+                bump_data_version(user_id)
+
+            rows_this_run += last_row - checkpoint.rows_done
+            checkpoint.rows_done = last_row
+            checkpoint.imported += len(records)
+            checkpoint.skipped += skipped
+            db.session.commit()
+
+            if progress:
+                elapsed = time.perf_counter() - started
+                progress(checkpoint_state(checkpoint), rows_this_run / elapsed if elapsed else 0.0)
+
+    checkpoint.complete = True
+    db.session.commit()
+    return checkpoint_state(checkpoint)
@@ -0,0 +1,152 @@
+import csv
+import io
+import json
+import zlib
+from heapq import merge
+
+from models import FoodEntry, WaterIntake
+
+# Columns written for every exported record, food and water alike
+EXPORT_FIELDS = ['type', 'date', 'name', 'meal_type', 'calories', 'protein', 'carbs', 'fat', 'water_ml', 'created_at']
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 500
+
+# Flush the output buffer once it holds roughly this many characters
+EXPORT_CHUNK_SIZE = 16 * 1024
+
+
+def iter_food_rows(user_id, start=None, end=None):
+    """Yield the user's food entries as export dicts, oldest first."""
+    query = FoodEntry.query.with_entities(
+        FoodEntry.date, FoodEntry.name, FoodEntry.meal_type, FoodEntry.calories,
+        FoodEntry.protein, FoodEntry.carbs, FoodEntry.fat, FoodEntry.created_at
+    ).filter(FoodEntry.user_id == user_id)
+
+    if start:
+        query = query.filter(FoodEntry.date >= start)
+    if end:
+        query = query.filter(FoodEntry.date <= end)
+
+    for row in query.order_by(FoodEntry.date, FoodEntry.id).yield_per(EXPORT_BATCH_SIZE):
+        yield {
+            'type': 'food',
+            'date': row.date,
+            'name': row.name,
+            'meal_type': row.meal_type,
+            'calories': row.calories,
+            'protein': row.protein,
+            'carbs': row.carbs,
+            'fat': row.fat,
+            'water_ml': None,
+            'created_at': row.created_at
+        }
+
+
+def iter_water_rows(user_id, start=None, end=None):
+    """Yield the user's daily water intake as export dicts, oldest first."""
+    query = WaterIntake.query.with_entities(
+        WaterIntake.date, WaterIntake.amount, WaterIntake.created_at
+    ).filter(WaterIntake.user_id == user_id)
+
+    if start:
+        query = query.filter(WaterIntake.date >= start)
+    if end:
+        query = query.filter(WaterIntake.date <= end)
+
+    for row in query.order_by(WaterIntake.date, WaterIntake.id).yield_per(EXPORT_BATCH_SIZE):
+        yield {
+            'type': 'water',
+            'date': row.date,
+            'name': None,
+            'meal_type': None,
+            'calories': None,
+            'protein': None,
+            'carbs': None,
+            'fat': None,
+            'water_ml': row.amount,
+            'created_at': row.created_at
+        }
+
+
+def iter_export_rows(user_id, start=None, end=None):
+    """
+    Yield every food and water record for a user in date order.
+
+    Both queries are read through server-side cursors and merged lazily,
+    so only one batch of each is ever held in memory.
+    """
+    return merge(
+        iter_food_rows(user_id, start, end),
+        iter_water_rows(user_id, start, end),
+        key=lambda row: row['date']
+    )
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def _json_default(value):
+    # Dates and datetimes are the only non-JSON types in export rows
+    return value.isoformat()
+
+
+def csv_chunks(rows):
+    """Encode export rows as CSV text chunks, header first."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_FIELDS)
+
+    for row in rows:
+        writer.writerow([_csv_value(row[field]) for field in EXPORT_FIELDS])
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def ndjson_chunks(rows):
+    """Encode export rows as newline-delimited JSON text chunks."""
+    buffer = io.StringIO()
+
+    for row in rows:
+        buffer.write(json.dumps(row, default=_json_default))
+        buffer.write('\n')
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue()
+
+
+def gzip_chunks(chunks, level=6):
+    """
+    Gzip a stream of text chunks on the fly.
+
+    Every chunk is sync-flushed so the client can start decompressing
+    before the export has finished.
+    """
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31 writes a gzip header
+
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        data += compressor.flush(zlib.Z_SYNC_FLUSH)
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+# Export format -> (chunk encoder, mimetype, file extension)
+EXPORT_FORMATS = {
+    'csv': (csv_chunks, 'text/csv', 'csv'),
+    'ndjson': (ndjson_chunks, 'application/x-ndjson', 'ndjson')
+}
@@ -0,0 +1,76 @@
+"""
+Gunicorn settings for running NutriFit in production.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Every setting can be tuned from the environment:
+
+    NUTRIFIT_BIND          address to listen on (default 0.0.0.0:8000)
+    NUTRIFIT_WORKERS       worker processes (default 2 * CPUs + 1)
+    NUTRIFIT_THREADS       threads per worker (default 1; more than 1 uses gthread workers)
+    NUTRIFIT_TIMEOUT       seconds before a silent worker is killed (default 60, LLM calls can be slow)
+    NUTRIFIT_MAX_REQUESTS  recycle a worker after this many requests (default 0, never)
+
+The app is imported once in the master (preload) and the workers are forked
+from it, so they share the interpreter, templates and imported modules
+copy-on-write instead of each loading its own copy. Garbage collection is
+kept off in the master and everything allocated by then is frozen right
+before forking, so a collection in a worker never writes to (and so never
+copies) those shared pages.
+
+Reloading:
+    kill -HUP <master>    re-read this file and replace the workers gracefully;
+                          with preload the app code is NOT re-imported
+    kill -USR2 <master>   start a new master with the new code next to the old
+                          one, then kill -TERM the old master once it is up
+                          (zero-downtime code deploy)
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.getenv('NUTRIFIT_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('NUTRIFIT_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('NUTRIFIT_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+
+preload_app = True
+
+timeout = int(os.getenv('NUTRIFIT_TIMEOUT', 60))
+graceful_timeout = 30  # in-flight requests get this long to finish on reload/shutdown
+# Embedded job workers drain for at most this long at shutdown, leaving time to
+# hand unfinished jobs back to the queue before the master's SIGKILL
+jobs_drain_timeout = graceful_timeout - 5
+keepalive = 5
+max_requests = int(os.getenv('NUTRIFIT_MAX_REQUESTS', 0))
+max_requests_jitter = max_requests // 10
+
+accesslog = '-'
+errorlog = '-'
+
+# Objects created while preloading would otherwise be touched by the
+# collector in every worker; keep it off until the workers are forked
+gc.disable()
+
+
+def pre_fork(server, worker):
+    # Move everything allocated so far into the permanent generation
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+
+    # Connections opened while preloading must not be shared between
+    # processes; each worker opens its own
+    from wsgi import app
+    from database import db
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    # Drain the embedded job worker while its pools still run jobs; any job
+    # left unfinished goes back to the queue for another worker
+    from jobs import stop_embedded_worker
+    stop_embedded_worker(jobs_drain_timeout)
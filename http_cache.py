@@ -0,0 +1,154 @@
+import gzip
+import hashlib
+import threading
+from datetime import datetime, date, time, timezone
+from functools import wraps
+
+from flask import request, make_response, session, current_app
+from flask_login import current_user
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import db
+from models import DataVersion
+
+
+def bump_data_version(user_id):
+    """
+    Invalidate every cached data response for a user.
+
+    Added to the caller's transaction, so the new version becomes visible
+    together with the change that caused it.
+    """
+    now = datetime.utcnow()
+    stmt = sqlite_insert(DataVersion.__table__).values(user_id=user_id, version=1, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id'],
+        set_={'version': DataVersion.__table__.c.version + 1, 'updated_at': now}
+    )
+    db.session.execute(stmt)
+
+
+def get_data_version(user_id):
+    """Current (version, updated_at) for a user; users who never logged anything are at version 0"""
+    row = db.session.query(DataVersion.version, DataVersion.updated_at).filter_by(user_id=user_id).first()
+    if row:
+        return row.version, row.updated_at
+    return 0, None
+
+
+def conditional_on_data_version(view):
+    """
+    Answer conditional GETs for per-user JSON data without running the view.
+
+    The strong ETag is derived from the user's data version, today's date
+    (relative ranges like "last 7 days" move every day) and the full request
+    path, so a matching If-None-Match or a fresh If-Modified-Since gets a
+    304 before any aggregation query is made.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        version, updated_at = get_data_version(current_user.id)
+        today = date.today()
+        key = f'{current_user.id}:{version}:{today.isoformat()}:{request.full_path}'
+        etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+        # Relative date ranges change at local midnight even if no data did (times are naive UTC)
+        start_of_today = datetime.combine(today, time.min).astimezone(timezone.utc).replace(tzinfo=None)
+        last_modified = max(updated_at, start_of_today) if updated_at else start_of_today
+
+        if request.if_none_match:
+            not_modified = request.if_none_match.contains(etag)
+        else:
+            not_modified = bool(request.if_modified_since and request.if_modified_since.replace(tzinfo=None) >= last_modified.replace(microsecond=0))
+
+        if not_modified:
+            response = make_response('', 304)
+        else:
+            response = make_response(view(*args, **kwargs))
+
+        response.set_etag(etag)
+        response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapped
+
+
+# Rendered anonymous pages, keyed by (endpoint, path, year). The cache lives
+# in each worker's memory, so a deploy (new processes) starts it empty.
+_page_cache = {}
+_page_cache_lock = threading.Lock()
+
+
+def clear_page_cache():
+    with _page_cache_lock:
+        _page_cache.clear()
+
+
+def _compress_page(response):
+    """Cache entry with the body precompressed for each supported encoding"""
+    try:
+        import brotli
+    except ImportError:
+        brotli = None
+
+    body = response.get_data()
+    bodies = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+    if brotli:
+        bodies['br'] = brotli.compress(body, quality=11)
+    return {
+        'etag': hashlib.sha1(body).hexdigest(),
+        'mimetype': response.mimetype,
+        'bodies': bodies
+    }
+
+
+def _cacheable(response):
+    return response.status_code == 200 and not response.headers.getlist('Set-Cookie') and not response.direct_passthrough
+
+
+def cache_anonymous_page(view):
+    """
+    Serve GETs of a page from memory for visitors who are not logged in.
+
+    The first anonymous render of the page is stored with gzip and brotli
+    copies of its body and an ETag derived from its content; later requests
+    get the stored bytes (or a 304) without touching the template. Logged-in
+    users, requests with a query string and pages with pending flash
+    messages are always rendered, and only plain 200 responses that set no
+    cookie are stored. The year is part of the key because the footer shows it.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        if (request.method != 'GET' or request.query_string or current_app.debug
+                or current_user.is_authenticated or '_flashes' in session):
+            return view(*args, **kwargs)
+
+        key = (request.endpoint, request.path, date.today().year)
+        entry = _page_cache.get(key)
+        if entry is None:
+            response = make_response(view(*args, **kwargs))
+            if not _cacheable(response):
+                return response
+            entry = _compress_page(response)
+            with _page_cache_lock:
+                _page_cache[key] = entry
+
+        if request.if_none_match.contains(entry['etag']):
+            response = make_response('', 304)
+        else:
+            accepted = request.accept_encodings
+            encoding = next((name for name in ('br', 'gzip') if name in entry['bodies'] and accepted[name]), 'identity')
+            response = make_response(entry['bodies'][encoding])
+            response.mimetype = entry['mimetype']
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+
+        response.set_etag(entry['etag'])
+        response.vary.update(('Accept-Encoding', 'Cookie'))
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response
+
+    return wrapped
@@ -0,0 +1,456 @@
+import atexit
+import json
+import logging
+import multiprocessing
+import os
+import random
+import socket
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+
+from flask import current_app, request
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import db
+from llm_scheduler import INTERACTIVE, BACKGROUND, llm_priority
+from models import Job
+
+logger = logging.getLogger('nutrifit.jobs')
+
+# Job priorities (higher runs first): a user is waiting on the page, a page
+# will pick the result up later, or nobody is waiting
+PRIORITY_INTERACTIVE = 20
+PRIORITY_NORMAL = 10
+PRIORITY_BATCH = 0
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Seconds a worker sleeps when the queue is empty (enqueue in the same process wakes it at once)
+POLL_INTERVAL = 1.0
+# Running jobs refresh their heartbeat this often; after STALE_AFTER without one
+# the worker is presumed dead and the job is queued again
+HEARTBEAT_INTERVAL = 15
+STALE_AFTER = 120
+# First retry delay in seconds, doubled for each further attempt
+RETRY_BASE_DELAY = 2.0
+
+# Seconds running jobs get to finish when a worker stops, before they are put back
+# in the queue; under gunicorn it must end well before graceful_timeout (30 s), or
+# the worker is killed before it can hand its jobs back (see gunicorn.conf.py)
+DEFAULT_DRAIN_TIMEOUT = 25
+
+# A handler registered for a job kind; heavy handlers prefer the process pool
+JobType = namedtuple('JobType', 'func heavy max_attempts')
+
+# What a handler receives: the decoded payload plus where it is in its retries
+JobRun = namedtuple('JobRun', 'id kind payload priority attempt max_attempts')
+
+_handlers = {}
+
+# Wakes the workers of this process when a job is enqueued here
+_wakeup = threading.Event()
+
+
+def job_handler(kind, heavy=False, max_attempts=3):
+    """
+    Register a function as the handler for a job kind.
+
+    The handler gets a JobRun and runs inside an app context; whatever it
+    returns must be JSON-serializable and becomes the job's result. Raising
+    fails the attempt, which is retried with exponential backoff until
+    max_attempts. Heavy (CPU-bound) handlers run in the worker's process
+    pool when it has one.
+    """
+    def decorator(func):
+        _handlers[kind] = JobType(func, heavy, max_attempts)
+        return func
+    return decorator
+
+
+def _load_handlers():
+    # Handlers register themselves on import
+    import background_tasks  # noqa: F401
+
+
+def enqueue(kind, payload=None, user_id=None, priority=PRIORITY_NORMAL, dedupe_key=None, max_attempts=None):
+    """
+    Queue a job and commit it.
+
+    With a dedupe_key, an already queued or running job with the same key is
+    returned instead of queueing a second one; a partial unique index on
+    active keys settles races between processes.
+
+    Returns:
+        The Job row
+    """
+    _load_handlers()
+    if kind not in _handlers:
+        raise ValueError(f'No handler registered for job kind {kind!r}')
+
+    if dedupe_key:
+        existing = find_active_job(dedupe_key)
+        if existing:
+            return existing
+
+    job = Job(kind=kind, payload=json.dumps(payload or {}), user_id=user_id, priority=priority,
+              dedupe_key=dedupe_key, max_attempts=max_attempts or _handlers[kind].max_attempts)
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another process queued the same key between the lookup and the insert
+        db.session.rollback()
+        existing = find_active_job(dedupe_key) if dedupe_key else None
+        if existing is None:
+            raise
+        return existing
+    _wakeup.set()
+    return job
+
+
+def find_active_job(dedupe_key):
+    """The queued or running job with this dedupe key, if any"""
+    return Job.query.filter(Job.dedupe_key == dedupe_key, Job.status.in_(ACTIVE_STATUSES)) \
+        .order_by(Job.id.desc()).first()
+
+
+def latest_job(dedupe_key):
+    """The most recent job with this dedupe key, whatever its status"""
+    return Job.query.filter_by(dedupe_key=dedupe_key).order_by(Job.id.desc()).first()
+
+
+def job_status(job):
+    """Public view of a job for the polling endpoint"""
+    status = {
+        'id': job.id,
+        'kind': job.kind,
+        'status': job.status,
+        'attempts': job.attempts,
+        'created_at': job.created_at.isoformat() if job.created_at else None,
+        'finished_at': job.finished_at.isoformat() if job.finished_at else None
+    }
+    if job.status == 'succeeded':
+        status['result'] = json.loads(job.result) if job.result else None
+    elif job.status == 'failed':
+        status['error'] = job.error
+    return status
+
+
+def _claim(worker_id, kinds):
+    """Atomically move the next due job of the given kinds to running; returns a JobRun or None"""
+    now = datetime.utcnow()
+    table = Job.__table__
+    next_job = select(table.c.id).where(
+        table.c.status == 'queued', table.c.run_after <= now, table.c.kind.in_(kinds)
+    ).order_by(table.c.priority.desc(), table.c.id).limit(1).scalar_subquery()
+
+    row = db.session.execute(
+        update(table).where(table.c.id == next_job, table.c.status == 'queued')
+        .values(status='running', worker=worker_id, attempts=table.c.attempts + 1,
+                started_at=now, heartbeat_at=now, error=None)
+        .returning(table.c.id, table.c.kind, table.c.payload, table.c.priority, table.c.attempts,
+                   table.c.max_attempts)
+    ).first()
+    db.session.commit()
+    if row is None:
+        return None
+    return JobRun(row.id, row.kind, json.loads(row.payload or '{}'), row.priority, row.attempts, row.max_attempts)
+
+
+def _owned(job_id, worker_id):
+    table = Job.__table__
+    return (table.c.id == job_id) & (table.c.worker == worker_id) & (table.c.status == 'running')
+
+
+def _complete(run, worker_id, result=None, error=None):
+    """Record an attempt's outcome, unless the job was requeued by a drain or stale-job recovery"""
+    now = datetime.utcnow()
+    if error is None:
+        values = {'status': 'succeeded', 'result': json.dumps(result), 'finished_at': now}
+    elif run.attempt < run.max_attempts:
+        delay = RETRY_BASE_DELAY * 2 ** (run.attempt - 1) * random.uniform(0.8, 1.2)
+        values = {'status': 'queued', 'error': error, 'run_after': now + timedelta(seconds=delay)}
+    else:
+        values = {'status': 'failed', 'error': error, 'finished_at': now}
+
+    db.session.execute(update(Job.__table__).where(_owned(run.id, worker_id)).values(**values))
+    db.session.commit()
+
+
+def _release(job_ids, worker_id):
+    """Put unfinished jobs back in the queue without counting the interrupted attempt"""
+    table = Job.__table__
+    db.session.execute(
+        update(table).where(table.c.id.in_(job_ids), table.c.worker == worker_id, table.c.status == 'running')
+        .values(status='queued', worker=None, attempts=table.c.attempts - 1, run_after=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def _heartbeat(job_ids, worker_id):
+    table = Job.__table__
+    db.session.execute(
+        update(table).where(table.c.id.in_(job_ids), table.c.worker == worker_id, table.c.status == 'running')
+        .values(heartbeat_at=datetime.utcnow())
+    )
+    db.session.commit()
+
+
+def requeue_stale_jobs():
+    """
+    Recover jobs whose worker died mid-run.
+
+    Returns:
+        Number of jobs queued again (jobs out of attempts are failed instead)
+    """
+    table = Job.__table__
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_AFTER)
+    stale = (table.c.status == 'running') & (table.c.heartbeat_at < cutoff)
+
+    db.session.execute(
+        update(table).where(stale, table.c.attempts >= table.c.max_attempts)
+        .values(status='failed', error='Worker stopped responding', finished_at=datetime.utcnow())
+    )
+    requeued = db.session.execute(
+        update(table).where(stale).values(status='queued', worker=None, run_after=datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return requeued
+
+
+def _execute(app, run):
+    handler = _handlers[run.kind].func
+    # LLM calls of jobs a user is waiting on keep the interactive class; the rest yield to requests
+    priority = INTERACTIVE if run.priority >= PRIORITY_INTERACTIVE else BACKGROUND
+    with app.app_context(), llm_priority(priority):
+        return handler(run)
+
+
+# Each pool process builds its own app once, like population_stats' per-worker engine
+_process_app = None
+
+
+def _execute_in_process(config, run):
+    global _process_app
+    if _process_app is None:
+        from app import create_app
+        _process_app = create_app(config)
+    _load_handlers()
+    return _execute(_process_app, run)
+
+
+def _plain_config(app):
+    # Only simple values survive the trip to a spawned process
+    return {key: value for key, value in app.config.items()
+            if key.isupper() and isinstance(value, (str, int, float, bool, type(None)))}
+
+
+class JobWorker:
+    """
+    Runs queued jobs in a thread pool and, for heavy kinds, a process pool.
+
+    A dispatcher thread claims due jobs in priority order as long as a pool
+    has a free slot, keeps their heartbeats fresh and requeues jobs of dead
+    workers. Several workers (threads of one process or separate processes)
+    can share the queue; each claim is a single atomic UPDATE.
+    """
+
+    def __init__(self, app, threads=2, processes=0, poll_interval=POLL_INTERVAL):
+        self.app = app
+        self.threads = threads
+        self.processes = processes
+        self.poll_interval = poll_interval
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{id(self):x}'
+        self._stopping = threading.Event()
+        self._running = {}  # future -> (JobRun, pool name)
+        self._lock = threading.Lock()
+        self._dispatcher = None
+        self._thread_pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='job')
+        self._process_pool = None
+        if processes:
+            # spawn, not fork: the dispatcher and pool threads must not be copied into the children
+            self._process_pool = ProcessPoolExecutor(max_workers=processes,
+                                                     mp_context=multiprocessing.get_context('spawn'))
+
+    def start(self):
+        _load_handlers()
+        self._dispatcher = threading.Thread(target=self._dispatch, name='job-dispatcher', daemon=True)
+        self._dispatcher.start()
+        logger.info('Job worker %s started (%d threads, %d processes)', self.worker_id, self.threads, self.processes)
+        return self
+
+    def _free_slots(self):
+        with self._lock:
+            busy = [pool for _, pool in self._running.values()]
+        return self.threads - busy.count('thread'), self.processes - busy.count('process')
+
+    def _claimable_kinds(self):
+        free_threads, free_processes = self._free_slots()
+        kinds = []
+        for kind, job_type in _handlers.items():
+            if job_type.heavy and self._process_pool is not None:
+                if free_processes > 0:
+                    kinds.append(kind)
+            elif free_threads > 0:
+                kinds.append(kind)
+        return kinds
+
+    def _dispatch(self):
+        last_maintenance = 0.0
+        while not self._stopping.is_set():
+            run = None
+            try:
+                with self.app.app_context():
+                    if time.monotonic() - last_maintenance >= HEARTBEAT_INTERVAL:
+                        self._maintain()
+                        last_maintenance = time.monotonic()
+                    kinds = self._claimable_kinds()
+                    if kinds:
+                        run = _claim(self.worker_id, kinds)
+                    db.session.remove()
+                if run is not None:
+                    self._submit(run)
+                    continue
+            except Exception:
+                logger.exception('Job dispatcher error')
+                if run is not None:
+                    # Claimed but never started (e.g. the pools are shutting down): hand it back unspent
+                    self._release_claimed(run)
+            _wakeup.wait(self.poll_interval)
+            _wakeup.clear()
+
+    def _release_claimed(self, run):
+        try:
+            with self.app.app_context():
+                _release([run.id], self.worker_id)
+                db.session.remove()
+        except Exception:
+            logger.exception('Could not put job %d back in the queue', run.id)
+
+    def _maintain(self):
+        with self._lock:
+            job_ids = [run.id for run, _ in self._running.values()]
+        if job_ids:
+            _heartbeat(job_ids, self.worker_id)
+        requeued = requeue_stale_jobs()
+        if requeued:
+            logger.warning('Requeued %d jobs from unresponsive workers', requeued)
+
+    def _submit(self, run):
+        if _handlers[run.kind].heavy and self._process_pool is not None:
+            pool = 'process'
+            future = self._process_pool.submit(_execute_in_process, _plain_config(self.app), run)
+        else:
+            pool = 'thread'
+            future = self._thread_pool.submit(_execute, self.app, run)
+        with self._lock:
+            self._running[future] = (run, pool)
+        future.add_done_callback(self._done)
+
+    def _done(self, future):
+        with self._lock:
+            run, _ = self._running.pop(future)
+        if future.cancelled():
+            return
+
+        error = future.exception()
+        if error is not None:
+            logger.warning('Job %d (%s) attempt %d/%d failed: %r', run.id, run.kind, run.attempt,
+                           run.max_attempts, error)
+        try:
+            with self.app.app_context():
+                _complete(run, self.worker_id, result=None if error else future.result(),
+                          error=f'{type(error).__name__}: {error}' if error else None)
+                db.session.remove()
+        except Exception:
+            logger.exception('Could not record the outcome of job %d', run.id)
+        _wakeup.set()
+
+    def stop(self, timeout=DEFAULT_DRAIN_TIMEOUT):
+        """
+        Drain: stop claiming, give running jobs up to `timeout` seconds to
+        finish, then put any still running back in the queue for another
+        worker. Safe to call more than once.
+        """
+        if self._stopping.is_set():
+            return
+        self._stopping.set()
+        _wakeup.set()
+        if self._dispatcher is not None:
+            self._dispatcher.join()
+
+        with self._lock:
+            pending = list(self._running)
+        if pending:
+            logger.info('Draining %d running jobs (up to %ss)', len(pending), timeout)
+            wait(pending, timeout=timeout)
+
+        with self._lock:
+            unfinished = [run.id for run, _ in self._running.values()]
+        if unfinished:
+            logger.warning('Requeueing %d jobs that did not finish in time: %s', len(unfinished), unfinished)
+            with self.app.app_context():
+                _release(unfinished, self.worker_id)
+                db.session.remove()
+
+        self._thread_pool.shutdown(wait=False, cancel_futures=True)
+        if self._process_pool is not None:
+            # Their jobs are back in the queue; don't let interpreter exit wait on them
+            for process in list(getattr(self._process_pool, '_processes', {}).values()):
+                process.terminate()
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+        logger.info('Job worker %s stopped', self.worker_id)
+
+
+_embedded = {}
+_embedded_lock = threading.Lock()
+
+
+def _start_embedded_worker():
+    app = current_app._get_current_object()
+    # Started on the first request of each process, so gunicorn workers get
+    # their own after forking and the preloading master gets none
+    if os.getpid() in _embedded or request.endpoint == 'static':
+        return
+    with _embedded_lock:
+        if os.getpid() in _embedded:
+            return
+        worker = JobWorker(app, threads=app.config.get('JOBS_WORKER_THREADS', 2),
+                           processes=app.config.get('JOBS_WORKER_PROCESSES', 0))
+        _embedded[os.getpid()] = worker.start()
+    # Fallback for servers without a worker exit hook (the dev server). By the time
+    # atexit runs, concurrent.futures has already waited for the running jobs, so
+    # this only stops the dispatcher and hands back anything claimed since
+    atexit.register(stop_embedded_worker)
+
+
+def stop_embedded_worker(max_timeout=None):
+    """
+    Drain this process's embedded worker, if it has one.
+
+    Call it from the server's worker exit hook (gunicorn.conf.py's
+    worker_exit), while the pools still run jobs; max_timeout caps
+    JOBS_DRAIN_TIMEOUT to what the server allows.
+    """
+    worker = _embedded.get(os.getpid())
+    if worker is None:
+        return
+    timeout = worker.app.config.get('JOBS_DRAIN_TIMEOUT', DEFAULT_DRAIN_TIMEOUT)
+    if max_timeout is not None:
+        timeout = min(timeout, max_timeout)
+    worker.stop(timeout)
+
+
+def init_jobs(app):
+    """
+    Run jobs inside the web process unless JOBS_EMBEDDED_WORKER is off.
+
+    The embedded worker starts with the first request and drains at exit;
+    with it off, run `flask jobs-worker` as a separate service.
+    """
+    if app.config.get('JOBS_EMBEDDED_WORKER', True):
+        app.before_request(_start_embedded_worker)
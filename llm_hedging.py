@@ -0,0 +1,177 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+from functools import partial
+
+# What happened to a hedgeable call: too few samples for a deadline yet, done
+# before the deadline, over the deadline but out of budget, no free slot for
+# the hedge, which request answered first, or neither answered usably
+HEDGE_RESULTS = ('cold', 'not_needed', 'no_budget', 'no_slot', 'primary_won', 'hedge_won', 'both_failed')
+
+# Hedge once a call has taken longer than this percentile of recent calls of its
+# kind; it must sit below the slow tail (about 1 call in 20 upstream), or the
+# deadline lands inside it
+DEFAULT_HEDGE_PERCENTILE = 90.0
+# Extra requests allowed, as a share of hedgeable calls
+DEFAULT_HEDGE_BUDGET = 0.1
+# Hedges that can be saved up while calls are fast, for a burst of slow ones
+HEDGE_BURST = 10
+
+# Recent latencies kept per kind, and how many are needed before hedging starts
+HEDGE_WINDOW = 200
+HEDGE_MIN_SAMPLES = 20
+# Never hedge sooner than this (seconds), however fast calls have been
+HEDGE_MIN_DELAY = 0.05
+
+
+class LatencyTracker:
+    """Sliding window of one kind of call's latencies, for the hedging deadline"""
+
+    def __init__(self, window=HEDGE_WINDOW, min_samples=HEDGE_MIN_SAMPLES):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def deadline(self, percentile=DEFAULT_HEDGE_PERCENTILE):
+        """
+        Seconds after which a call is slower than `percentile` of recent
+        calls, or None until enough calls have been seen
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        rank = max(math.ceil(percentile / 100 * len(samples)) - 1, 0)
+        return max(samples[rank], HEDGE_MIN_DELAY)
+
+
+class HedgeBudget:
+    """
+    Caps hedges at a share of calls.
+
+    Every hedgeable call earns `ratio` of a hedge and every hedge spends a
+    whole one, so over time at most that share of calls is duplicated; up
+    to `burst` unspent hedges are kept for a run of slow calls.
+    """
+
+    def __init__(self, ratio=DEFAULT_HEDGE_BUDGET, burst=HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._balance = 0.0
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._balance = min(self._balance + self.ratio, self.burst)
+
+    def withdraw(self):
+        """Spend one hedge; False when the budget is used up"""
+        with self._lock:
+            if self._balance < 1:
+                return False
+            self._balance -= 1
+            return True
+
+    def refund(self):
+        with self._lock:
+            self._balance = min(self._balance + 1, self.burst)
+
+
+class Hedger:
+    """
+    Sends a duplicate of a slow call and takes whichever answers first.
+
+    The primary request runs on the hedger's thread pool. If it has not
+    finished by the LatencyTracker deadline for its kind, and the
+    HedgeBudget allows it, the same request is sent again, and the first
+    usable answer wins. The loser is left to finish in the background; its
+    answer is dropped. Only calls whose answer does not depend on which
+    request produced it (idempotent prompts) may be hedged.
+    """
+
+    def __init__(self, max_workers, budget_ratio=DEFAULT_HEDGE_BUDGET, percentile=DEFAULT_HEDGE_PERCENTILE,
+                 on_primary=None):
+        self.percentile = percentile
+        self.budget = HedgeBudget(budget_ratio)
+        self.on_primary = on_primary
+        self._trackers = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='llm-hedge')
+
+    def tracker(self, kind):
+        with self._lock:
+            return self._trackers.setdefault(kind, LatencyTracker())
+
+    def _primary_done(self, kind, tracker, future):
+        # Primaries only: they show the upstream's own latency, hedged or not
+        attempt = future.result()
+        if attempt.latency is None:
+            return
+        if attempt.ok:
+            tracker.record(attempt.latency)
+        if self.on_primary:
+            self.on_primary(kind, attempt.latency)
+
+    @staticmethod
+    def _send(send, hedge, sending):
+        try:
+            return send(hedge, sending)
+        finally:
+            # Also set when the request was never sent, so call() stops waiting for it
+            sending.set()
+
+    def call(self, kind, send):
+        """
+        Make a call, hedged if it runs long.
+
+        Args:
+            kind: Name of the call; each kind has its own deadline
+            send: Function of two arguments, hedge (bool) and sending (a
+                threading.Event to set just before the request goes out,
+                e.g. once it holds a concurrency slot), that makes the
+                request and returns an attempt with `ok` (a usable answer)
+                and `latency` (seconds from sending to done, None if it was
+                never sent, e.g. no free slot for a hedge); it must not raise
+
+        Returns:
+            A tuple of (winning attempt, one of HEDGE_RESULTS, seconds elapsed)
+        """
+        started = time.perf_counter()
+        tracker = self.tracker(kind)
+        deadline = tracker.deadline(self.percentile)
+        self.budget.deposit()
+
+        sending = threading.Event()
+        primary = self._executor.submit(self._send, send, False, sending)
+        primary.add_done_callback(partial(self._primary_done, kind, tracker))
+
+        def done(attempt, result):
+            return attempt, result, time.perf_counter() - started
+
+        if deadline is None:
+            return done(primary.result(), 'cold')
+        # The deadline is a percentile of send-to-done latencies, so time from the send too:
+        # waiting for a slot is queueing, which a hedge would only add to
+        sending.wait()
+        try:
+            return done(primary.result(timeout=deadline), 'not_needed')
+        except FutureTimeout:
+            pass
+        if not self.budget.withdraw():
+            return done(primary.result(), 'no_budget')
+
+        hedge = self._executor.submit(self._send, send, True, threading.Event())
+        for future in as_completed((primary, hedge)):
+            attempt = future.result()
+            if future is hedge and attempt.latency is None:
+                self.budget.refund()
+                return done(primary.result(), 'no_slot')
+            if attempt.ok:
+                return done(attempt, 'hedge_won' if future is hedge else 'primary_won')
+        return done(primary.result(), 'both_failed')
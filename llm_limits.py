@@ -0,0 +1,64 @@
+import hashlib
+import math
+import os
+
+from flask import current_app, jsonify
+
+from shared_store import get_store
+
+# Token-bucket limits on calls to the LLM API. Rates are per minute, bursts are
+# the bucket capacity; each can be overridden in app config or the environment.
+LIMIT_DEFAULTS = {
+    'LLM_USER_PER_MINUTE': 6,
+    'LLM_USER_BURST': 3,
+    'LLM_GLOBAL_PER_MINUTE': 120,
+    'LLM_GLOBAL_BURST': 20
+}
+
+# LLM answers for identical inputs are reused for a week
+LLM_CACHE_TTL = 7 * 24 * 60 * 60
+
+
+def _limit(name):
+    value = current_app.config.get(name, os.getenv(name))
+    return float(value) if value not in (None, '') else float(LIMIT_DEFAULTS[name])
+
+
+def admit_llm_call(user_id):
+    """
+    Take one token from the user's bucket and the global bucket.
+
+    Only calls that will actually reach the API should be admitted; answers
+    from the local food catalog or the cache never cost a token.
+
+    Returns:
+        A tuple of (allowed, seconds until the next call would be allowed)
+    """
+    buckets = [
+        (f'llm:user:{user_id}', _limit('LLM_USER_PER_MINUTE') / 60, _limit('LLM_USER_BURST')),
+        ('llm:global', _limit('LLM_GLOBAL_PER_MINUTE') / 60, _limit('LLM_GLOBAL_BURST'))
+    ]
+    return get_store().take_tokens(buckets)
+
+
+def llm_cache_key(kind, *parts):
+    """Shared-store key for an LLM answer to the given inputs"""
+    digest = hashlib.sha1('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'llm:{kind}:{digest}'
+
+
+def get_cached_llm_result(key):
+    return get_store().get(key)
+
+
+def cache_llm_result(key, value):
+    get_store().set(key, value, ttl=LLM_CACHE_TTL)
+
+
+def too_many_requests(retry_after):
+    """429 response telling the client when to try again"""
+    seconds = max(math.ceil(retry_after), 1)
+    response = jsonify({'error': 'Too many AI requests, please try again shortly', 'retry_after': seconds})
+    response.status_code = 429
+    response.headers['Retry-After'] = str(seconds)
+    return response
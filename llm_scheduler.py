@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Priority classes of LLM calls: a user is waiting on the response, or nobody is
+INTERACTIVE = 'interactive'
+BACKGROUND = 'background'
+PRIORITY_CLASSES = (INTERACTIVE, BACKGROUND)
+
+# Calls in flight to the API per process, and how many of those slots only
+# interactive calls may use
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_INTERACTIVE_RESERVED = 2
+
+# Share of freed slots each class gets while both have calls waiting
+DEFAULT_WEIGHTS = {INTERACTIVE: 4, BACKGROUND: 1}
+
+# Seconds a call waits for a slot before giving up
+QUEUE_TIMEOUT = {INTERACTIVE: 10.0, BACKGROUND: 120.0}
+
+# Class of the calls made by the current request or job; requests are interactive
+_priority = ContextVar('llm_priority', default=INTERACTIVE)
+
+
+class QueueTimeout(Exception):
+    """No slot freed up within the class's queue timeout"""
+
+
+def current_priority():
+    return _priority.get()
+
+
+@contextmanager
+def llm_priority(priority):
+    """Make LLM calls inside the block with the given priority class"""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f'Unknown LLM priority class {priority!r}')
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class _Waiter:
+    __slots__ = ('priority', 'granted')
+
+    def __init__(self, priority):
+        self.priority = priority
+        self.granted = threading.Event()
+
+
+class LLMScheduler:
+    """
+    Limits concurrent upstream calls and decides who goes next.
+
+    Each priority class has its own FIFO queue. When a slot frees up it goes
+    to the waiting class with the lowest pass value (stride scheduling):
+    every grant advances a class's pass by 1 / weight, so under contention
+    interactive calls get weight-proportional shares of the slots, and a
+    class that has been idle rejoins at the current pass instead of catching
+    up. Background calls may never hold more than
+    max_concurrency - interactive_reserved slots, so the reserved slots are
+    always free for interactive calls, however much background work is
+    queued.
+    """
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY, interactive_reserved=DEFAULT_INTERACTIVE_RESERVED,
+                 weights=None):
+        if not 0 <= interactive_reserved < max_concurrency:
+            raise ValueError('interactive_reserved must be at least 0 and less than max_concurrency')
+        self.max_concurrency = max_concurrency
+        self.interactive_reserved = interactive_reserved
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self._lock = threading.Lock()
+        self._queues = {priority: deque() for priority in PRIORITY_CLASSES}
+        self._in_flight = {priority: 0 for priority in PRIORITY_CLASSES}
+        self._pass = {priority: 0.0 for priority in PRIORITY_CLASSES}
+        self._virtual_time = 0.0
+
+    def _has_slot(self, priority):
+        if sum(self._in_flight.values()) >= self.max_concurrency:
+            return False
+        if priority == BACKGROUND:
+            return self._in_flight[BACKGROUND] < self.max_concurrency - self.interactive_reserved
+        return True
+
+    def _dispatch(self):
+        # Called with the lock held, after anything that may free a slot or add a waiter
+        while True:
+            eligible = [priority for priority in PRIORITY_CLASSES
+                        if self._queues[priority] and self._has_slot(priority)]
+            if not eligible:
+                return
+            # Ties go to the class listed first (interactive)
+            priority = min(eligible, key=lambda p: (self._pass[p], PRIORITY_CLASSES.index(p)))
+            waiter = self._queues[priority].popleft()
+            self._in_flight[priority] += 1
+            self._virtual_time = self._pass[priority]
+            self._pass[priority] += 1 / self.weights[priority]
+            waiter.granted.set()
+
+    def acquire(self, priority, timeout=None):
+        """
+        Wait for a slot.
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            QueueTimeout: if no slot was granted within `timeout` seconds
+        """
+        started = time.perf_counter()
+        waiter = _Waiter(priority)
+        with self._lock:
+            if not self._queues[priority]:
+                # Rejoining after idling: don't let a saved-up low pass starve the other class
+                self._pass[priority] = max(self._pass[priority], self._virtual_time)
+            self._queues[priority].append(waiter)
+            self._dispatch()
+
+        if not waiter.granted.wait(timeout):
+            with self._lock:
+                # The slot may have been granted between the timeout and taking the lock
+                if not waiter.granted.is_set():
+                    self._queues[priority].remove(waiter)
+                    raise QueueTimeout(f'No {priority} LLM slot free after {timeout}s')
+        return time.perf_counter() - started
+
+    def release(self, priority):
+        with self._lock:
+            self._in_flight[priority] -= 1
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, priority=None, timeout=None):
+        """
+        Hold a slot for one call; yields the seconds spent queueing.
+
+        The priority defaults to the current class (see llm_priority) and the
+        timeout to that class's QUEUE_TIMEOUT.
+        """
+        priority = priority or current_priority()
+        waited = self.acquire(priority, QUEUE_TIMEOUT[priority] if timeout is None else timeout)
+        try:
+            yield waited
+        finally:
+            self.release(priority)
+
+    def stats(self):
+        """Calls in flight and waiting, per class"""
+        with self._lock:
+            return {priority: {'in_flight': self._in_flight[priority], 'waiting': len(self._queues[priority])}
+                    for priority in PRIORITY_CLASSES}
@@ -0,0 +1,107 @@
+import json
+import logging
+
+from flask import current_app, g, has_request_context, request
+
+from metrics import define_metric, inc, observe
+
+logger = logging.getLogger('nutrifit.llm')
+
+# Timed phases of a call, each measured from the moment the request is sent:
+# connect (TCP + TLS, zero on a reused connection), ttfb (response headers
+# received) and total (body read); queue is the wait for a scheduler slot before that
+PHASES = ('connect', 'ttfb', 'total')
+TIMINGS = ('queue',) + PHASES
+
+define_metric('nutrifit_llm_calls_total', 'counter',
+              'Together AI calls by kind, endpoint, priority class, HTTP status and outcome.')
+define_metric('nutrifit_llm_queue_wait_seconds', 'histogram',
+              'Time Together AI calls waited for a concurrency slot, by kind and priority class.')
+define_metric('nutrifit_llm_call_duration_seconds', 'histogram',
+              'Together AI call latency by kind, endpoint and phase (connect, ttfb, total).')
+define_metric('nutrifit_llm_hedges_total', 'counter',
+              'Hedgeable Together AI calls by kind and hedge result (see llm_hedging.HEDGE_RESULTS).')
+define_metric('nutrifit_llm_unhedged_duration_seconds', 'histogram',
+              'Latency of the first request of hedgeable calls, i.e. without hedging, by kind.')
+define_metric('nutrifit_llm_prompt_bytes_total', 'counter', 'Prompt bytes sent to Together AI, by kind and endpoint.')
+define_metric('nutrifit_llm_response_bytes_total', 'counter',
+              'Response bytes received from Together AI, by kind and endpoint.')
+define_metric('nutrifit_llm_request_duration_seconds', 'histogram',
+              'Total Together AI time per request, by endpoint.')
+
+
+def record_llm_call(span):
+    """
+    Log one Together AI call and add it to the metrics.
+
+    Inside a request the call is attributed to the current endpoint and
+    added to the request's upstream time; from the CLI the endpoint is
+    'none'.
+
+    Args:
+        span: Dictionary with kind, priority, status (None if no response
+            arrived), outcome, the TIMINGS in seconds (None if not reached),
+            prompt_bytes and response_bytes, an optional hedge result,
+            plus optional extra fields (usage, error) that only go to the log
+    """
+    endpoint = (request.endpoint or 'unmatched') if has_request_context() else 'none'
+    labels = {'kind': span['kind'], 'endpoint': endpoint}
+
+    inc('nutrifit_llm_calls_total', {**labels, 'priority': span['priority'], 'status': str(span['status'] or 'none'),
+                                     'outcome': span['outcome']})
+    if span.get('queue') is not None:
+        observe('nutrifit_llm_queue_wait_seconds', {'kind': span['kind'], 'priority': span['priority']},
+                span['queue'])
+    for phase in PHASES:
+        if span.get(phase) is not None:
+            observe('nutrifit_llm_call_duration_seconds', {**labels, 'phase': phase}, span[phase])
+    if span.get('hedge'):
+        inc('nutrifit_llm_hedges_total', {'kind': span['kind'], 'result': span['hedge']})
+    inc('nutrifit_llm_prompt_bytes_total', labels, span['prompt_bytes'])
+    inc('nutrifit_llm_response_bytes_total', labels, span['response_bytes'])
+
+    record = {'event': 'llm_call', 'endpoint': endpoint}
+    if has_request_context():
+        record['method'] = request.method
+        record['path'] = request.path
+        g.llm_call_count = g.get('llm_call_count', 0) + 1
+        g.llm_call_time = g.get('llm_call_time', 0.0) + (span.get('total') or 0.0)
+    for key, value in span.items():
+        record[key] = round(value * 1000, 1) if key in TIMINGS and value is not None else value
+    logger.info('llm_call %s', json.dumps(record, default=str))
+
+
+def record_unhedged_latency(kind, seconds):
+    """
+    Record how long the first request of a hedgeable call took on its own.
+
+    Compared with the total phase of nutrifit_llm_call_duration_seconds for
+    the same kind, this shows what hedging saves at the tail.
+    """
+    observe('nutrifit_llm_unhedged_duration_seconds', {'kind': kind}, seconds)
+
+
+def _add_headers(response):
+    count = g.get('llm_call_count', 0)
+    if not count:
+        return response
+
+    llm_time = g.llm_call_time
+    observe('nutrifit_llm_request_duration_seconds', {'endpoint': request.endpoint or 'unmatched'}, llm_time)
+
+    if current_app.debug or current_app.config.get('QUERY_STATS_HEADERS'):
+        response.headers.add('Server-Timing', f'llm;dur={llm_time * 1000:.1f};desc="{count} Together AI calls"')
+    return response
+
+
+def init_llm_tracing(app):
+    """
+    Record per-request Together AI time.
+
+    Each request that called the API adds its upstream time to a histogram,
+    next to the HTTP and database ones, so the remainder is the app's own
+    time; in debug mode (or with QUERY_STATS_HEADERS set) it is also sent
+    as a Server-Timing entry. Timings are in the log (nutrifit.llm logger),
+    one JSON record per call, in milliseconds.
+    """
+    app.after_request(_add_headers)
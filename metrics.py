@@ -0,0 +1,294 @@
+import hmac
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, request, Response
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server, no cross-process lock needed
+    fcntl = None
+
+# Upper bounds (seconds) of the latency histogram buckets; +Inf is implicit
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Metric name -> (type, help text)
+METRICS = {
+    'nutrifit_http_requests_total': ('counter', 'HTTP requests by endpoint, method and status code.'),
+    'nutrifit_http_request_duration_seconds': ('histogram', 'HTTP request latency by endpoint and method.'),
+    'nutrifit_http_requests_in_flight': ('gauge', 'HTTP requests currently being handled, by endpoint.')
+}
+
+# How often a worker writes its metrics to disk, at the end of a request. A
+# /metrics scrape always flushes its own worker; another worker's last second
+# of requests shows up once it handles its next request.
+FLUSH_INTERVAL = 1.0
+
+ARCHIVE_NAME = '_archive.json'
+
+# Clients allowed to read /metrics when no METRICS_TOKEN is configured
+LOOPBACK_ADDRESSES = ('127.0.0.1', '::1')
+
+
+def define_metric(name, kind, help_text):
+    """Register a metric so other modules can record it (counter, gauge or histogram)"""
+    METRICS[name] = (kind, help_text)
+
+
+class Registry:
+    """
+    Metrics recorded by this process.
+
+    Values are keyed by metric name and a sorted tuple of label pairs.
+    Histograms hold per-bucket (not cumulative) counts followed by sum and count.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.lock = threading.Lock()
+        self.last_flush = 0.0
+
+    def inc(self, name, labels, amount=1.0):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            series[key] = series.get(key, 0.0) + amount
+
+    def observe(self, name, labels, value):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            series = self.values.setdefault(name, {})
+            buckets = series.get(key)
+            if buckets is None:
+                buckets = series[key] = [0] * (len(LATENCY_BUCKETS) + 1) + [0.0, 0]
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    buckets[i] += 1
+                    break
+            else:
+                buckets[len(LATENCY_BUCKETS)] += 1
+            buckets[-2] += value
+            buckets[-1] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return {name: [[list(key), value] for key, value in series.items()]
+                    for name, series in self.values.items()}
+
+
+_registry = Registry()
+
+
+def inc(name, labels, amount=1.0):
+    _registry.inc(name, labels, amount)
+
+
+def observe(name, labels, value):
+    _registry.observe(name, labels, value)
+
+
+def _metrics_dir():
+    return current_app.config.get('METRICS_DIR') or os.path.join(current_app.instance_path, 'metrics')
+
+
+def _write_json(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+def flush(metrics_dir):
+    """Write this process's metrics to <metrics_dir>/<pid>.json"""
+    os.makedirs(metrics_dir, exist_ok=True)
+    _write_json(os.path.join(metrics_dir, f'{os.getpid()}.json'), _registry.snapshot())
+    _registry.last_flush = time.monotonic()
+
+
+def _pid_alive(pid):
+    if os.name == 'nt':
+        # os.kill(pid, 0) would send CTRL_C_EVENT on Windows; only the dev server runs there
+        return pid == os.getpid()
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _merge(totals, snapshot, include_gauges=True):
+    for name, series in snapshot.items():
+        if name not in METRICS:
+            continue
+        kind = METRICS[name][0]
+        if kind == 'gauge' and not include_gauges:
+            continue
+        merged = totals.setdefault(name, {})
+        for labels, value in series:
+            key = tuple(tuple(pair) for pair in labels)
+            if kind == 'histogram':
+                current = merged.get(key)
+                merged[key] = value if current is None else [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = merged.get(key, 0.0) + value
+
+
+@contextmanager
+def _locked(metrics_dir):
+    if fcntl is None:
+        yield
+        return
+    with open(os.path.join(metrics_dir, '.lock'), 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def collect(metrics_dir):
+    """
+    Merge the metrics of every worker.
+
+    Counters and histograms of workers that have exited are folded into an
+    archive file, so totals keep growing across worker restarts while the
+    directory stays small; their in-flight gauges are dropped.
+    """
+    os.makedirs(metrics_dir, exist_ok=True)
+    totals = {}
+    with _locked(metrics_dir):
+        archive_path = os.path.join(metrics_dir, ARCHIVE_NAME)
+        archive = _read_json(archive_path)
+        archived = {}
+        _merge(archived, archive)
+
+        dead = []
+        for filename in os.listdir(metrics_dir):
+            stem, ext = os.path.splitext(filename)
+            if ext != '.json' or not stem.isdigit():
+                continue
+            path = os.path.join(metrics_dir, filename)
+            snapshot = _read_json(path)
+            if _pid_alive(int(stem)):
+                _merge(totals, snapshot)
+            else:
+                _merge(archived, snapshot, include_gauges=False)
+                dead.append(path)
+
+        if dead:
+            _write_json(archive_path, {name: [[list(key), value] for key, value in series.items()]
+                                       for name, series in archived.items()})
+            for path in dead:
+                os.remove(path)
+
+    for name, series in archived.items():
+        merged = totals.setdefault(name, {})
+        for key, value in series.items():
+            current = merged.get(key)
+            if current is None:
+                merged[key] = value
+            elif isinstance(value, list):
+                merged[key] = [a + b for a, b in zip(current, value)]
+            else:
+                merged[key] = current + value
+    return totals
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _number(value):
+    return int(value) if float(value).is_integer() else value
+
+
+def render_prometheus(totals):
+    """Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in sorted(totals.get(name, {}).items()):
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {_number(value)}')
+                continue
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS + ('+Inf',), value[:len(LATENCY_BUCKETS) + 1]):
+                cumulative += count
+                le = bound if bound == '+Inf' else f'{bound:g}'
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", le)])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value[-2]:.6f}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _start_timer():
+    g.metrics_started = time.perf_counter()
+    g.metrics_endpoint = request.endpoint or 'unmatched'
+    inc('nutrifit_http_requests_in_flight', {'endpoint': g.metrics_endpoint})
+
+
+def _record(response):
+    if 'metrics_started' in g:
+        elapsed = time.perf_counter() - g.metrics_started
+        labels = {'endpoint': g.metrics_endpoint, 'method': request.method}
+        inc('nutrifit_http_requests_total', {**labels, 'status': str(response.status_code)})
+        observe('nutrifit_http_request_duration_seconds', labels, elapsed)
+        g.metrics_recorded = True
+    return response
+
+
+def _finish(error):
+    if 'metrics_started' not in g:
+        return
+    # Unhandled exceptions skip after_request; count them as 500s
+    if error is not None and 'metrics_recorded' not in g:
+        _record(Response(status=500))
+    inc('nutrifit_http_requests_in_flight', {'endpoint': g.metrics_endpoint}, -1)
+    if time.monotonic() - _registry.last_flush >= FLUSH_INTERVAL:
+        flush(_metrics_dir())
+
+
+def metrics_view():
+    # With METRICS_TOKEN set only a matching bearer token gets in; without it, only loopback clients
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+    elif request.remote_addr not in LOOPBACK_ADDRESSES:
+        return Response('Forbidden\n', status=403, mimetype='text/plain')
+
+    metrics_dir = _metrics_dir()
+    flush(metrics_dir)
+    return Response(render_prometheus(collect(metrics_dir)), mimetype='text/plain; version=0.0.4')
+
+
+def init_metrics(app):
+    """
+    Record request metrics for every view and serve them on /metrics, to
+    loopback clients or, with METRICS_TOKEN set, to that bearer token
+    """
+    app.before_request(_start_timer)
+    app.after_request(_record)
+    app.teardown_request(_finish)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
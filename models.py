@@ -8,7 +8,7 @@ class User(db.Model, UserMixin):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    profile = db.relationship('UserProfile', backref='user', uselist=False)
+    profile = db.relationship('UserProfile', backref='user', uselist=False, lazy='joined')  # read on almost every page
     food_entries = db.relationship('FoodEntry', backref='user', lazy=True)
     water_entries = db.relationship('WaterIntake', backref='user', lazy=True)
     
@@ -58,6 +58,9 @@ class FoodEntry(db.Model):
     meal_type = db.Column(db.String(20))  # e.g., "breakfast", "lunch", "dinner", "snack"
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    # Every dashboard and analytics query filters on one user and a date range
+    __table_args__ = (db.Index('ix_food_entry_user_date', 'user_id', 'date'),)
+    
     def __repr__(self):
         return f'<FoodEntry {self.name}>'
 
@@ -69,5 +72,127 @@ class WaterIntake(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    __table_args__ = (db.Index('ix_water_intake_user_date', 'user_id', 'date'),)
+    
+    def __repr__(self):
+        return f'<WaterIntake {self.date}: {self.amount}ml>'
+
+class NutritionRollup(db.Model):
+    """Precomputed weekly or monthly totals for one user, maintained by rollups.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    period = db.Column(db.String(10), nullable=False)  # "week" or "month"
+    period_start = db.Column(db.Date, nullable=False)  # Monday of the week, or 1st of the month
+    calories = db.Column(db.Float, default=0)
+    protein = db.Column(db.Float, default=0)
+    carbs = db.Column(db.Float, default=0)
+    fat = db.Column(db.Float, default=0)
+    food_days = db.Column(db.Integer, default=0)  # days with at least one food entry
+    water = db.Column(db.Integer, default=0)  # in ml
+    water_days = db.Column(db.Integer, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'period', 'period_start', name='uq_nutrition_rollup_period'),)
+    
+    def __repr__(self):
+        return f'<NutritionRollup {self.period} {self.period_start}>'
+
+class DirtyDay(db.Model):
+    """A day whose entries changed since the rollups covering it were last refreshed"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'date', name='uq_dirty_day_user_date'),)
+    
+    def __repr__(self):
+        return f'<DirtyDay {self.user_id} {self.date}>'
+
+class DataVersion(db.Model):
+    """Per-user counter bumped whenever logged data or the profile changes, used to build ETags"""
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DataVersion {self.user_id}: {self.version}>'
+
+class PopulationStat(db.Model):
+    """Nightly aggregate over all users for one goal type, written by population_stats.py"""
+    id = db.Column(db.Integer, primary_key=True)
+    computed_on = db.Column(db.Date, nullable=False)
+    period_days = db.Column(db.Integer, nullable=False)
+    goal = db.Column(db.String(50), nullable=False)  # profile goal, or "all"
+    users = db.Column(db.Integer, default=0)  # users who logged food in the period
+    avg_adherence = db.Column(db.Float)  # % of logged days within 10% of the calorie goal
+    avg_calories = db.Column(db.Float)  # mean of per-user average daily calories
+    water_compliance = db.Column(db.Float)  # % of days in the period at or above the water goal
+    calorie_histogram = db.Column(db.Text)  # JSON list of user counts per CALORIE_BIN_WIDTH bin
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('computed_on', 'goal', name='uq_population_stat_day_goal'),)
+    
+    def __repr__(self):
+        return f'<PopulationStat {self.computed_on} {self.goal}>'
+
+class WeightLog(db.Model):
+    """One weigh-in per user per day; UserProfile.weight keeps only the latest value"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    weight = db.Column(db.Float, nullable=False)  # in kg
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # Also the index that serves the (user_id, date) range scan of the trend API
+    __table_args__ = (db.UniqueConstraint('user_id', 'date', name='uq_weight_log_user_date'),)
+    
+    def __repr__(self):
+        return f'<WeightLog {self.user_id} {self.date} {self.weight}>'
+
+class Job(db.Model):
+    """Background work queued by jobs.enqueue and run by a jobs worker"""
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(50), nullable=False)  # name of a handler registered with jobs.job_handler
+    payload = db.Column(db.Text)  # JSON arguments for the handler
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'))  # owner, who may poll the job; None for admin jobs
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, succeeded or failed
+    priority = db.Column(db.Integer, nullable=False, default=0)  # higher runs first
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    dedupe_key = db.Column(db.String(200))  # at most one queued or running job per key
+    run_after = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)  # retry backoff
+    worker = db.Column(db.String(100))  # host:pid:worker of the current or last run
+    result = db.Column(db.Text)  # JSON returned by the handler
+    error = db.Column(db.Text)  # last failure
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)  # refreshed while running; stale jobs are requeued
+    finished_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_job_claim', 'status', 'priority', 'run_after'),
+        db.Index('ix_job_dedupe_key', 'dedupe_key'),
+        # Enforces the dedupe across processes; jobs.enqueue relies on it
+        db.Index('ux_job_active_dedupe_key', 'dedupe_key', unique=True,
+                 sqlite_where=db.text("status IN ('queued', 'running')"),
+                 postgresql_where=db.text("status IN ('queued', 'running')"))
+    )
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+
+class DiaryImport(db.Model):
+    """Progress of a diary CSV import; committed with each batch of entries so a resumed import never repeats one"""
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    source = db.Column(db.String(500), nullable=False)  # absolute path of the CSV
+    rows_done = db.Column(db.Integer, nullable=False, default=0)  # CSV rows read and committed
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    skipped = db.Column(db.Integer, nullable=False, default=0)
+    complete = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (db.UniqueConstraint('user_id', 'source', name='uq_diary_import_user_source'),)
+    
     def __repr__(self):
-        return f'<WaterIntake {self.date}: {self.amount}ml>' 
\ No newline at end of file
+        return f'<DiaryImport {self.user_id} {self.source} {self.rows_done}>'
@@ -0,0 +1,196 @@
+import json
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+from sqlalchemy import create_engine, func, select
+
+from database import db
+from models import User, UserProfile, FoodEntry, WaterIntake, PopulationStat
+
+# Users per shard handed to a worker process
+DEFAULT_SHARD_SIZE = 5000
+
+# Average daily calories are binned into this many 250 kcal buckets (the last one is open-ended)
+CALORIE_BIN_WIDTH = 250
+CALORIE_BINS = 24
+
+# Each worker process keeps its own engine for the whole run
+_worker_engine = None
+
+
+def _engine(db_url):
+    global _worker_engine
+    if _worker_engine is None:
+        _worker_engine = create_engine(db_url)
+    return _worker_engine
+
+
+def _empty_partial():
+    return {
+        'users': 0,
+        'adherence_sum': 0.0,
+        'adherence_users': 0,
+        'calories_sum': 0.0,
+        'water_sum': 0.0,
+        'water_users': 0,
+        'histogram': [0] * CALORIE_BINS
+    }
+
+
+def compute_shard(db_url, first_id, last_id, start, end):
+    """
+    Aggregate one shard of users (first_id <= user_id < last_id).
+
+    Runs in a worker process. The shard's profiles and daily totals are
+    read with three queries, then per-user metrics are computed with
+    np.bincount over a dense user index, and reduced to small per-goal
+    partial sums that the parent process merges.
+
+    Returns:
+        Dictionary mapping goal to partial sums
+    """
+    profile_table = UserProfile.__table__
+    food_table = FoodEntry.__table__
+    water_table = WaterIntake.__table__
+    period_days = (end - start).days + 1
+    size = last_id - first_id
+
+    with _engine(db_url).connect() as conn:
+        profiles = conn.execute(
+            select(profile_table.c.user_id, profile_table.c.goal,
+                   profile_table.c.daily_calorie_goal, profile_table.c.daily_water_goal)
+            .where(profile_table.c.user_id >= first_id, profile_table.c.user_id < last_id)
+        ).all()
+        if not profiles:
+            return {}
+
+        food_rows = conn.execute(
+            select(food_table.c.user_id, func.sum(food_table.c.calories))
+            .where(food_table.c.user_id >= first_id, food_table.c.user_id < last_id,
+                   food_table.c.date >= start, food_table.c.date <= end)
+            .group_by(food_table.c.user_id, food_table.c.date)
+        ).all()
+
+        water_rows = conn.execute(
+            select(water_table.c.user_id, func.sum(water_table.c.amount))
+            .where(water_table.c.user_id >= first_id, water_table.c.user_id < last_id,
+                   water_table.c.date >= start, water_table.c.date <= end)
+            .group_by(water_table.c.user_id, water_table.c.date)
+        ).all()
+
+    # Per-user goals, indexed by user_id - first_id
+    profile_ids, goals, calorie_goals, water_goals = zip(*profiles)
+    profile_index = np.array(profile_ids, dtype=np.int64) - first_id
+    calorie_goal = np.zeros(size)
+    calorie_goal[profile_index] = np.array([g or 0 for g in calorie_goals], dtype=np.float64)
+    water_goal = np.zeros(size)
+    water_goal[profile_index] = np.array([g or 0 for g in water_goals], dtype=np.float64)
+    goal_names, goal_codes = np.unique(np.array([g or 'unset' for g in goals]), return_inverse=True)
+    goal_code = np.full(size, -1, dtype=np.int64)
+    goal_code[profile_index] = goal_codes
+
+    # One row per user-day: logged days, calorie sums and on-target days per user
+    if food_rows:
+        food_users, food_calories = (np.array(column) for column in zip(*food_rows))
+        food_index = food_users.astype(np.int64) - first_id
+        food_calories = food_calories.astype(np.float64)
+        logged_days = np.bincount(food_index, minlength=size)
+        calorie_sums = np.bincount(food_index, weights=food_calories, minlength=size)
+        day_goal = calorie_goal[food_index]
+        on_target = (day_goal > 0) & (np.abs(food_calories - day_goal) <= day_goal * 0.1)
+        on_target_days = np.bincount(food_index, weights=on_target, minlength=size)
+    else:
+        logged_days = np.zeros(size, dtype=np.int64)
+        calorie_sums = np.zeros(size)
+        on_target_days = np.zeros(size)
+
+    if water_rows:
+        water_users, water_amounts = (np.array(column) for column in zip(*water_rows))
+        water_index = water_users.astype(np.int64) - first_id
+        met = water_amounts.astype(np.float64) >= np.maximum(water_goal[water_index], 1)
+        water_days = np.bincount(water_index, weights=met & (water_goal[water_index] > 0), minlength=size)
+    else:
+        water_days = np.zeros(size)
+
+    active = logged_days > 0
+    has_calorie_goal = active & (calorie_goal > 0)
+    has_water_goal = (goal_code >= 0) & (water_goal > 0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        avg_calories = np.where(active, calorie_sums / logged_days, 0.0)
+        adherence = np.where(has_calorie_goal, on_target_days / logged_days * 100, 0.0)
+    water_compliance = water_days / period_days * 100
+    calorie_bin = np.minimum((avg_calories // CALORIE_BIN_WIDTH).astype(np.int64), CALORIE_BINS - 1)
+
+    partials = {}
+    for code, name in enumerate(goal_names):
+        in_goal = goal_code == code
+        users = in_goal & active
+        adherent = in_goal & has_calorie_goal
+        watered = in_goal & has_water_goal
+        partials[str(name)] = {
+            'users': int(users.sum()),
+            'adherence_sum': float(adherence[adherent].sum()),
+            'adherence_users': int(adherent.sum()),
+            'calories_sum': float(avg_calories[users].sum()),
+            'water_sum': float(water_compliance[watered].sum()),
+            'water_users': int(watered.sum()),
+            'histogram': np.bincount(calorie_bin[users], minlength=CALORIE_BINS).tolist()
+        }
+    return partials
+
+
+def _merge(total, partial):
+    for key in ('users', 'adherence_sum', 'adherence_users', 'calories_sum', 'water_sum', 'water_users'):
+        total[key] += partial[key]
+    total['histogram'] = [a + b for a, b in zip(total['histogram'], partial['histogram'])]
+
+
+def compute_population_stats(period_days=30, workers=None, shard_size=DEFAULT_SHARD_SIZE, progress=None):
+    """
+    Compute population-wide adherence, calorie and water stats per goal type.
+
+    Users are split into id-range shards that a process pool aggregates in
+    parallel, each worker reading its shard's data exactly once. The merged
+    results replace today's rows in the population_stat table.
+
+    Returns:
+        Dictionary mapping goal to the stored PopulationStat values
+    """
+    end = date.today()
+    start = end - timedelta(days=period_days - 1)
+    db_url = db.engine.url.render_as_string(hide_password=False)
+
+    max_id = db.session.query(func.max(User.id)).scalar() or 0
+    shards = [(first_id, min(first_id + shard_size, max_id + 1)) for first_id in range(1, max_id + 1, shard_size)]
+
+    totals = defaultdict(_empty_partial)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(compute_shard, db_url, first_id, last_id, start, end) for first_id, last_id in shards]
+        for done, future in enumerate(futures, start=1):
+            for goal, partial in future.result().items():
+                _merge(totals[goal], partial)
+                _merge(totals['all'], partial)
+            if progress:
+                progress(done, len(shards))
+
+    PopulationStat.query.filter_by(computed_on=end).delete()
+    results = {}
+    for goal, total in totals.items():
+        stat = PopulationStat(
+            computed_on=end,
+            period_days=period_days,
+            goal=goal,
+            users=total['users'],
+            avg_adherence=round(total['adherence_sum'] / total['adherence_users'], 1) if total['adherence_users'] else None,
+            avg_calories=round(total['calories_sum'] / total['users'], 1) if total['users'] else None,
+            water_compliance=round(total['water_sum'] / total['water_users'], 1) if total['water_users'] else None,
+            calorie_histogram=json.dumps(total['histogram'])
+        )
+        db.session.add(stat)
+        results[goal] = stat
+    db.session.commit()
+
+    return results
@@ -0,0 +1,110 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from metrics import define_metric, inc, observe
+
+logger = logging.getLogger('nutrifit.sql')
+
+# Statements slower than this are logged with their route (SLOW_QUERY_MS overrides it)
+DEFAULT_SLOW_QUERY_MS = 100
+
+# Longest statement text written to the slow-query log
+_STATEMENT_LOG_LENGTH = 500
+
+define_metric('nutrifit_db_queries_total', 'counter', 'SQL statements executed, by endpoint.')
+define_metric('nutrifit_db_slow_queries_total', 'counter', 'SQL statements slower than SLOW_QUERY_MS, by endpoint.')
+define_metric('nutrifit_db_request_duration_seconds', 'histogram', 'Total SQL time per request, by endpoint.')
+
+# Open assert_max_queries blocks of the current thread
+_recorders = threading.local()
+
+
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_started'].pop()
+
+    for recorder in getattr(_recorders, 'stack', ()):
+        recorder.append((statement, elapsed))
+
+    if not has_request_context():
+        return
+
+    g.db_query_count = g.get('db_query_count', 0) + 1
+    g.db_query_time = g.get('db_query_time', 0.0) + elapsed
+
+    threshold = current_app.config.get('SLOW_QUERY_MS', DEFAULT_SLOW_QUERY_MS)
+    if elapsed * 1000 >= threshold:
+        endpoint = request.endpoint or 'unmatched'
+        inc('nutrifit_db_slow_queries_total', {'endpoint': endpoint})
+        logger.warning('Slow query (%.1f ms) in %s %s [%s]: %s',
+                       elapsed * 1000, request.method, request.path, endpoint,
+                       ' '.join(statement.split())[:_STATEMENT_LOG_LENGTH])
+
+
+def _add_headers(response):
+    count = g.get('db_query_count', 0)
+    db_time = g.get('db_query_time', 0.0)
+    endpoint = request.endpoint or 'unmatched'
+
+    if count:
+        inc('nutrifit_db_queries_total', {'endpoint': endpoint}, count)
+        observe('nutrifit_db_request_duration_seconds', {'endpoint': endpoint}, db_time)
+
+    if current_app.debug or current_app.config.get('QUERY_STATS_HEADERS'):
+        response.headers['X-DB-Query-Count'] = str(count)
+        response.headers['X-DB-Query-Time-ms'] = f'{db_time * 1000:.1f}'
+        response.headers.add('Server-Timing', f'db;dur={db_time * 1000:.1f};desc="{count} queries"')
+    return response
+
+
+def init_query_stats(app):
+    """
+    Count SQL statements and time spent in the database per request.
+
+    The counts feed the metrics endpoint; in debug mode (or with
+    QUERY_STATS_HEADERS set) they are also sent as X-DB-Query-Count,
+    X-DB-Query-Time-ms and Server-Timing response headers.
+    """
+    if not event.contains(Engine, 'before_cursor_execute', _before_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_execute)
+    app.after_request(_add_headers)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    Fail if the block runs more than `limit` SQL statements.
+
+    Meant for checks around test-client calls, e.g.
+
+        with assert_max_queries(4):
+            client.get('/dashboard')
+
+    (tests/test_query_budgets.py). Streamed responses run their queries
+    while the body is read, so read it inside the block.
+
+    Raises:
+        AssertionError listing the statements when the limit is exceeded
+    """
+    statements = []
+    stack = _recorders.__dict__.setdefault('stack', [])
+    stack.append(statements)
+    try:
+        yield statements
+    finally:
+        stack.remove(statements)
+
+    if len(statements) > limit:
+        listing = '\n'.join(f'  {elapsed * 1000:7.2f} ms  {" ".join(sql.split())[:200]}'
+                            for sql, elapsed in statements)
+        raise AssertionError(f'Expected at most {limit} queries, ran {len(statements)}:\n{listing}')
@@ -0,0 +1,237 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+
+from sqlalchemy import distinct, func
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import db
+from models import User, FoodEntry, WaterIntake, NutritionRollup, DirtyDay
+from analytics import aggregate_buckets, bucket_expression, bucket_start, bucket_end
+
+PERIODS = ('week', 'month')
+
+# Users rebuilt per transaction by rebuild_rollups
+REBUILD_BATCH_SIZE = 500
+
+# Stay well below SQLite's bound-parameter limit in IN () clauses
+IN_CLAUSE_CHUNK = 500
+
+
+def mark_dirty(user_id, *days):
+    """
+    Queue days whose entries changed for the next rollup refresh.
+
+    The rows are added to the caller's transaction, so they commit or roll
+    back together with the change that made the days dirty.
+    """
+    rows = [{'user_id': user_id, 'date': day} for day in set(days)]
+    if rows:
+        db.session.execute(sqlite_insert(DirtyDay.__table__).on_conflict_do_nothing(), rows)
+
+
+def _upsert(rows):
+    stmt = sqlite_insert(NutritionRollup.__table__)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'period', 'period_start'],
+        set_={
+            'calories': stmt.excluded.calories,
+            'protein': stmt.excluded.protein,
+            'carbs': stmt.excluded.carbs,
+            'fat': stmt.excluded.fat,
+            'food_days': stmt.excluded.food_days,
+            'water': stmt.excluded.water,
+            'water_days': stmt.excluded.water_days,
+            'updated_at': datetime.utcnow()
+        }
+    )
+    db.session.execute(stmt, rows)
+
+
+def _rollup_row(user_id, period, period_start, values):
+    calories, protein, carbs, fat, food_days, water, water_days = values
+    return {
+        'user_id': user_id,
+        'period': period,
+        'period_start': period_start,
+        'calories': calories,
+        'protein': protein,
+        'carbs': carbs,
+        'fat': fat,
+        'food_days': food_days,
+        'water': water,
+        'water_days': water_days
+    }
+
+
+def refresh_user_rollups(user_id, days):
+    """Recompute the week and month rollups that contain any of the given days"""
+    rows = []
+    for period in PERIODS:
+        starts = sorted({bucket_start(day, period) for day in days})
+        totals = aggregate_buckets(user_id, starts[0], bucket_end(starts[-1], period), period)
+
+        empty = []
+        for period_start in starts:
+            values = totals.get(period_start.isoformat())
+            if values:
+                rows.append(_rollup_row(user_id, period, period_start, values))
+            else:
+                empty.append(period_start)
+
+        if empty:
+            NutritionRollup.query.filter(
+                NutritionRollup.user_id == user_id,
+                NutritionRollup.period == period,
+                NutritionRollup.period_start.in_(empty)
+            ).delete(synchronize_session=False)
+
+    if rows:
+        _upsert(rows)
+
+
+def refresh_rollups(user_id=None):
+    """
+    Drain the dirty-day queue, for one user or for everyone.
+
+    Each user is refreshed in its own transaction. The queue rows are
+    deleted before the totals are re-read, so a day marked dirty while the
+    refresh runs is either included or stays queued for the next one.
+
+    Returns:
+        Number of dirty days processed
+    """
+    if user_id is not None:
+        user_ids = [user_id]
+    else:
+        user_ids = [row[0] for row in db.session.query(DirtyDay.user_id).distinct().all()]
+
+    processed = 0
+    for uid in user_ids:
+        dirty = DirtyDay.query.with_entities(DirtyDay.id, DirtyDay.date).filter_by(user_id=uid).all()
+        if not dirty:
+            continue
+
+        ids = [row.id for row in dirty]
+        for i in range(0, len(ids), IN_CLAUSE_CHUNK):
+            DirtyDay.query.filter(DirtyDay.id.in_(ids[i:i + IN_CLAUSE_CHUNK])).delete(synchronize_session=False)
+
+        refresh_user_rollups(uid, [row.date for row in dirty])
+        db.session.commit()
+        processed += len(dirty)
+
+    return processed
+
+
+def _aggregate_users(user_ids, period):
+    """Per-user, per-period totals for a batch of users, grouped in SQL"""
+    totals = defaultdict(lambda: [0, 0, 0, 0, 0, 0, 0])
+
+    food_bucket = bucket_expression(FoodEntry.date, period)
+    food_rows = db.session.query(
+        FoodEntry.user_id,
+        food_bucket,
+        func.sum(FoodEntry.calories),
+        func.sum(FoodEntry.protein),
+        func.sum(FoodEntry.carbs),
+        func.sum(FoodEntry.fat),
+        func.count(distinct(FoodEntry.date))
+    ).filter(FoodEntry.user_id.in_(user_ids)).group_by(FoodEntry.user_id, food_bucket)
+
+    for user_id, label, calories, protein, carbs, fat, food_days in food_rows:
+        totals[(user_id, label)][:5] = [calories or 0, protein or 0, carbs or 0, fat or 0, food_days]
+
+    water_bucket = bucket_expression(WaterIntake.date, period)
+    water_rows = db.session.query(
+        WaterIntake.user_id,
+        water_bucket,
+        func.sum(WaterIntake.amount),
+        func.count(distinct(WaterIntake.date))
+    ).filter(
+        WaterIntake.user_id.in_(user_ids),
+        WaterIntake.amount > 0
+    ).group_by(WaterIntake.user_id, water_bucket)
+
+    for user_id, label, water, water_days in water_rows:
+        totals[(user_id, label)][5:] = [water or 0, water_days]
+
+    return totals
+
+
+def rebuild_rollups(progress=None):
+    """
+    Recompute every rollup from the entry tables.
+
+    Users are processed in batches, each batch replacing its rollups and
+    clearing its dirty days in one transaction.
+
+    Returns:
+        Number of rollup rows written
+    """
+    written = 0
+    user_ids = [row[0] for row in db.session.query(User.id).order_by(User.id).all()]
+
+    for i in range(0, len(user_ids), REBUILD_BATCH_SIZE):
+        batch = user_ids[i:i + REBUILD_BATCH_SIZE]
+
+        DirtyDay.query.filter(DirtyDay.user_id.in_(batch)).delete(synchronize_session=False)
+        NutritionRollup.query.filter(NutritionRollup.user_id.in_(batch)).delete(synchronize_session=False)
+
+        rows = []
+        for period in PERIODS:
+            for (user_id, label), values in _aggregate_users(batch, period).items():
+                period_start = datetime.strptime(label, '%Y-%m-%d').date()
+                rows.append(_rollup_row(user_id, period, period_start, values))
+
+        if rows:
+            _upsert(rows)
+        db.session.commit()
+
+        written += len(rows)
+        if progress:
+            progress(i + len(batch), len(user_ids), written)
+
+    return written
+
+
+def aggregate_with_rollups(user_id, start, end, bucket):
+    """
+    Per-bucket totals for a week or month range, read from the rollups.
+
+    Pending dirty days for the user are refreshed first. Whole periods in
+    the range come from the rollup table; partial periods at either edge
+    are aggregated from the entry tables so they only count days in range.
+
+    Returns:
+        Dictionary in the same shape as analytics.aggregate_buckets
+    """
+    refresh_rollups(user_id)
+
+    # First and last dates of the whole periods inside the range
+    first_period = bucket_start(start, bucket)
+    first_full = start if first_period == start else bucket_end(first_period, bucket) + timedelta(days=1)
+    last_period = bucket_start(end, bucket)
+    last_full = end if bucket_end(last_period, bucket) == end else last_period - timedelta(days=1)
+
+    if first_full > last_full:
+        return aggregate_buckets(user_id, start, end, bucket)
+
+    totals = {}
+    rollups = NutritionRollup.query.filter(
+        NutritionRollup.user_id == user_id,
+        NutritionRollup.period == bucket,
+        NutritionRollup.period_start >= first_full,
+        NutritionRollup.period_start <= last_full
+    ).all()
+
+    for rollup in rollups:
+        totals[rollup.period_start.isoformat()] = [
+            rollup.calories, rollup.protein, rollup.carbs, rollup.fat,
+            rollup.food_days, rollup.water, rollup.water_days
+        ]
+
+    if start < first_full:
+        totals.update(aggregate_buckets(user_id, start, first_full - timedelta(days=1), bucket))
+    if last_full < end:
+        totals.update(aggregate_buckets(user_id, last_full + timedelta(days=1), end, bucket))
+
+    return totals
@@ -0,0 +1,123 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from flask import current_app
+
+# Share of writes that also purge expired keys
+_PURGE_PROBABILITY = 0.01
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL)',
+    'CREATE TABLE IF NOT EXISTS token_bucket (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)'
+)
+
+
+class SharedStore:
+    """
+    Small key-value store and token buckets shared by all worker processes.
+
+    Backed by its own SQLite file in WAL mode, separate from the app
+    database so rate-limit writes never wait on the app's write lock.
+    Each thread of each process gets its own connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # Connections must not cross a fork, so they are keyed by pid as well
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key):
+        """Stored value for key, or None if missing or expired"""
+        row = self._connection().execute(
+            'SELECT value FROM kv WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)', (key, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, value, ttl=None):
+        """Store a JSON-serializable value, optionally expiring after ttl seconds"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute(
+            'INSERT INTO kv (key, value, expires_at) VALUES (?, ?, ?) '
+            'ON CONFLICT(key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at',
+            (key, json.dumps(value), now + ttl if ttl else None)
+        )
+        if random.random() < _PURGE_PROBABILITY:
+            conn.execute('DELETE FROM kv WHERE expires_at <= ?', (now,))
+
+    def delete(self, key):
+        self._connection().execute('DELETE FROM kv WHERE key = ?', (key,))
+
+    def take_tokens(self, buckets, cost=1.0):
+        """
+        Take `cost` tokens from every bucket, or from none of them.
+
+        Buckets refill continuously at their rate up to their capacity. The
+        check and the update run in one IMMEDIATE transaction, so concurrent
+        workers can never overspend a bucket.
+
+        Args:
+            buckets: List of (key, refill rate per second, capacity) tuples
+            cost: Tokens needed from each bucket
+
+        Returns:
+            A tuple of (allowed, seconds until the request would be allowed)
+        """
+        now = time.time()
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            levels = []
+            wait = 0.0
+            for key, rate, capacity in buckets:
+                row = conn.execute('SELECT tokens, updated_at FROM token_bucket WHERE key = ?', (key,)).fetchone()
+                tokens = capacity if row is None else min(capacity, row[0] + max(now - row[1], 0) * rate)
+                if tokens < cost:
+                    wait = max(wait, (cost - tokens) / rate)
+                levels.append((key, tokens - cost, now))
+
+            # A refused request leaves the buckets untouched
+            if not wait:
+                conn.executemany(
+                    'INSERT INTO token_bucket (key, tokens, updated_at) VALUES (?, ?, ?) '
+                    'ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at',
+                    levels
+                )
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        return not wait, wait
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store():
+    """The shared store for the current app (SHARED_STORE_PATH, by default in the instance folder)"""
+    path = current_app.config.get('SHARED_STORE_PATH') or os.path.join(current_app.instance_path, 'shared_store.db')
+    store = _stores.get(path)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(path)
+            if store is None:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                store = _stores[path] = SharedStore(path)
+    return store
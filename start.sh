@@ -5,7 +5,8 @@ echo ""
 # Activate virtual environment
 source venv/bin/activate
 
-# Run the Flask application
+# Create or update the database schema, then run the Flask application
+flask --app app init-db
 python app.py
 
 # If the application exits, keep the terminal open
@@ -2,15 +2,11 @@
  * Analytics Charts
  * Uses Chart.js to create responsive, interactive nutrition data visualizations
  */
+const charts = {};
+
 document.addEventListener('DOMContentLoaded', function() {
-    // Sample data - this would be replaced with actual API data in production
-    const nutritionData = {
-        calories: [2200, 2000, 1950, 2100, 2300, 1800, 2050],
-        dates: ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun'],
-        macronutrients: { protein: 120, carbs: 250, fat: 70 },
-        water: [2.5, 3, 2.2, 2.8, 3.1, 2.7, 3.2],
-        weight: [75.2, 75.0, 74.8, 74.9, 74.5, 74.3, 74.1]
-    };
+    const layout = document.querySelector('.analytics-layout');
+    if (!layout) return;
 
     // Get chart contexts
     const calorieChartCtx = document.getElementById('calorieChart').getContext('2d');
@@ -32,22 +28,28 @@ document.addEventListener('DOMContentLoaded', function() {
         textColor: '#6c757d'
     };
 
-    // Initialize charts when elements exist
-    if (calorieChartCtx) {
-        initCalorieChart(calorieChartCtx, nutritionData);
-    }
-    
-    if (macroChartCtx) {
-        initMacronutrientChart(macroChartCtx, nutritionData);
-    }
-    
-    if (waterChartCtx) {
-        initWaterChart(waterChartCtx, nutritionData);
-    }
-    
-    if (weightChartCtx) {
-        initWeightChart(weightChartCtx, nutritionData);
-    }
+    fetchNutritionData('7days').then(nutritionData => {
+        updateInsights(nutritionData.insights);
+
+        // Initialize charts when elements exist
+        if (calorieChartCtx) {
+            charts.calories = initCalorieChart(calorieChartCtx, nutritionData);
+        }
+
+        if (macroChartCtx) {
+            charts.macronutrients = initMacronutrientChart(macroChartCtx, nutritionData);
+        }
+
+        if (waterChartCtx) {
+            charts.water = initWaterChart(waterChartCtx, nutritionData);
+        }
+
+        if (weightChartCtx) {
+            charts.weight = initWeightChart(weightChartCtx, nutritionData);
+        }
+    }).catch(error => {
+        console.error('Error loading analytics data:', error);
+    });
 
     // Add fade-in animations to chart containers
     document.querySelectorAll('.chart-container').forEach(chartEl => {
@@ -58,11 +60,86 @@ document.addEventListener('DOMContentLoaded', function() {
     initDateRangeButtons();
 });
 
+/**
+ * Fetch chart data for a date range button value (e.g. "30days") from the analytics API
+ * and shape it the way the chart initializers expect
+ */
+function fetchNutritionData(range) {
+    const layout = document.querySelector('.analytics-layout');
+    const days = parseInt(range, 10) || 7;
+
+    // Ask for roughly one point per 4px of chart width; long ranges are downsampled server-side
+    const canvas = document.getElementById('calorieChart');
+    const points = Math.max(30, Math.floor((canvas ? canvas.clientWidth : 600) / 4));
+    const url = `${layout.dataset.apiUrl}?days=${days}&points=${points}`;
+
+    // Weigh-ins are sparse, so the weight chart has its own endpoint and labels
+    const weightUrl = `${layout.dataset.weightApiUrl}?days=${days}&points=${points}`;
+
+    return Promise.all([fetchJson(url), fetchJson(weightUrl)])
+        .then(([data, weight]) => ({
+            dates: data.labels.map(label => formatBucketLabel(label, data.bucket)),
+            calories: data.calories,
+            macronutrients: data.macronutrients,
+            water: data.water.map(ml => Math.round(ml / 100) / 10),  // ml -> liters
+            weightDates: weight.labels.map(label => formatBucketLabel(label, 'day')),
+            weight: weight.weight,
+            weightTrend: weight.trend,
+            insights: data.insights
+        }));
+}
+
+function fetchJson(url) {
+    return fetch(url, { credentials: 'same-origin' })
+        .then(response => {
+            if (!response.ok) throw new Error(`Analytics request failed: ${response.status}`);
+            return response.json();
+        });
+}
+
+/**
+ * Fill the Nutrition Insights cards from the API summary
+ */
+function updateInsights(insights) {
+    if (!insights) return;
+
+    const setText = (id, text) => {
+        const el = document.getElementById(id);
+        if (el) el.textContent = text;
+    };
+
+    setText('insight-calories', insights.avg_calories.toLocaleString());
+    setText('insight-calories-change', insights.calorie_change === null
+        ? `${insights.calorie_adherence}% of days on target`
+        : `${insights.calorie_change > 0 ? '+' : ''}${insights.calorie_change}% from previous period`);
+
+    setText('insight-protein', `${insights.avg_protein}g`);
+    setText('insight-protein-goal', insights.protein_goal_pct === null ? '' : `${insights.protein_goal_pct}% of goal`);
+
+    setText('insight-water', `${insights.water_consistency}%`);
+    setText('insight-water-days', `${insights.water_days_on_goal} days at or above goal`);
+
+    const food = insights.most_tracked_food;
+    setText('insight-food', food ? food.name : 'No entries');
+    setText('insight-food-count', food ? `${food.entries} entries in this period` : '');
+}
+
+/**
+ * Turn an ISO bucket start date into a short axis label
+ */
+function formatBucketLabel(label, bucket) {
+    const date = new Date(label + 'T00:00:00');
+    if (bucket === 'month') {
+        return date.toLocaleDateString(undefined, { month: 'short', year: 'numeric' });
+    }
+    return date.toLocaleDateString(undefined, { month: 'short', day: 'numeric' });
+}
+
 /**
  * Initialize Daily Calorie Chart
  */
 function initCalorieChart(ctx, data) {
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'bar',
         data: {
             labels: data.dates,
@@ -136,9 +213,8 @@ function initCalorieChart(ctx, data) {
  */
 function initMacronutrientChart(ctx, data) {
     const macros = data.macronutrients;
-    const total = macros.protein + macros.carbs + macros.fat;
     
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'doughnut',
         data: {
             labels: ['Protein', 'Carbs', 'Fat'],
@@ -184,6 +260,7 @@ function initMacronutrientChart(ctx, data) {
                     callbacks: {
                         label: function(context) {
                             const value = context.raw;
+                            const total = context.dataset.data.reduce((sum, v) => sum + v, 0) || 1;
                             const percentage = Math.round((value / total) * 100);
                             return `${context.label}: ${value}g (${percentage}%)`;
                         }
@@ -204,7 +281,7 @@ function initMacronutrientChart(ctx, data) {
  * Initialize Water Intake Chart (Area Chart)
  */
 function initWaterChart(ctx, data) {
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'line',
         data: {
             labels: data.dates,
@@ -278,20 +355,28 @@ function initWaterChart(ctx, data) {
  * Initialize Weight Progress Chart
  */
 function initWeightChart(ctx, data) {
-    new Chart(ctx, {
+    return new Chart(ctx, {
         type: 'line',
         data: {
-            labels: data.dates,
+            labels: data.weightDates,
             datasets: [{
                 label: 'Weight (kg)',
                 data: data.weight,
                 backgroundColor: 'rgba(74, 74, 74, 0.1)',
                 borderColor: 'rgba(74, 74, 74, 1)',
-                borderWidth: 2,
+                borderWidth: 0,
                 pointBackgroundColor: 'rgba(74, 74, 74, 1)',
                 pointBorderColor: '#fff',
                 pointRadius: 4,
                 pointHoverRadius: 6,
+                showLine: false
+            }, {
+                label: 'Trend (kg)',
+                data: data.weightTrend,
+                borderColor: '#9C27B0',
+                borderWidth: 2,
+                pointRadius: 0,
+                pointHoverRadius: 4,
                 fill: false,
                 tension: 0.2
             }]
@@ -361,28 +446,45 @@ function initDateRangeButtons() {
             // Add active class to clicked button
             this.classList.add('active');
             
-            // In a real app, this would trigger data reload for the selected time period
+            // Reload chart data for the selected time period
             const range = this.dataset.range;
-            console.log('Selected range:', range);
-            
-            // Here you would call a function to update chart data
-            // updateChartsForDateRange(range);
+            updateChartsForDateRange(range);
         });
     });
 }
 
 /**
  * Update all charts with new data for the selected date range
- * This would fetch from the backend API in a real implementation
  */
 function updateChartsForDateRange(range) {
-    // Sample implementation placeholder
-    // In a real app, this would make an API call to get data for the selected range
-    console.log(`Updating charts for ${range} range`);
-    
-    // Here you would:
-    // 1. Show loading state
-    // 2. Fetch data from backend
-    // 3. Update each chart with new data
-    // 4. Remove loading state
-} 
\ No newline at end of file
+    fetchNutritionData(range).then(data => {
+        updateInsights(data.insights);
+
+        if (charts.calories) {
+            charts.calories.data.labels = data.dates;
+            charts.calories.data.datasets[0].data = data.calories;
+            charts.calories.update();
+        }
+
+        if (charts.macronutrients) {
+            const macros = data.macronutrients;
+            charts.macronutrients.data.datasets[0].data = [macros.protein, macros.carbs, macros.fat];
+            charts.macronutrients.update();
+        }
+
+        if (charts.water) {
+            charts.water.data.labels = data.dates;
+            charts.water.data.datasets[0].data = data.water;
+            charts.water.update();
+        }
+
+        if (charts.weight) {
+            charts.weight.data.labels = data.weightDates;
+            charts.weight.data.datasets[0].data = data.weight;
+            charts.weight.data.datasets[1].data = data.weightTrend;
+            charts.weight.update();
+        }
+    }).catch(error => {
+        console.error(`Error updating charts for ${range} range:`, error);
+    });
+}
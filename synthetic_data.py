@@ -0,0 +1,194 @@
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import numpy as np
+from sqlalchemy import func, select
+from werkzeug.security import generate_password_hash
+
+from database import db
+from models import User
+
+# Users generated and committed per transaction
+DEFAULT_BATCH_USERS = 500
+
+# Every synthetic user gets this password (hashed once; hashing per user would dominate the run)
+SYNTHETIC_PASSWORD = 'synthetic'
+
+EMAIL_TEMPLATE = 'synthetic-{}@example.com'
+
+# name and protein/carbs/fat in grams per kcal; portion sizes follow the day's calorie total
+FOODS = (
+    ('Oatmeal with berries', 0.034, 0.170, 0.018),
+    ('Scrambled eggs', 0.066, 0.010, 0.071),
+    ('Greek yogurt', 0.100, 0.060, 0.027),
+    ('Chicken breast with rice', 0.085, 0.110, 0.012),
+    ('Salmon with potatoes', 0.060, 0.075, 0.040),
+    ('Beef burrito', 0.045, 0.110, 0.037),
+    ('Pasta bolognese', 0.040, 0.130, 0.030),
+    ('Lentil curry', 0.050, 0.140, 0.025),
+    ('Caesar salad', 0.050, 0.040, 0.070),
+    ('Tuna sandwich', 0.070, 0.100, 0.030),
+    ('Banana', 0.012, 0.260, 0.003),
+    ('Apple', 0.005, 0.260, 0.003),
+    ('Protein shake', 0.140, 0.050, 0.017),
+    ('Mixed nuts', 0.035, 0.030, 0.085),
+    ('Pizza slice', 0.043, 0.125, 0.036),
+    ('Chocolate bar', 0.013, 0.110, 0.057)
+)
+
+# Meal slots in the order of the day, with the hour an entry is logged and its share of the day
+MEALS = (('breakfast', 8, 0.25), ('lunch', 13, 0.35), ('dinner', 19, 0.32), ('snack', 16, 0.08))
+
+ACTIVITY_LEVELS = ('sedentary', 'light', 'moderate', 'active', 'very_active')
+ACTIVITY_WEIGHTS = (0.25, 0.3, 0.3, 0.1, 0.05)
+GOALS = ('lose_weight', 'maintain', 'gain_muscle')
+GOAL_WEIGHTS = (0.5, 0.3, 0.2)
+# Daily weight change (kg) a user drifts by, by goal
+GOAL_DRIFT = {'lose_weight': -0.03, 'maintain': 0.0, 'gain_muscle': 0.015}
+
+# Columns written per table, in insert order (parents first)
+COLUMNS = {
+    'user': ('id', 'email', 'password_hash', 'created_at'),
+    'user_profile': ('user_id', 'name', 'age', 'weight', 'height', 'gender', 'activity_level', 'goal',
+                     'daily_calorie_goal', 'daily_protein_goal', 'daily_carbs_goal', 'daily_fat_goal',
+                     'daily_water_goal', 'is_profile_complete', 'created_at', 'updated_at'),
+    'food_entry': ('user_id', 'name', 'calories', 'protein', 'carbs', 'fat', 'date', 'meal_type', 'created_at'),
+    'water_intake': ('user_id', 'amount', 'date', 'created_at', 'updated_at'),
+    'weight_log': ('user_id', 'date', 'weight', 'updated_at')
+}
+
+
+def _profile(rng, user_id, created_at):
+    gender = 'female' if rng.random() < 0.5 else 'male'
+    height = float(np.round(rng.normal(165 if gender == 'female' else 178, 7), 1))
+    weight = float(np.round(rng.normal(26, 4) * (height / 100) ** 2, 1))
+    fields = {
+        'name': f'Synthetic User {user_id}',
+        'age': int(rng.integers(18, 71)),
+        'weight': weight,
+        'height': height,
+        'gender': gender,
+        'activity_level': str(rng.choice(ACTIVITY_LEVELS, p=ACTIVITY_WEIGHTS)),
+        'goal': str(rng.choice(GOALS, p=GOAL_WEIGHTS))
+    }
+
+    from together_ai import get_default_needs
+    needs = get_default_needs(SimpleNamespace(**fields))
+    fields.update({key: needs[key] for key in ('daily_calorie_goal', 'daily_protein_goal', 'daily_carbs_goal',
+                                                'daily_fat_goal', 'daily_water_goal')})
+    fields.update({'user_id': user_id, 'is_profile_complete': True, 'created_at': created_at,
+                   'updated_at': created_at})
+    return fields
+
+
+def _stamp(day, hour):
+    # SQLAlchemy's SQLite DateTime storage format
+    return f'{day} {hour:02d}:00:00.000000'
+
+
+def _user_rows(rng, user_id, days, profile):
+    """Food, water and weight rows (tuples in COLUMNS order) for one user over the given ISO days"""
+    goal = profile['daily_calorie_goal']
+    # Each user has their own logging habit and tendency to over- or undershoot
+    logging_rate = rng.beta(5, 2)
+    bias = rng.normal(0, 0.1)
+
+    food = []
+    logged = rng.random(len(days)) < logging_rate
+    day_totals = goal * np.clip(rng.normal(1 + bias, 0.15, len(days)), 0.3, 2.5)
+    snack = rng.random(len(days)) < 0.4
+    picks = rng.integers(0, len(FOODS), (len(days), len(MEALS)))
+    noise = rng.normal(1, 0.1, (len(days), len(MEALS)))
+
+    for i in np.flatnonzero(logged):
+        day = days[i]
+        for slot, (meal_type, hour, share) in enumerate(MEALS):
+            if meal_type == 'snack' and not snack[i]:
+                continue
+            name, protein, carbs, fat = FOODS[picks[i, slot]]
+            calories = max(int(day_totals[i] * share * noise[i, slot]), 10)
+            food.append((user_id, name, calories, round(calories * protein, 1), round(calories * carbs, 1),
+                         round(calories * fat, 1), day, meal_type, _stamp(day, hour)))
+
+    water_goal = profile['daily_water_goal']
+    water_logged = rng.random(len(days)) < logging_rate
+    amounts = np.clip(np.round(rng.normal(water_goal * 0.9, 400, len(days)) / 50) * 50, 250, 5000)
+    water = [(user_id, int(amounts[i]), days[i], _stamp(days[i], 9), _stamp(days[i], 21))
+             for i in np.flatnonzero(water_logged)]
+
+    # Roughly weekly weigh-ins around a goal-dependent drift, ending at the profile weight
+    drift = GOAL_DRIFT[profile['goal']]
+    weigh_days = np.flatnonzero(rng.random(len(days)) < 0.15)
+    weights = profile['weight'] - drift * (len(days) - 1 - weigh_days) + rng.normal(0, 0.4, len(weigh_days))
+    weight = [(user_id, days[i], round(float(w), 1), _stamp(days[i], 7)) for i, w in zip(weigh_days, weights)]
+    return food, water, weight
+
+
+def _insert_sql(table):
+    columns = COLUMNS[table]
+    return f'INSERT INTO "{table}" ({", ".join(columns)}) VALUES ({", ".join("?" * len(columns))})'
+
+
+def generate_dataset(users, days, end=None, seed=0, batch_users=DEFAULT_BATCH_USERS, progress=None):
+    """
+    Add synthetic users with complete profiles and `days` days of history.
+
+    Food entries (three or four meals on the days a user logs), daily water
+    and roughly weekly weigh-ins are drawn per user around goals from the
+    formula estimate, with per-user logging habits. Rows are built as tuples
+    already in SQLite's storage format and written with plain executemany
+    (SQLAlchemy's per-row parameter processing would take longer than the
+    inserts), on one connection with synchronous writes off and one
+    transaction per batch of users. Ids continue after the existing users,
+    so repeated runs add to the dataset.
+
+    Rollups are not refreshed; run `flask rebuild-rollups` afterwards.
+
+    Args:
+        users: Number of users to add
+        days: Days of history per user, ending at `end`
+        end: Last day of history (defaults to today)
+        seed: Random seed; the same seed and existing data give the same rows
+        batch_users: Users per transaction
+        progress: Optional callback(users_done, users_total, rows_written)
+
+    Returns:
+        Dictionary of rows written per table
+    """
+    rng = np.random.default_rng(seed)
+    end = end or date.today()
+    history = [(end - timedelta(days=offset)).isoformat() for offset in range(days - 1, -1, -1)]
+    password_hash = generate_password_hash(SYNTHETIC_PASSWORD)
+    created_at = _stamp(history[0], 12)
+    counts = {table: 0 for table in COLUMNS}
+
+    with db.engine.connect() as conn:
+        synchronous = conn.exec_driver_sql('PRAGMA synchronous').scalar()
+        conn.exec_driver_sql('PRAGMA synchronous=OFF')
+        first_id = (conn.execute(select(func.max(User.id))).scalar() or 0) + 1
+        conn.commit()
+        try:
+            for batch_start in range(0, users, batch_users):
+                rows = {table: [] for table in COLUMNS}
+                for user_id in range(first_id + batch_start, first_id + min(users, batch_start + batch_users)):
+                    rows['user'].append((user_id, EMAIL_TEMPLATE.format(user_id), password_hash, created_at))
+                    profile = _profile(rng, user_id, created_at)
+                    rows['user_profile'].append(tuple(profile[column] for column in COLUMNS['user_profile']))
+                    food, water, weight = _user_rows(rng, user_id, history, profile)
+                    rows['food_entry'].extend(food)
+                    rows['water_intake'].extend(water)
+                    rows['weight_log'].extend(weight)
+
+                with conn.begin():
+                    for table, table_rows in rows.items():
+                        if table_rows:
+                            conn.exec_driver_sql(_insert_sql(table), table_rows)
+                        counts[table] += len(table_rows)
+
+                if progress:
+                    progress(min(users, batch_start + batch_users), users, sum(counts.values()))
+        finally:
+            conn.exec_driver_sql(f'PRAGMA synchronous={int(synchronous)}')
+            conn.commit()
+
+    return counts
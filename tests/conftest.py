@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+# The app's modules live at the repository root, next to app.py
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from database import db, create_schema  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """An app on a throwaway SQLite database, with no job worker and no LLM calls"""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'nutrifit.db'),
+        'SHARED_STORE_PATH': str(tmp_path / 'shared_store.db'),
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+        'EXPORT_DIR': str(tmp_path / 'exports'),
+        'JOBS_EMBEDDED_WORKER': False,
+        'LLM_GLOBAL_BURST': 0  # never call the LLM for dashboard recommendations
+    })
+    with app.app_context():
+        create_schema()
+    yield app
+    with app.app_context():
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def login(client, user_id):
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
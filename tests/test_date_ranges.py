@@ -0,0 +1,38 @@
+"""Range validation of the chart APIs: bad ranges get a 400, never a 500 or a huge computation"""
+import pytest
+
+from conftest import login
+from database import db
+from models import User
+
+
+@pytest.fixture
+def user_client(app, client):
+    with app.app_context():
+        user = User(email='ranges@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        login(client, user.id)
+    return client
+
+
+@pytest.mark.parametrize('query', [
+    'days=100000000',
+    'days=3661',
+    'start=2000-01-01&end=2026-01-01&bucket=day',
+    'start=0001-01-01&end=0001-01-05',
+    'end=0001-01-05',
+    'start=2026-02-01&end=2026-01-01',
+    'start=yesterday'
+])
+@pytest.mark.parametrize('path', ['/api/analytics', '/api/weight_trend'])
+def test_rejects_bad_ranges(user_client, path, query):
+    response = user_client.get(f'{path}?{query}')
+    assert response.status_code == 400
+    assert response.get_json()['error']
+
+
+@pytest.mark.parametrize('query', ['days=3660', 'start=1900-01-01&end=1900-01-31', 'days=-5'])
+@pytest.mark.parametrize('path', ['/api/analytics', '/api/weight_trend'])
+def test_accepts_ranges_within_bounds(user_client, path, query):
+    assert user_client.get(f'{path}?{query}').status_code == 200
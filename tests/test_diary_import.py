@@ -0,0 +1,31 @@
+"""Column mapping of the diary import: a mistyped --map field is an error, not a silently dropped column"""
+import pytest
+
+from commands import import_diary_command
+from database import db
+from diary_import import build_column_map
+from models import User
+
+
+def test_override_maps_column_onto_field():
+    column_map = build_column_map(['Day', 'Food'], {'Day': 'date', 'Food': 'name'})
+    assert set(column_map.values()) == {'date', 'name'}
+
+
+def test_unknown_override_field_is_rejected():
+    with pytest.raises(ValueError, match="'nam'"):
+        build_column_map(['Day', 'Food'], {'Food': 'nam'})
+
+
+def test_cli_rejects_unknown_map_field(app, tmp_path):
+    with app.app_context():
+        db.session.add(User(email='diary@example.com', password_hash='x'))
+        db.session.commit()
+    csv_path = tmp_path / 'diary.csv'
+    csv_path.write_text('Day,Food\n2024-01-01,Apple\n')
+
+    result = app.test_cli_runner().invoke(import_diary_command, [
+        str(csv_path), '--email', 'diary@example.com', '--map', 'Food=nam'])
+
+    assert result.exit_code == 2
+    assert "Unknown field 'nam'" in result.output
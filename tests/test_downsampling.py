@@ -0,0 +1,27 @@
+"""downsample_series never returns more points than asked for"""
+import numpy as np
+import pytest
+
+from analytics import downsample_series, SERIES_FIELDS
+
+
+def series(length, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {'labels': [f'day {i}' for i in range(length)]}
+    for field in SERIES_FIELDS:
+        data[field] = rng.uniform(0, 3000, length).round().tolist()
+    return data
+
+
+@pytest.mark.parametrize('points', range(3, 13))
+@pytest.mark.parametrize('seed', range(5))
+def test_keeps_at_most_the_requested_points(points, seed):
+    data = downsample_series(series(200, seed), points)
+    assert 3 <= len(data['labels']) <= points
+    assert all(len(data[field]) == len(data['labels']) for field in SERIES_FIELDS)
+    assert data['labels'][0] == 'day 0' and data['labels'][-1] == 'day 199'
+
+
+def test_short_series_is_returned_unchanged():
+    data = series(10)
+    assert 'downsampled' not in downsample_series(data, 10)
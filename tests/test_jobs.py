@@ -0,0 +1,163 @@
+"""Behaviour of the job queue and JobWorker: claiming, retries, stale-job recovery, drain and dedupe"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import jobs
+from database import db
+from models import Job
+
+# Lets a test hold a job in its handler until it says so
+release_blocked = threading.Event()
+
+
+@jobs.job_handler('test_noop')
+def noop_task(run):
+    return {'ok': True}
+
+
+@jobs.job_handler('test_blocking')
+def blocking_task(run):
+    release_blocked.wait(10)
+    return {'ok': True}
+
+
+@pytest.fixture
+def ctx(app):
+    with app.app_context():
+        yield
+        db.session.remove()
+
+
+def job_row(job_id):
+    db.session.expire_all()
+    return db.session.get(Job, job_id)
+
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_job_is_claimed_exactly_once(app, ctx):
+    job_id = jobs.enqueue('test_noop').id
+    claims = []
+    barrier = threading.Barrier(8)
+
+    def claim(worker):
+        with app.app_context():
+            barrier.wait()
+            claims.append(jobs._claim(f'worker-{worker}', ['test_noop']))
+            db.session.remove()
+
+    threads = [threading.Thread(target=claim, args=(i,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    won = [run for run in claims if run is not None]
+    assert [run.id for run in won] == [job_id]
+    assert won[0].attempt == 1
+    assert job_row(job_id).status == 'running'
+
+
+def test_failed_job_is_retried_after_backoff(ctx):
+    job_id = jobs.enqueue('test_noop', max_attempts=2).id
+    run = jobs._claim('worker-a', ['test_noop'])
+    jobs._complete(run, 'worker-a', error='RuntimeError: boom')
+
+    job = job_row(job_id)
+    assert job.status == 'queued'
+    assert job.error == 'RuntimeError: boom'
+    assert job.run_after > datetime.utcnow()
+    # Not due yet
+    assert jobs._claim('worker-a', ['test_noop']) is None
+
+    job.run_after = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    retry = jobs._claim('worker-b', ['test_noop'])
+    assert (retry.id, retry.attempt) == (job_id, 2)
+
+    # The last attempt failing fails the job for good
+    jobs._complete(retry, 'worker-b', error='RuntimeError: boom again')
+    job = job_row(job_id)
+    assert job.status == 'failed'
+    assert job.finished_at is not None
+
+
+def test_job_with_stopped_heartbeat_is_queued_again(ctx):
+    job_id = jobs.enqueue('test_noop').id
+    out_of_attempts_id = jobs.enqueue('test_noop', max_attempts=1).id
+    jobs._claim('dead-worker', ['test_noop'])
+    jobs._claim('dead-worker', ['test_noop'])
+
+    stale = datetime.utcnow() - timedelta(seconds=jobs.STALE_AFTER + 1)
+    Job.query.update({'heartbeat_at': stale})
+    db.session.commit()
+
+    assert jobs.requeue_stale_jobs() == 1
+    job = job_row(job_id)
+    assert (job.status, job.worker, job.attempts) == ('queued', None, 1)
+    assert job_row(out_of_attempts_id).status == 'failed'
+
+    # The dead worker finishing late does not overwrite the new state
+    jobs._complete(jobs.JobRun(job_id, 'test_noop', {}, 0, 1, 3), 'dead-worker', result={'late': True})
+    assert job_row(job_id).status == 'queued'
+
+
+def test_drain_returns_unfinished_jobs_without_spending_an_attempt(app, ctx):
+    release_blocked.clear()
+    job_id = jobs.enqueue('test_blocking').id
+    worker = jobs.JobWorker(app, threads=1, poll_interval=0.05).start()
+    try:
+        assert wait_for(lambda: job_row(job_id).status == 'running')
+        worker.stop(timeout=0.1)
+    finally:
+        release_blocked.set()
+
+    job = job_row(job_id)
+    assert (job.status, job.worker, job.attempts) == ('queued', None, 0)
+    # The handler finishing after the drain does not mark the requeued job done
+    time.sleep(0.1)
+    assert job_row(job_id).status == 'queued'
+
+
+def test_worker_runs_a_job_to_completion(app, ctx):
+    job_id = jobs.enqueue('test_noop').id
+    worker = jobs.JobWorker(app, threads=1, poll_interval=0.05).start()
+    try:
+        assert wait_for(lambda: job_row(job_id).status == 'succeeded')
+    finally:
+        worker.stop(timeout=1)
+    assert jobs.job_status(job_row(job_id))['result'] == {'ok': True}
+
+
+def test_duplicate_active_dedupe_key_returns_the_existing_job(ctx, monkeypatch):
+    first = jobs.enqueue('test_noop', dedupe_key='same')
+    assert jobs.enqueue('test_noop', dedupe_key='same').id == first.id
+
+    # Another process inserted between the lookup and the commit: the unique index
+    # rejects the second row and enqueue returns the one already there
+    lookups = []
+    real_find = jobs.find_active_job
+
+    def find_after_race(key):
+        lookups.append(key)
+        return None if len(lookups) == 1 else real_find(key)
+
+    monkeypatch.setattr(jobs, 'find_active_job', find_after_race)
+    assert jobs.enqueue('test_noop', dedupe_key='same').id == first.id
+    assert len(lookups) == 2
+    assert Job.query.filter_by(dedupe_key='same').count() == 1
+
+    # Once the job is finished the key is free again
+    run = jobs._claim('worker-a', ['test_noop'])
+    jobs._complete(run, 'worker-a', result={})
+    assert jobs.enqueue('test_noop', dedupe_key='same').id != first.id
@@ -0,0 +1,54 @@
+"""Only calls that will reach the LLM API take a rate-limit token"""
+import pytest
+
+import app as app_module
+from conftest import login
+from database import db
+from models import User, UserProfile
+
+
+@pytest.fixture
+def user_client(app, client):
+    with app.app_context():
+        user = User(email='llm@example.com', password_hash='x')
+        db.session.add(user)
+        db.session.commit()
+        db.session.add(UserProfile(user_id=user.id, name='A', age=30, weight=70, height=175, gender='male',
+                                   activity_level='moderate', goal='maintain', is_profile_complete=True))
+        db.session.commit()
+        login(client, user.id)
+    return client
+
+
+@pytest.fixture
+def admissions(monkeypatch):
+    calls = []
+
+    def admit(user_id):
+        calls.append(user_id)
+        return False, 30.0
+
+    monkeypatch.setattr(app_module, 'admit_llm_call', admit)
+    return calls
+
+
+def test_food_analysis_without_api_key_takes_no_token(user_client, admissions, monkeypatch):
+    monkeypatch.setattr('together_ai.TOGETHER_API_KEY', None)
+    response = user_client.post('/analyze_food', data={'food_description': 'zorblax stew'})
+    assert response.status_code == 200
+    assert admissions == []
+
+
+def test_food_analysis_with_api_key_is_rate_limited(user_client, admissions, monkeypatch):
+    monkeypatch.setattr('together_ai.TOGETHER_API_KEY', 'test-key')
+    response = user_client.post('/analyze_food', data={'food_description': 'zorblax stew'})
+    assert response.status_code == 429
+    assert len(admissions) == 1
+
+
+def test_needs_analysis_without_api_key_takes_no_token(user_client, admissions, monkeypatch):
+    monkeypatch.setattr('together_ai.TOGETHER_API_KEY', None)
+    response = user_client.get('/analyze_user_needs')
+    assert response.status_code == 200
+    assert response.get_json()['daily_calorie_goal']
+    assert admissions == []
@@ -0,0 +1,120 @@
+"""Hedger: the adaptive deadline, the hedge budget and what happens when no slot is free"""
+import threading
+import time
+from collections import namedtuple
+
+import pytest
+
+from llm_hedging import Hedger, HedgeBudget, LatencyTracker, HEDGE_MIN_DELAY
+
+Attempt = namedtuple('Attempt', 'hedge ok latency')
+
+KIND = 'analyze_food'
+
+
+def warm_hedger(budget_ratio, latency=0.01):
+    hedger = Hedger(max_workers=4, budget_ratio=budget_ratio)
+    tracker = hedger.tracker(KIND)
+    for _ in range(tracker.min_samples):
+        tracker.record(latency)
+    return hedger
+
+
+def fake_send(primary_seconds, hedge_seconds=0.0, hedge_slot=True, primary_queue=0.0):
+    """A send() whose primary and hedge take the given times; calls are recorded in .calls"""
+    calls = []
+
+    def send(hedge, sending):
+        calls.append(hedge)
+        if hedge and not hedge_slot:
+            return Attempt(hedge, False, None)
+        time.sleep(0 if hedge else primary_queue)
+        sending.set()
+        seconds = hedge_seconds if hedge else primary_seconds
+        time.sleep(seconds)
+        return Attempt(hedge, True, seconds)
+
+    send.calls = calls
+    return send
+
+
+def test_tracker_deadline_needs_samples_and_has_a_floor():
+    tracker = LatencyTracker(min_samples=5)
+    for latency in (0.001, 0.002, 0.003, 0.004):
+        tracker.record(latency)
+    assert tracker.deadline(90) is None
+    tracker.record(0.005)
+    assert tracker.deadline(90) == HEDGE_MIN_DELAY
+    for latency in (1.0, 2.0, 3.0, 4.0, 5.0):
+        tracker.record(latency)
+    assert tracker.deadline(60) == 1.0
+    assert tracker.deadline(90) == 4.0
+
+
+def test_budget_earns_a_share_of_a_hedge_per_call():
+    budget = HedgeBudget(ratio=0.25, burst=10)
+    for _ in range(3):
+        budget.deposit()
+        assert not budget.withdraw()
+    budget.deposit()
+    assert budget.withdraw()
+    assert not budget.withdraw()
+
+
+def test_cold_tracker_never_hedges():
+    hedger = Hedger(max_workers=4, budget_ratio=1.0)
+    send = fake_send(primary_seconds=0.2)
+    attempt, result, _ = hedger.call(KIND, send)
+    assert (result, send.calls) == ('cold', [False])
+
+
+def test_slow_primary_is_hedged_and_the_hedge_wins():
+    hedger = warm_hedger(budget_ratio=1.0)
+    send = fake_send(primary_seconds=1.0, hedge_seconds=0.01)
+    attempt, result, elapsed = hedger.call(KIND, send)
+    assert result == 'hedge_won'
+    assert attempt.hedge and send.calls == [False, True]
+    assert elapsed < 0.5
+
+
+def test_no_hedge_when_the_budget_is_used_up():
+    hedger = warm_hedger(budget_ratio=0.0)
+    send = fake_send(primary_seconds=0.2)
+    attempt, result, _ = hedger.call(KIND, send)
+    assert result == 'no_budget'
+    assert send.calls == [False]
+    assert not attempt.hedge
+
+
+def test_no_slot_for_the_hedge_refunds_the_budget():
+    hedger = warm_hedger(budget_ratio=1.0)
+    send = fake_send(primary_seconds=0.2, hedge_slot=False)
+    attempt, result, _ = hedger.call(KIND, send)
+    assert result == 'no_slot'
+    assert send.calls == [False, True]
+    assert not attempt.hedge
+    # The hedge that could not be sent was given back (one deposit, no spend)
+    assert hedger.budget.withdraw()
+
+
+def test_deadline_starts_once_the_primary_is_sent():
+    # Queueing for a slot longer than the deadline must not trigger a hedge on its own
+    hedger = warm_hedger(budget_ratio=1.0)
+    send = fake_send(primary_seconds=0.01, primary_queue=0.3)
+    attempt, result, elapsed = hedger.call(KIND, send)
+    assert result == 'not_needed'
+    assert send.calls == [False]
+    assert elapsed >= 0.3
+
+
+def test_primary_that_is_never_sent_does_not_hang_the_call():
+    hedger = warm_hedger(budget_ratio=1.0)
+
+    def send(hedge, sending):
+        return Attempt(hedge, False, None)
+
+    done = []
+    caller = threading.Thread(target=lambda: done.append(hedger.call(KIND, send)))
+    caller.start()
+    caller.join(2)
+    assert done and done[0][1] == 'not_needed'
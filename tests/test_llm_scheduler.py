@@ -0,0 +1,84 @@
+"""LLMScheduler: reserved interactive slots and weighted-fair ordering between the classes"""
+import threading
+import time
+
+import pytest
+
+from llm_scheduler import LLMScheduler, QueueTimeout, INTERACTIVE, BACKGROUND
+
+
+def wait_until_waiting(scheduler, count, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while sum(stats['waiting'] for stats in scheduler.stats().values()) < count:
+        assert time.monotonic() < deadline, 'waiters did not queue up'
+        time.sleep(0.005)
+
+
+def test_reserved_slots_are_never_given_to_background_calls():
+    scheduler = LLMScheduler(max_concurrency=4, interactive_reserved=2)
+    scheduler.acquire(BACKGROUND, timeout=0)
+    scheduler.acquire(BACKGROUND, timeout=0)
+
+    # Two slots are free, but both are reserved
+    with pytest.raises(QueueTimeout):
+        scheduler.acquire(BACKGROUND, timeout=0.05)
+    assert scheduler.stats()[BACKGROUND] == {'in_flight': 2, 'waiting': 0}
+
+    scheduler.acquire(INTERACTIVE, timeout=0)
+    scheduler.acquire(INTERACTIVE, timeout=0)
+    with pytest.raises(QueueTimeout):
+        scheduler.acquire(INTERACTIVE, timeout=0.05)
+
+
+def test_waiting_background_call_gets_a_freed_unreserved_slot():
+    scheduler = LLMScheduler(max_concurrency=3, interactive_reserved=1)
+    scheduler.acquire(BACKGROUND, timeout=0)
+    scheduler.acquire(BACKGROUND, timeout=0)
+
+    granted = []
+    waiter = threading.Thread(target=lambda: granted.append(scheduler.acquire(BACKGROUND, timeout=5)))
+    waiter.start()
+    wait_until_waiting(scheduler, 1)
+    # The free reserved slot goes to an interactive call, not the queued background one
+    scheduler.acquire(INTERACTIVE, timeout=0)
+    assert scheduler.stats()[BACKGROUND]['waiting'] == 1
+
+    scheduler.release(BACKGROUND)
+    waiter.join(5)
+    assert granted and scheduler.stats()[BACKGROUND] == {'in_flight': 2, 'waiting': 0}
+
+
+def test_interactive_calls_get_four_slots_for_each_background_one():
+    scheduler = LLMScheduler(max_concurrency=1, interactive_reserved=0)
+    scheduler.acquire(INTERACTIVE, timeout=0)
+
+    order = []
+
+    def call(priority):
+        scheduler.acquire(priority, timeout=5)
+        order.append(priority)
+        scheduler.release(priority)
+
+    threads = [threading.Thread(target=call, args=(priority,))
+               for _ in range(10) for priority in (BACKGROUND, INTERACTIVE)]
+    for thread in threads:
+        thread.start()
+    wait_until_waiting(scheduler, len(threads))
+
+    scheduler.release(INTERACTIVE)
+    for thread in threads:
+        thread.join(5)
+
+    # The holder's grant already advanced the interactive pass, so background goes first;
+    # from then on every background grant is followed by four interactive ones
+    letters = ''.join('i' if priority == INTERACTIVE else 'b' for priority in order)
+    assert letters.startswith('biiiibiiiibii')
+    assert letters.endswith('b' * 7)
+
+
+def test_slot_releases_on_error():
+    scheduler = LLMScheduler(max_concurrency=2, interactive_reserved=0)
+    with pytest.raises(RuntimeError):
+        with scheduler.slot(BACKGROUND):
+            raise RuntimeError('upstream failed')
+    assert scheduler.stats()[BACKGROUND]['in_flight'] == 0
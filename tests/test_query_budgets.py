@@ -0,0 +1,52 @@
+"""
+SQL statements per request for the main read paths.
+
+The budgets are the counts at the time of writing. A view that starts
+loading rows one by one, or a new query per request, fails here before it
+shows up in the load tests; raise a budget only for a deliberate change.
+"""
+from datetime import date
+
+import pytest
+
+from conftest import login
+from database import db
+from models import FoodEntry
+from query_stats import assert_max_queries
+from rollups import rebuild_rollups
+from synthetic_data import generate_dataset
+
+HISTORY_DAYS = 90
+
+
+@pytest.fixture
+def user_id(app):
+    """First of two synthetic users with HISTORY_DAYS days of food, water and weight, rollups built"""
+    with app.app_context():
+        generate_dataset(2, HISTORY_DAYS, seed=0)
+        # Food today, so the dashboard also takes the recommendation path
+        db.session.add(FoodEntry(user_id=1, name='Apple', calories=95, carbs=25, date=date.today()))
+        db.session.commit()
+        rebuild_rollups()
+        db.session.remove()
+    return 1
+
+
+@pytest.mark.parametrize('url, budget', [
+    ('/dashboard', 4),
+    ('/analytics', 1),
+    ('/api/analytics?days=7', 7),
+    ('/api/analytics?days=90', 11),
+    ('/api/analytics?days=365', 9),
+    ('/export?format=csv', 3),
+    ('/export?format=ndjson&gzip=1', 3)
+])
+def test_query_budget(client, user_id, monkeypatch, url, budget):
+    # With a key the dashboard also looks up the recommendation job (LLM_GLOBAL_BURST keeps it from queueing one)
+    monkeypatch.setattr('together_ai.TOGETHER_API_KEY', 'test-key')
+    login(client, user_id)
+    with assert_max_queries(budget):
+        response = client.get(url)
+        # Exports stream their rows; the queries run while the body is read
+        response.get_data()
+    assert response.status_code == 200
@@ -1,14 +1,241 @@
 import os
 import requests
 import json
-from dotenv import load_dotenv
+import logging
+import threading
+import time
+from collections import namedtuple
 
-# Load environment variables
-load_dotenv()
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
 
-# Together AI API configuration
+from llm_hedging import Hedger, DEFAULT_HEDGE_BUDGET, DEFAULT_HEDGE_PERCENTILE
+from llm_scheduler import LLMScheduler, QueueTimeout, current_priority, DEFAULT_MAX_CONCURRENCY, \
+    DEFAULT_INTERACTIVE_RESERVED
+from llm_tracing import record_llm_call, record_unhedged_latency
+
+logger = logging.getLogger('nutrifit.llm')
+
+# Together AI API configuration (.env is loaded by app.py or the flask CLI)
 TOGETHER_API_KEY = os.getenv('TOGETHER_API_KEY')
-API_URL = "https://api.together.xyz/v1/completions"
+# TOGETHER_API_URL points the client at another endpoint, e.g. benchmarks/fake_llm.py
+API_URL = os.getenv('TOGETHER_API_URL', "https://api.together.xyz/v1/completions")
+MODEL = "mistralai/Mistral-7B-Instruct-v0.2"
+
+# (connect, read) timeouts in seconds; a stuck upstream must not hold a worker forever
+API_TIMEOUT = (5, 60)
+
+# Calls in flight per process, and the slots of those that background calls may not take
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', DEFAULT_MAX_CONCURRENCY))
+LLM_INTERACTIVE_RESERVED = int(os.getenv('LLM_INTERACTIVE_RESERVED', DEFAULT_INTERACTIVE_RESERVED))
+
+# Hedging of idempotent calls (see llm_hedging): the latency percentile after which a
+# duplicate request is sent, and the share of calls that may be duplicated (0 turns it off)
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', DEFAULT_HEDGE_PERCENTILE))
+LLM_HEDGE_BUDGET = float(os.getenv('LLM_HEDGE_BUDGET', DEFAULT_HEDGE_BUDGET))
+
+# Result of one completion request. status is None when no response arrived;
+# data is the JSON object found in the text, when one was asked for.
+Completion = namedtuple('Completion', 'status text data error')
+
+# Connect time of the current thread's request, set by the timed connections
+_trace = threading.local()
+
+class _Attempt(namedtuple('_Attempt', 'queue connect sent first_byte done response error')):
+    """One HTTP request for a completion; times are perf_counter() values, None if not reached"""
+
+    @property
+    def latency(self):
+        return self.done - self.sent if self.sent is not None else None
+
+    @property
+    def ok(self):
+        return self.error is None and self.response.status_code == 200
+
+class _TimedHTTPConnection(HTTPConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _trace.connect = time.perf_counter() - started
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    def connect(self):
+        started = time.perf_counter()
+        super().connect()
+        _trace.connect = time.perf_counter() - started
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+class _TimedAdapter(HTTPAdapter):
+    """Adapter whose connections record how long connecting (TCP + TLS) took"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool
+        }
+
+_sessions = {}
+_schedulers = {}
+_hedgers = {}
+
+def _session():
+    # One keep-alive session per process, so calls after the first skip the TLS handshake
+    session = _sessions.get(os.getpid())
+    if session is None:
+        session = requests.Session()
+        # One pooled connection per concurrency slot
+        adapter = _TimedAdapter(pool_maxsize=LLM_MAX_CONCURRENCY)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        _sessions.clear()
+        _sessions[os.getpid()] = session
+    return session
+
+def _scheduler():
+    # Per process, like the session; a lock inherited through fork could be held by a dead thread
+    scheduler = _schedulers.get(os.getpid())
+    if scheduler is None:
+        scheduler = LLMScheduler(LLM_MAX_CONCURRENCY, LLM_INTERACTIVE_RESERVED)
+        _schedulers.clear()
+        _schedulers[os.getpid()] = scheduler
+    return scheduler
+
+def _hedger():
+    hedger = _hedgers.get(os.getpid())
+    if hedger is None:
+        # Primaries and hedges wait for scheduler slots in these threads, so leave room for both
+        hedger = Hedger(4 * LLM_MAX_CONCURRENCY, LLM_HEDGE_BUDGET, LLM_HEDGE_PERCENTILE,
+                        on_primary=record_unhedged_latency)
+        _hedgers.clear()
+        _hedgers[os.getpid()] = hedger
+    return hedger
+
+def _send(data, headers, priority, slot_timeout=None, sending=None):
+    """
+    POST one completion request while holding a scheduler slot; errors are
+    returned, not raised. `sending` (a threading.Event) is set once the slot
+    is held, as the request goes out.
+    """
+    try:
+        with _scheduler().slot(priority, timeout=slot_timeout) as queue:
+            if sending is not None:
+                sending.set()
+            _trace.connect = 0.0
+            sent = time.perf_counter()
+            try:
+                # stream=True returns once the headers are in, before the body is read
+                response = _session().post(API_URL, headers=headers, json=data, timeout=API_TIMEOUT, stream=True)
+                first_byte = time.perf_counter()
+                response.content
+            except requests.RequestException as e:
+                return _Attempt(queue, None, sent, None, time.perf_counter(), None, e)
+            return _Attempt(queue, _trace.connect, sent, first_byte, time.perf_counter(), response, None)
+    except QueueTimeout as e:
+        return _Attempt(None, None, None, None, None, None, e)
+
+def _extract_json(text):
+    """The JSON object in a completion (it may have additional text), or None"""
+    start_idx = text.find('{')
+    end_idx = text.rfind('}') + 1
+    if start_idx >= 0 and end_idx > start_idx:
+        return json.loads(text[start_idx:end_idx])
+    return None
+
+def _post_completion(kind, prompt, max_tokens, temperature, parse_json=False, priority=None, hedge=False):
+    """
+    Request a completion from Together AI and trace the call.
+
+    The call first waits for a slot from the process's LLMScheduler in its
+    priority class. Queue wait, connect, time-to-first-byte and total time,
+    prompt and response size, status and parse outcome are logged and
+    recorded by llm_tracing.
+
+    Args:
+        kind: Name of the call in logs and metrics
+        prompt: Prompt text
+        max_tokens: Completion length limit
+        temperature: Sampling temperature
+        parse_json: Also extract a JSON object from the completion text
+        priority: llm_scheduler priority class; defaults to the current one
+            (interactive in requests, set per job by the job worker)
+        hedge: Send a duplicate request if this one is slow (llm_hedging);
+            only for prompts where any completion is as good as another
+
+    Returns:
+        A Completion; never raises for network or parse errors
+    """
+    data = {
+        "model": MODEL,
+        "prompt": prompt,
+        "max_tokens": max_tokens,
+        "temperature": temperature,
+        "top_p": 0.9
+    }
+    headers = {
+        "Authorization": f"Bearer {TOGETHER_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    priority = priority or current_priority()
+    span = {'kind': kind, 'priority': priority, 'status': None, 'outcome': 'ok', 'queue': None, 'connect': None,
+            'ttfb': None, 'total': None, 'prompt_bytes': len(prompt.encode('utf-8')), 'response_bytes': 0,
+            'max_tokens': max_tokens}
+    status = text = parsed = error = None
+
+    if hedge and LLM_HEDGE_BUDGET > 0:
+        # A hedge only takes a slot that is free right now; it never queues behind other calls
+        attempt, span['hedge'], elapsed = _hedger().call(
+            kind, lambda hedged, sending: _send(data, headers, priority, 0 if hedged else None, sending))
+        span['queue'] = attempt.queue
+        # Timings count from the first request, whichever request answered
+        offset = elapsed - (attempt.queue or 0.0) - (attempt.latency or 0.0)
+    else:
+        attempt = _send(data, headers, priority)
+        span['queue'] = attempt.queue
+        offset = 0.0
+
+    if attempt.latency is not None:
+        span['total'] = attempt.latency + offset
+
+    try:
+        if isinstance(attempt.error, QueueTimeout):
+            span['outcome'] = 'queue_timeout'
+            error = str(attempt.error)
+        elif attempt.error is not None:
+            span['outcome'] = 'connection_error'
+            error = str(attempt.error)
+        else:
+            response = attempt.response
+            span['ttfb'] = attempt.first_byte - attempt.sent + offset
+            span['connect'] = attempt.connect
+            span['response_bytes'] = len(response.content)
+            span['status'] = status = response.status_code
+
+            if status != 200:
+                span['outcome'] = 'http_error'
+            else:
+                result = response.json()
+                span['usage'] = result.get('usage')
+                text = result.get('choices', [{}])[0].get('text', '').strip()
+                if parse_json:
+                    parsed = _extract_json(text)
+                    if parsed is None:
+                        span['outcome'] = 'no_json'
+    except (ValueError, AttributeError, IndexError) as e:
+        # Unreadable response body or a completion whose JSON does not parse
+        span['outcome'] = 'bad_json' if text is not None else 'bad_response'
+        error = str(e)
+
+    if error:
+        span['error'] = error
+    record_llm_call(span)
+    return Completion(status, text, parsed, error)
 
 def get_nutrition_recommendation(user_profile, recent_foods=None):
     """
@@ -19,7 +246,33 @@ def get_nutrition_recommendation(user_profile, recent_foods=None):
         recent_foods: List of recent food entries (optional)
         
     Returns:
-        A recommendation text
+        A recommendation text (or an error message)
+    """
+    completion = _recommendation_completion(user_profile, recent_foods)
+    if completion.status == 200 and completion.text is not None:
+        return completion.text
+    if completion.status is not None:
+        return f"Error getting recommendation: {completion.status}"
+    return f"Error connecting to AI service: {completion.error}"
+
+def get_nutrition_recommendation_with_api(user_profile, recent_foods=None):
+    """
+    Recommendation text from the Together AI API.
+    
+    Returns:
+        The text, or None if the API is not configured or gave no usable answer
+    """
+    if not TOGETHER_API_KEY:
+        return None
+    completion = _recommendation_completion(user_profile, recent_foods)
+    return completion.text if completion.status == 200 and completion.text else None
+
+def recommendation_signature(user_profile, recent_foods=None):
+    """
+    Everything the recommendation prompt is built from, with the same defaults.
+
+    Equal signatures give the same prompt, so a recommendation can be cached
+    under a hash of this tuple; any change to the inputs changes the key.
     """
     # Default parameters if not available
     age = user_profile.age or 30
@@ -27,6 +280,11 @@ def get_nutrition_recommendation(user_profile, recent_foods=None):
     height = user_profile.height or 170
     gender = user_profile.gender or "Not specified"
     goal = user_profile.goal or "maintain weight"
+    foods = tuple((food.name, food.calories, food.protein, food.carbs, food.fat) for food in recent_foods or ())
+    return (age, weight, height, gender, goal) + foods
+
+def _recommendation_completion(user_profile, recent_foods):
+    age, weight, height, gender, goal, *foods = recommendation_signature(user_profile, recent_foods)
     
     # Build prompt
     prompt = f"""
@@ -40,49 +298,25 @@ def get_nutrition_recommendation(user_profile, recent_foods=None):
     Goal: {goal}
     """
     
-    if recent_foods:
+    if foods:
         prompt += "\n\nRecent food intake:\n"
-        for food in recent_foods:
-            prompt += f"- {food.name}: {food.calories} calories, {food.protein}g protein, {food.carbs}g carbs, {food.fat}g fat\n"
+        for name, calories, protein, carbs, fat in foods:
+            prompt += f"- {name}: {calories} calories, {protein}g protein, {carbs}g carbs, {fat}g fat\n"
     
     prompt += "\nProvide a short, personalized recommendation for what they should eat next based on their goals and current nutrition intake. Include specific food suggestions."
     
-    try:
-        # Make API request to Together AI
-        headers = {
-            "Authorization": f"Bearer {TOGETHER_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "mistralai/Mistral-7B-Instruct-v0.2",
-            "prompt": prompt,
-            "max_tokens": 300,
-            "temperature": 0.7,
-            "top_p": 0.9
-        }
-        
-        response = requests.post(API_URL, headers=headers, json=data)
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('choices', [{}])[0].get('text', '').strip()
-        else:
-            return f"Error getting recommendation: {response.status_code}"
-            
-    except Exception as e:
-        return f"Error connecting to AI service: {str(e)}"
+    return _post_completion('recommendation', prompt, max_tokens=300, temperature=0.7)
 
-def analyze_food(food_description):
+def analyze_food_locally(food_description):
     """
-    Analyze a food item to get its nutritional information using Together AI API.
-    If API is unavailable, use a fallback with common food values.
+    Estimate the nutritional information of a food from the local catalog only.
+    Never calls the API, so it is safe to use in batch jobs.
     
     Args:
         food_description: Description of the food
         
     Returns:
-        Dictionary with nutritional values
+        Dictionary with nutritional values (all zero if nothing matched)
     """
     # Fallback nutrition data for common foods
     food_db = {
@@ -218,11 +452,47 @@ def analyze_food(food_description):
                     nutrition["fat"] += round(food_data["fat"] * multiplier, 1)
                     break
     
-    print(f"Final nutrition values: {nutrition}")  # Debug log
+    return nutrition
+
+def has_nutrition(nutrition):
+    """Whether an estimate found anything (the local catalog returns zeros for unknown foods)"""
+    return bool(nutrition["calories"] or nutrition["protein"])
+
+def analyze_food(food_description):
+    """
+    Analyze a food item to get its nutritional information using Together AI API.
+    If API is unavailable, use a fallback with common food values.
+    
+    Args:
+        food_description: Description of the food
+        
+    Returns:
+        Dictionary with nutritional values
+    """
+    # Try to analyze food locally first
+    nutrition = analyze_food_locally(food_description)
+    
+    logger.debug('Local nutrition estimate for %r: %s', food_description, nutrition)
     
     # Only use Together AI if our local database didn't find anything or values are zero
-    if nutrition["calories"] == 0 and nutrition["protein"] == 0 and TOGETHER_API_KEY:
-        prompt = f"""
+    if not has_nutrition(nutrition):
+        return analyze_food_with_api(food_description) or nutrition
+    
+    # If we calculated some nutritional values, return them
+    return nutrition
+
+def analyze_food_with_api(food_description):
+    """
+    Estimate a food's nutrition with the Together AI API.
+    
+    Returns:
+        Dictionary with nutritional values, or None if the API is not
+        configured or gave no usable answer
+    """
+    if not TOGETHER_API_KEY:
+        return None
+    
+    prompt = f"""
         You are a nutrition expert. Given this food description: "{food_description}", 
         estimate its nutritional content with these values:
         - calories (kcal)
@@ -238,51 +508,10 @@ def analyze_food(food_description):
             "fat": 00.0
         }}
         """
-        
-        try:
-            # Make API request to Together AI
-            headers = {
-                "Authorization": f"Bearer {TOGETHER_API_KEY}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": "mistralai/Mistral-7B-Instruct-v0.2",
-                "prompt": prompt,
-                "max_tokens": 150,
-                "temperature": 0.3,
-                "top_p": 0.9
-            }
-            
-            response = requests.post(API_URL, headers=headers, json=data)
-            
-            if response.status_code == 200:
-                import json
-                result = response.json()
-                ai_response = result.get('choices', [{}])[0].get('text', '').strip()
-                
-                # Extract JSON from the response
-                try:
-                    # Find the JSON part in the response (it may have additional text)
-                    start_idx = ai_response.find('{')
-                    end_idx = ai_response.rfind('}') + 1
-                    
-                    if start_idx >= 0 and end_idx > start_idx:
-                        json_str = ai_response[start_idx:end_idx]
-                        api_nutrition = json.loads(json_str)
-                        return api_nutrition
-                    else:
-                        return nutrition
-                except json.JSONDecodeError:
-                    return nutrition
-            else:
-                return nutrition
-                
-        except Exception as e:
-            return nutrition
     
-    # If we calculated some nutritional values, return them
-    return nutrition
+    completion = _post_completion('analyze_food', prompt, max_tokens=150, temperature=0.3, parse_json=True,
+                                  hedge=True)
+    return completion.data
 
 def analyze_user_needs(user_profile):
     """
@@ -294,6 +523,19 @@ def analyze_user_needs(user_profile):
     Returns:
         Dictionary with personalized nutrition and water recommendations
     """
+    return analyze_user_needs_with_api(user_profile) or get_default_needs(user_profile)
+
+def analyze_user_needs_with_api(user_profile):
+    """
+    Ask the Together AI API for a user's nutrition and water needs.
+    
+    Returns:
+        Validated needs dictionary, or None if the API is not configured or
+        gave no usable answer
+    """
+    if not TOGETHER_API_KEY:
+        return None
+    
     # Get user details
     age = user_profile.age or 30
     weight = user_profile.weight or 70
@@ -333,50 +575,15 @@ def analyze_user_needs(user_profile):
     }}
     """
     
+    completion = _post_completion('user_needs', prompt, max_tokens=500, temperature=0.3, parse_json=True)
+    if completion.data is None:
+        return None
+    
+    # Validate and correct the values if needed
     try:
-        # Make API request to Together AI
-        headers = {
-            "Authorization": f"Bearer {TOGETHER_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "mistralai/Mistral-7B-Instruct-v0.2",
-            "prompt": prompt,
-            "max_tokens": 500,
-            "temperature": 0.3,
-            "top_p": 0.9
-        }
-        
-        response = requests.post(API_URL, headers=headers, json=data)
-        
-        if response.status_code == 200:
-            result = response.json()
-            ai_response = result.get('choices', [{}])[0].get('text', '').strip()
-            
-            # Extract JSON from the response
-            try:
-                # Find the JSON part in the response
-                start_idx = ai_response.find('{')
-                end_idx = ai_response.rfind('}') + 1
-                
-                if start_idx >= 0 and end_idx > start_idx:
-                    json_str = ai_response[start_idx:end_idx]
-                    needs = json.loads(json_str)
-                    
-                    # Validate and correct the values if needed
-                    needs = validate_nutrition_values(needs, weight)
-                    return needs
-                else:
-                    # Return reasonable defaults if JSON parsing fails
-                    return get_default_needs(user_profile)
-            except json.JSONDecodeError:
-                return get_default_needs(user_profile)
-        else:
-            return get_default_needs(user_profile)
-            
-    except Exception as e:
-        return get_default_needs(user_profile)
+        return validate_nutrition_values(completion.data, weight)
+    except (TypeError, ValueError):
+        return None
 
 def validate_nutrition_values(needs, weight):
     """Validate nutrition values to ensure they're in a safe range"""
@@ -0,0 +1,82 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from database import db
+from models import WeightLog
+
+# History loaded before the requested range so the trend is settled at its start;
+# a weigh-in from 60 days back carries under 0.2% of the trend's weight
+TREND_WARMUP_DAYS = 60
+
+
+def record_weight(user_id, weight, day=None):
+    """
+    Log a weigh-in, replacing any earlier one from the same day.
+
+    The row is added to the caller's transaction.
+    """
+    stmt = sqlite_insert(WeightLog.__table__).values(
+        user_id=user_id,
+        date=day or date.today(),
+        weight=weight,
+        updated_at=datetime.utcnow()
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=['user_id', 'date'],
+        set_={'weight': stmt.excluded.weight, 'updated_at': stmt.excluded.updated_at}
+    )
+    db.session.execute(stmt)
+
+
+def get_weight_trend(user_id, start, end, points=None):
+    """
+    Weigh-ins, smoothed trend and weekly rate of change for a date range.
+
+    All weigh-ins from the warm-up window through `end` are read with one
+    range scan of the (user_id, date) index, then the trend and rate are
+    computed over the whole array at once.
+
+    Returns:
+        Dictionary with ISO labels, weight, trend and weekly_rate lists
+        (rates are None until a week of history exists) and the latest values
+    """
+    from analytics_engine import ema_trend, weekly_rate, lttb_indices
+    import numpy as np
+
+    rows = db.session.query(WeightLog.date, WeightLog.weight).filter(
+        WeightLog.user_id == user_id,
+        WeightLog.date >= start - timedelta(days=TREND_WARMUP_DAYS),
+        WeightLog.date <= end
+    ).order_by(WeightLog.date).all()
+
+    empty = {'labels': [], 'weight': [], 'trend': [], 'weekly_rate': [], 'latest': None}
+    if not rows:
+        return empty
+
+    dates, weights = zip(*rows)
+    days = (np.array(dates, dtype='datetime64[D]') - np.datetime64(start, 'D')).astype(np.int64)
+    weights = np.array(weights, dtype=np.float64)
+    trend = ema_trend(days, weights)
+    rate = weekly_rate(days, trend)
+
+    # Drop the warm-up history now that the trend has been computed over it
+    in_range = np.flatnonzero(days >= 0)
+    if not len(in_range):
+        return empty
+
+    if points and len(in_range) > points:
+        in_range = in_range[lttb_indices(weights[in_range], max(points, 3))]
+
+    return {
+        'labels': [dates[i].isoformat() for i in in_range],
+        'weight': [round(float(weights[i]), 1) for i in in_range],
+        'trend': [round(float(trend[i]), 2) for i in in_range],
+        'weekly_rate': [None if np.isnan(rate[i]) else round(float(rate[i]), 2) for i in in_range],
+        'latest': {
+            'date': dates[-1].isoformat(),
+            'weight': round(float(weights[-1]), 1),
+            'trend': round(float(trend[-1]), 2),
+            'weekly_rate': None if np.isnan(rate[-1]) else round(float(rate[-1]), 2)
+        }
+    }
@@ -0,0 +1,11 @@
+"""
+Production WSGI entry point.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+`python app.py` still starts the Werkzeug development server for local work.
+Create or update the schema first with `flask --app app init-db`.
+"""
+from app import create_app
+
+app = application = create_app()